@@ -0,0 +1,349 @@
+# asset_cache.py – one content-addressed cache of immutable static assets for every profile
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+_CACHE_DIR = Path("camoufox_profiles") / "_asset_cache"
+
+# Upper bound on the cached bodies, in MiB (SM_ASSET_CACHE_MB).
+DEFAULT_MAX_MB = int(os.environ.get("SM_ASSET_CACHE_MB", "512"))
+
+# Hosts that serve build artefacts under content-hashed names.
+STATIC_HOSTS = ("static.cdninstagram.com",)
+
+# A file name that is (or ends in) a content hash, e.g. `.../AbC12_xYz9.js`.
+_HASHED_NAME = re.compile(r"/[A-Za-z0-9_-]{8,}\.(?:js|css|woff2?|ttf|otf|svg|png|ico|webp)$")
+
+# The URLs the cache route is registered for: hash-named files on STATIC_HOSTS. A regex
+# is matched by the browser itself, so no other request is intercepted (a Python
+# predicate would route every request and take it out of Firefox's HTTP cache).
+_ROUTED_URLS = re.compile(
+    r"^https://(?:" + "|".join(re.escape(host) for host in STATIC_HOSTS) + r")(?::443)?"
+    r"/(?:[^?#]*/)?[A-Za-z0-9_-]{8,}\.(?:js|css|woff2?|ttf|otf|svg|png|ico|webp)(?:[?#]|$)"
+)
+
+# Response headers that describe the transfer rather than the asset; never replayed.
+_DROPPED_HEADERS = {"set-cookie", "content-length", "content-encoding", "transfer-encoding",
+                    "date", "age", "connection", "keep-alive", "alt-svc"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    digest    TEXT PRIMARY KEY,
+    size      INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS objects_last_used ON objects (last_used);
+CREATE TABLE IF NOT EXISTS urls (
+    url     TEXT PRIMARY KEY,
+    digest  TEXT NOT NULL REFERENCES objects (digest) ON DELETE CASCADE,
+    headers TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS urls_digest ON urls (digest);
+"""
+
+
+def is_candidate(url: str, method: str = "GET") -> bool:
+    """
+    Whether a request may be served from the shared cache at all: a GET over HTTPS
+    to a static host, for a hash-named file.
+    """
+    if method != "GET":
+        return False
+    parts = urlsplit(url)
+    return parts.scheme == "https" and parts.hostname in STATIC_HOSTS and bool(_HASHED_NAME.search(parts.path))
+
+
+def is_cacheable(status: int, headers: Dict[str, str]) -> bool:
+    """
+    Whether a response can be shared between profiles: a plain 200 that sets no cookie,
+    doesn't vary by cookie and is marked immutable or cacheable for at least a day.
+    """
+    if status != 200 or "set-cookie" in headers:
+        return False
+    if "cookie" in headers.get("vary", "").lower():
+        return False
+    cache_control = headers.get("cache-control", "").lower()
+    if "no-store" in cache_control or "private" in cache_control:
+        return False
+    if "immutable" in cache_control:
+        return True
+    match = re.search(r"max-age=(\d+)", cache_control)
+    return bool(match) and int(match.group(1)) >= 86400
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    stored: int = 0
+    bytes_served: int = 0        # bytes answered from the cache instead of the network
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def describe(self) -> str:
+        return (f"asset cache {self.hits}/{self.hits + self.misses} hits ({self.hit_rate:.0%}), "
+                f"{self.bytes_served / 2**20:.1f} MiB saved, {self.stored} stored")
+
+
+class AssetCache:
+    """
+    Static assets shared by every profile, stored once per distinct body under
+    `root/objects/<sha256>` with an SQLite index from URL to body and headers.
+
+    Only responses passing `is_candidate`/`is_cacheable` are ever stored, so cookies,
+    HTML and API responses stay with each profile. Bodies are evicted least recently
+    used first once they exceed `max_bytes`. WAL mode lets several runner processes
+    share one cache.
+    """
+
+    def __init__(self, root: Path = _CACHE_DIR, max_bytes: int = DEFAULT_MAX_MB * 2**20):
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads, so keep one per thread.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.root / "index.sqlite3", timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def _object_path(self, digest: str) -> Path:
+        return self.objects / digest[:2] / digest
+
+    def _count(self, **deltas: int) -> None:
+        with self._stats_lock:
+            for name, delta in deltas.items():
+                setattr(self.stats, name, getattr(self.stats, name) + delta)
+
+    def snapshot(self) -> CacheStats:
+        with self._stats_lock:
+            return replace(self.stats)
+
+    def get(self, url: str) -> Optional[Tuple[Dict[str, str], bytes]]:
+        """
+        The cached headers and body for `url`, or None.
+        """
+        conn = self._conn()
+        row = conn.execute("SELECT digest, headers FROM urls WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            self._count(misses=1)
+            return None
+        digest, headers = row
+        try:
+            body = self._object_path(digest).read_bytes()
+        except FileNotFoundError:
+            # Evicted by another process between the lookup and the read.
+            self._count(misses=1)
+            return None
+        with conn:
+            conn.execute("UPDATE objects SET last_used = ? WHERE digest = ?", (time.time(), digest))
+        self._count(hits=1, bytes_served=len(body))
+        return json.loads(headers), body
+
+    def put(self, url: str, headers: Dict[str, str], body: bytes) -> None:
+        """
+        Stores a response that passed `is_cacheable`. Identical bodies are kept once.
+        """
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._object_path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{digest}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(body)
+            os.replace(tmp, path)
+        kept = {k: v for k, v in headers.items() if k.lower() not in _DROPPED_HEADERS}
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO objects (digest, size, last_used) VALUES (?, ?, ?) "
+                "ON CONFLICT (digest) DO UPDATE SET last_used = excluded.last_used",
+                (digest, len(body), time.time()),
+            )
+            conn.execute("INSERT OR REPLACE INTO urls (url, digest, headers) VALUES (?, ?, ?)",
+                         (url, digest, json.dumps(kept)))
+        self._count(stored=1)
+        self._evict()
+
+    def total_bytes(self) -> int:
+        return self._conn().execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+
+    def _evict(self) -> None:
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+        # Trim to 90% so eviction doesn't run again on the very next store.
+        target = int(self.max_bytes * 0.9)
+        conn = self._conn()
+        victims = []
+        for digest, size in conn.execute("SELECT digest, size FROM objects ORDER BY last_used"):
+            if total <= target:
+                break
+            victims.append(digest)
+            total -= size
+        with conn:
+            conn.executemany("DELETE FROM objects WHERE digest = ?", ((d,) for d in victims))
+        for digest in victims:
+            self._object_path(digest).unlink(missing_ok=True)
+
+
+class CacheRoute:
+    """
+    The route handler one browser context uses to reach the shared cache, with that
+    session's own hit counters in `stats`.
+
+    Hits are answered from the cache. Misses are passed on with `route.fallback()`,
+    so they still go out through Firefox's own network stack (and TLS fingerprint);
+    their bodies are stored from the context's "response" event on the way back.
+    """
+
+    def __init__(self, cache: AssetCache):
+        self.cache = cache
+        self.stats = CacheStats()
+        # URLs this session let through to the network and may store once they arrive.
+        self._missed: Set[str] = set()
+
+    def _hit(self, body: bytes) -> None:
+        self.stats.hits += 1
+        self.stats.bytes_served += len(body)
+
+    def _miss(self, url: str) -> None:
+        self.stats.misses += 1
+        self._missed.add(url)
+
+    def _should_store(self, response) -> bool:
+        request = response.request
+        if request.url not in self._missed or not is_candidate(request.url, request.method):
+            return False
+        self._missed.discard(request.url)
+        return True
+
+    def handle(self, route) -> None:
+        request = route.request
+        if not is_candidate(request.url, request.method):
+            route.fallback()
+            return
+        try:
+            cached = self.cache.get(request.url)
+        except Exception as e:
+            # Whatever goes wrong with the cache, the request must still be resolved.
+            print(f"Asset cache lookup failed for {request.url}: {e}")
+            cached = None
+        if cached is None:
+            self._miss(request.url)
+            route.fallback()
+            return
+        headers, body = cached
+        self._hit(body)
+        route.fulfill(status=200, headers=headers, body=body)
+
+    async def async_handle(self, route) -> None:
+        request = route.request
+        if not is_candidate(request.url, request.method):
+            await route.fallback()
+            return
+        # Bodies can be megabytes; keep the disk work off the event loop.
+        try:
+            cached = await asyncio.to_thread(self.cache.get, request.url)
+        except Exception as e:
+            print(f"Asset cache lookup failed for {request.url}: {e}")
+            cached = None
+        if cached is None:
+            self._miss(request.url)
+            await route.fallback()
+            return
+        headers, body = cached
+        self._hit(body)
+        await route.fulfill(status=200, headers=headers, body=body)
+
+    def on_response(self, response) -> None:
+        if not self._should_store(response):
+            return
+        try:
+            # all_headers(), unlike .headers, includes Set-Cookie, which is_cacheable must see.
+            headers = response.all_headers()
+            if not is_cacheable(response.status, headers):
+                return
+            body = response.body()
+        except Exception:
+            return                          # page closed or body unavailable: just don't cache
+        try:
+            self.cache.put(response.url, headers, body)
+        except Exception as e:
+            # Raising out of a Playwright event handler would break the session, not the cache.
+            print(f"Asset cache store failed for {response.url}: {e}")
+            return
+        self.stats.stored += 1
+
+    async def async_on_response(self, response) -> None:
+        if not self._should_store(response):
+            return
+        try:
+            headers = await response.all_headers()
+            if not is_cacheable(response.status, headers):
+                return
+            body = await response.body()
+        except Exception:
+            return
+        try:
+            await asyncio.to_thread(self.cache.put, response.url, headers, body)
+        except Exception as e:
+            print(f"Asset cache store failed for {response.url}: {e}")
+            return
+        self.stats.stored += 1
+
+
+def install(ctx, cache: AssetCache) -> CacheRoute:
+    """
+    Serves a sync BrowserContext's static assets from `cache`. Only candidate URLs are
+    routed (see _ROUTED_URLS), so every other request skips the handler entirely.
+    """
+    handler = CacheRoute(cache)
+    ctx.route(_ROUTED_URLS, handler.handle)
+    ctx.on("response", handler.on_response)
+    return handler
+
+
+async def async_install(ctx, cache: AssetCache) -> CacheRoute:
+    handler = CacheRoute(cache)
+    await ctx.route(_ROUTED_URLS, handler.async_handle)
+    ctx.on("response", handler.async_on_response)
+    return handler
+
+
+@lru_cache(maxsize=1)
+def shared_cache() -> AssetCache:
+    """
+    The process-wide cache under camoufox_profiles/_asset_cache.
+    """
+    return AssetCache()
+
+
+if __name__ == "__main__":
+    cache = shared_cache()
+    conn = cache._conn()
+    objects, urls = (conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in ("objects", "urls"))
+    print(f"{cache.root}: {objects} bodies for {urls} URL(s), "
+          f"{cache.total_bytes() / 2**20:.1f} of {cache.max_bytes / 2**20:.0f} MiB")
@@ -1,5 +1,6 @@
-from instagram import scroll_for_a_while, explore, notifications, profile, search, follow
+from instagram import INSTAGRAM_URL, scroll_for_a_while, explore, notifications, profile, search, follow
 from profile import Profile
+from readiness import settle
 from util import print_filtered_traceback, wait, human_type
 from camoufox_browser_manager import CamoufoxBrowser
 from playwright.sync_api import Page
@@ -11,8 +12,8 @@ from camoufox.sync_api import BrowserContext # Import BrowserContext
 def my_playwright_activity(browser_instance: CamoufoxBrowser, ctx: BrowserContext, page: Page):
 
 
-    page.goto("https://instagram.com", wait_until="domcontentloaded")
-    wait(3, 3)
+    page.goto(INSTAGRAM_URL, wait_until="domcontentloaded")
+    settle(page, "home", selector='svg[aria-label="Home"]')
     follow(page)
 
 
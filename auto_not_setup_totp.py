@@ -1,24 +1,27 @@
-import asyncio
 import os
 import pyotp
 
+from readiness import settle
 from util import print_filtered_traceback, wait, human_type
-from vpn import disconnect_vpn
+from vpn import disconnect_vpn, run_sync
 # Ensure these imports are available in your environment
-from web import get_accounts, AccountStatus, json_web_call
+from web import iter_accounts, AccountStatus
 from camoufox_browser_manager import CamoufoxBrowser
+from instagram import INSTAGRAM_URL
+from run_journal import RunJournal
+from runner import AccountResult, run_accounts
+from status_queue import StatusUpdateQueue
 from playwright.sync_api import Page
 from camoufox.sync_api import BrowserContext # Import BrowserContext
 
 
 # Example Playwright activity function
 # Modified to accept the BrowserContext object
-def my_playwright_activity(browser_instance: CamoufoxBrowser, ctx: BrowserContext, page: Page):
+def my_playwright_activity(browser_instance: CamoufoxBrowser, ctx: BrowserContext, page: Page) -> AccountStatus:
 
 
-    page.goto("https://www.instagram.com", wait_until="domcontentloaded")
-    wait (6, 8)
-    page.wait_for_selector("input[name='username']")
+    page.goto(INSTAGRAM_URL, wait_until="domcontentloaded")
+    settle(page, "login_form", selector="input[name='username']")
 
     #page.click("input[type='username']")
     human_type(page, "input[name='username']", browser_instance.profile.profile)
@@ -38,36 +41,33 @@ def my_playwright_activity(browser_instance: CamoufoxBrowser, ctx: BrowserContex
 
     ctx.wait_for_event("close", timeout=0)
 
-    json_web_call(
-        "change_account_status.php", # Keep "accounts.php" as discussed previously
-        {
-            "profile": browser_instance.profile.profile,
-            "status": AccountStatus.FRAGILE.value
-        },
-    )
+    # The new status is sent from the main process by the StatusUpdateQueue.
+    return AccountStatus.FRAGILE
 
 
 def main():
     try:
-        accounts = get_accounts(status=AccountStatus.NOT_SETUP)
-
-        if not accounts:
-            print("No accounts found with status 'ready'.")
+        accounts = iter_accounts(status=AccountStatus.NOT_SETUP)
+
+        # A killed run resumes where it stopped when started again (SM_RESUME=0 to start over).
+        with StatusUpdateQueue() as status_updates, RunJournal("auto_not_setup_totp") as journal:
+            def queue_status(result: AccountResult) -> None:
+                if result.ok and result.value is not None:
+                    status_updates.put(result.profile, result.value)
+
+            summary = run_accounts(accounts, my_playwright_activity, group_by_region=True,
+                                   on_result=queue_status, journal=journal)
+            journal_counts = journal.describe()
+
+        if not summary.results:
+            if journal.resumed:
+                print(f"Nothing left to run in this resumed run ({journal_counts}).")
+            else:
+                print("No accounts found with status 'not setup'.")
             return
+        summary.print_report()
 
-        print(f"Found {len(accounts)} accounts:")
-        print("=" * 40)
-
-        for i, profile_obj in enumerate(accounts):
-            print(f"--- Iteration {i + 1} of {len(accounts)} ---")
-            print(f"  Profile: {profile_obj.profile}")
-            print(f"  Password: {profile_obj.password}")
-
-            browser_manager = CamoufoxBrowser(profile_obj)
-            browser_manager.launch(my_playwright_activity)
-            print("-" * 30)
-
-        asyncio.run(disconnect_vpn())
+        run_sync(disconnect_vpn())
 
     except Exception as e:
         print(f"An error occurred: {e}")
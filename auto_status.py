@@ -1,12 +1,14 @@
-import asyncio
 import os
 import pyotp
 
 from util import print_filtered_traceback, wait, human_type
-from vpn import disconnect_vpn
+from vpn import disconnect_vpn, run_sync
 # Ensure these imports are available in your environment
-from web import get_accounts, AccountStatus, json_web_call
+from web import iter_accounts, AccountStatus, json_web_call
 from camoufox_browser_manager import CamoufoxBrowser
+from instagram import INSTAGRAM_URL
+from run_journal import RunJournal
+from runner import run_accounts
 from playwright.sync_api import Page
 from camoufox.sync_api import BrowserContext # Import BrowserContext
 
@@ -16,31 +18,29 @@ from camoufox.sync_api import BrowserContext # Import BrowserContext
 def my_playwright_activity(browser_instance: CamoufoxBrowser, ctx: BrowserContext, page: Page):
 
 
-    page.goto("https://instagram.com", wait_until="domcontentloaded")
+    page.goto(INSTAGRAM_URL, wait_until="domcontentloaded")
 
     ctx.wait_for_event("close", timeout=0)
 
 
 def main():
     try:
-        accounts = get_accounts(status=AccountStatus.FRAGILE)
-
-        if not accounts:
-            print("No accounts found with status 'ready'.")
+        accounts = iter_accounts(status=AccountStatus.FRAGILE)
+
+        # A killed run resumes where it stopped when started again (SM_RESUME=0 to start over).
+        with RunJournal("auto_status") as journal:
+            summary = run_accounts(accounts, my_playwright_activity, group_by_region=True, journal=journal)
+            journal_counts = journal.describe()
+
+        if not summary.results:
+            if journal.resumed:
+                print(f"Nothing left to run in this resumed run ({journal_counts}).")
+            else:
+                print("No accounts found with status 'fragile'.")
             return
+        summary.print_report()
 
-        print(f"Found {len(accounts)} accounts:")
-        print("=" * 40)
-
-        for i, profile_obj in enumerate(accounts):
-            print(f"--- Iteration {i + 1} of {len(accounts)} ---")
-            print(f"  Profile: {profile_obj.profile}")
-
-            browser_manager = CamoufoxBrowser(profile_obj)
-            browser_manager.launch(my_playwright_activity)
-            print("-" * 30)
-
-        asyncio.run(disconnect_vpn())
+        run_sync(disconnect_vpn())
 
     except Exception as e:
         print(f"An error occurred: {e}")
@@ -0,0 +1 @@
+# benchmark – offline end-to-end runs against a fake Instagram, backend and piactl
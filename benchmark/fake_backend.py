@@ -0,0 +1,117 @@
+# fake_backend.py – a local stand-in for the smg.c2r.one account endpoints
+import base64
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence
+
+
+def _totp_secret(profile: str) -> str:
+    # A valid, stable base32 secret per account, so pyotp can derive codes from it.
+    return base64.b32encode(hashlib.sha1(profile.encode()).digest()[:10]).decode()
+
+
+class FakeBackend:
+    """
+    Answers accounts.php (with limit/cursor paging), change_account_status.php and
+    random_non_private_profile.php on 127.0.0.1, keeping account statuses in memory.
+
+    Args:
+        accounts: How many accounts to create.
+        status: The status they all start in.
+        regions: VPN region codes handed out round-robin; empty means no VPN code.
+        latency: Seconds added to every response.
+    """
+
+    def __init__(
+        self,
+        accounts: int = 20,
+        status: str = "not setup",
+        regions: Sequence[str] = ("us", "de", "uk"),
+        latency: float = 0.0,
+        port: int = 0,
+    ):
+        self.latency = latency
+        self.accounts: List[Dict[str, Any]] = [
+            {
+                "profile": f"bench_{i:04d}",
+                "code": regions[i % len(regions)] if regions else None,
+                "password": f"pw-{i:04d}",
+                "recovery": f"recovery{i:04d}@example.com",
+                "authenticator": _totp_secret(f"bench_{i:04d}"),
+            }
+            for i in range(accounts)
+        ]
+        self.statuses: Dict[str, str] = {a["profile"]: status for a in self.accounts}
+        self.calls: Counter = Counter()
+        self.status_updates: List[tuple] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/"
+
+    def start(self) -> 'FakeBackend':
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-backend", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def handle(self, endpoint: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self.calls[endpoint] += 1
+            if endpoint == "accounts.php":
+                matching = [a for a in self.accounts if self.statuses[a["profile"]] == body.get("status")]
+                start = int(body.get("cursor") or 0)
+                limit = int(body.get("limit") or len(matching) or 1)
+                page = matching[start:start + limit]
+                result: Dict[str, Any] = {"data": page}
+                if start + limit < len(matching):
+                    result["next_cursor"] = start + limit
+                return result
+            if endpoint == "change_account_status.php":
+                self.statuses[body["profile"]] = body["status"]
+                self.status_updates.append((body["profile"], body["status"]))
+                return {"status": "ok"}
+            if endpoint == "random_non_private_profile.php":
+                n = self.calls[endpoint]
+                count = int(body.get("count") or 1)
+                names = [f"creator_{(n * count + i) % 500:03d}" for i in range(count)]
+                return {"profile": names[0], "profiles": names}
+        raise KeyError(endpoint)
+
+    def _handler(self):
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if backend.latency:
+                    time.sleep(backend.latency)
+                try:
+                    payload = json.dumps(backend.handle(self.path.strip("/"), json.loads(raw or b"{}"))).encode()
+                except KeyError:
+                    self.send_error(404)
+                    return
+                except (ValueError, TypeError) as e:
+                    self.send_error(400, str(e))
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
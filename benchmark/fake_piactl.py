@@ -0,0 +1,78 @@
+# fake_piactl.py – stand-in for PIA's piactl, driven by a small JSON state file
+#
+# Supports the commands vpn.py uses: `get connectionstate`, `get region`,
+# `set region <code>`, `connect`, `disconnect` (each optionally prefixed with
+# `-t <seconds>`) and `monitor connectionstate`. Connecting and disconnecting
+# finish in the background after FAKE_PIACTL_DELAY seconds, like the real client.
+import json
+import os
+import subprocess
+import sys
+import time
+
+STATE_PATH = os.environ.get("FAKE_PIACTL_STATE", "fake_piactl_state.json")
+DELAY = float(os.environ.get("FAKE_PIACTL_DELAY", "0.5"))
+
+
+def load() -> dict:
+    try:
+        with open(STATE_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"connectionstate": "Disconnected", "region": "auto", "connects": 0}
+
+
+def save(state: dict) -> None:
+    tmp = STATE_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, STATE_PATH)
+
+
+def finish_later(final_state: str) -> None:
+    subprocess.Popen([sys.executable, os.path.abspath(__file__), "_finish", final_state])
+
+
+def main(args) -> int:
+    if args[:1] == ["-t"]:
+        args = args[2:]
+    state = load()
+
+    if args == ["get", "connectionstate"]:
+        print(state["connectionstate"])
+    elif args == ["get", "region"]:
+        print(state["region"])
+    elif args[:2] == ["set", "region"] and len(args) == 3:
+        state["region"] = args[2]
+        save(state)
+    elif args == ["connect"]:
+        state["connectionstate"] = "Connecting"
+        state["connects"] = state.get("connects", 0) + 1
+        save(state)
+        finish_later("Connected")
+    elif args == ["disconnect"]:
+        if state["connectionstate"] != "Disconnected":
+            state["connectionstate"] = "Disconnecting"
+            save(state)
+            finish_later("Disconnected")
+    elif args[:1] == ["_finish"]:
+        time.sleep(DELAY)
+        state = load()
+        state["connectionstate"] = args[1]
+        save(state)
+    elif args == ["monitor", "connectionstate"]:
+        last = None
+        while True:
+            current = load()["connectionstate"]
+            if current != last:
+                print(current, flush=True)
+                last = current
+            time.sleep(0.02)
+    else:
+        print(f"fake piactl: unsupported command {' '.join(args)!r}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,256 @@
+# fixture_site.py – a local page set with the DOM hooks the Instagram flows rely on
+import html
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs
+
+_STYLE = """
+body { margin: 0; font-family: sans-serif; }
+nav { position: fixed; left: 0; top: 0; width: 72px; height: 100%; display: flex;
+      flex-direction: column; gap: 24px; padding-top: 24px; align-items: center; background: #fafafa; }
+nav svg { width: 24px; height: 24px; cursor: pointer; }
+main { margin-left: 96px; width: 470px; }
+.post { height: 640px; margin: 16px 0; border: 1px solid #dbdbdb; }
+.post header { display: flex; justify-content: space-between; padding: 8px; }
+.media { height: 560px; background: linear-gradient(#eee, #ccc); }
+.grid { display: grid; grid-template-columns: repeat(3, 150px); gap: 4px; }
+.grid div { height: 150px; background: #ddd; }
+.panel { display: none; position: fixed; left: 72px; top: 0; width: 320px; height: 100%;
+         background: #fff; border-right: 1px solid #dbdbdb; padding: 16px; }
+.panel.open { display: block; }
+form { display: flex; flex-direction: column; gap: 8px; width: 260px; margin: 80px auto; }
+"""
+
+_ICON = '<svg aria-label="{label}" role="img" viewBox="0 0 24 24"><rect width="24" height="24" rx="6"/></svg>'
+
+_NAV = (
+    '<nav>'
+    f'<a href="/">{_ICON.format(label="Home")}</a>'
+    f'<span id="search-toggle">{_ICON.format(label="Search")}</span>'
+    f'<a href="/explore/">{_ICON.format(label="Explore")}</a>'
+    f'<span id="notifications-toggle">{_ICON.format(label="Notifications")}</span>'
+    '</nav>'
+    '<div class="panel" id="search-panel"><input aria-label="Search input" type="text"><div id="results"></div></div>'
+    '<div class="panel" id="notifications-panel"><p>No new notifications.</p></div>'
+)
+
+_NAV_SCRIPT = """
+<script>
+const toggle = (id) => document.getElementById(id).classList.toggle('open');
+document.getElementById('search-toggle').addEventListener('click', () => toggle('search-panel'));
+document.getElementById('notifications-toggle').addEventListener('click', () => toggle('notifications-panel'));
+document.querySelector('input[aria-label="Search input"]').addEventListener('input', (e) => {
+    const results = document.getElementById('results');
+    results.textContent = '';
+    const name = e.target.value.trim();
+    if (!name) return;
+    const a = document.createElement('a');
+    a.href = '/' + name + '/';
+    a.tabIndex = 0;
+    a.textContent = name;
+    results.appendChild(a);
+});
+document.addEventListener('click', (e) => {
+    const button = e.target.closest('button.follow');
+    if (button) button.querySelector('div').textContent = 'Following';
+});
+</script>
+"""
+
+_LOGIN_BODY = """
+<form id="login">
+  <input name="username" type="text" placeholder="Phone number, username or email">
+  <input name="password" type="password" placeholder="Password">
+  <button type="submit">Log in</button>
+</form>
+<form id="totp" style="display: none">
+  <input name="verificationCode" type="text" inputmode="numeric" placeholder="Security code">
+  <button type="submit">Confirm</button>
+</form>
+<script>
+const post = (path, data) => fetch(path, { method: 'POST', body: JSON.stringify(data) });
+document.getElementById('login').addEventListener('submit', (e) => {
+    e.preventDefault();
+    const form = e.target;
+    post('/api/login', { username: form.username.value }).then(() => {
+        // The login form goes away entirely, so the first <button> is the confirm button.
+        form.remove();
+        document.getElementById('totp').style.display = 'flex';
+    });
+});
+document.getElementById('totp').addEventListener('submit', (e) => {
+    e.preventDefault();
+    post('/api/two_factor', { code: e.target.verificationCode.value }).then(() => {
+        document.cookie = 'sessionid=bench; path=/';
+        location.href = '/';
+    });
+});
+</script>
+"""
+
+
+# The explore grid loads its tiles page by page from a JSON endpoint while scrolling,
+# like the real one, so `harvest.Harvester` has API responses to parse.
+_EXPLORE_PAGE_SIZE = 12
+
+_EXPLORE_SCRIPT = """
+<script>
+let nextMaxId = 0, loading = false;
+const grid = document.querySelector('main.grid');
+const loadMore = () => {
+    if (loading || nextMaxId === null) return;
+    loading = true;
+    fetch('/api/v1/discover/web/explore_grid/?max_id=' + nextMaxId)
+        .then((r) => r.json())
+        .then((data) => {
+            for (const item of data.items) {
+                const tile = document.createElement('div');
+                tile.dataset.code = item.media.code;
+                grid.appendChild(tile);
+            }
+            nextMaxId = data.more_available ? data.next_max_id : null;
+            loading = false;
+        });
+};
+window.addEventListener('scroll', () => {
+    if (window.innerHeight + window.scrollY > document.body.scrollHeight - 800) loadMore();
+});
+loadMore();
+</script>
+"""
+
+
+def _explore_items(start: int, end: int) -> list:
+    return [
+        {"media": {
+            "pk": str(1000 + i), "id": f"{1000 + i}_{i % 50}", "code": f"Bench{i:05d}",
+            "taken_at": 1700000000 + i, "media_type": 1, "like_count": i * 7, "comment_count": i % 13,
+            "caption": {"text": f"fixture post {i}"},
+            "user": {"pk": str(i % 50), "username": f"creator_{i % 50:03d}", "full_name": f"Creator {i % 50}",
+                     "is_verified": False, "is_private": False},
+        }}
+        for i in range(start, end)
+    ]
+
+
+def _page(title: str, body: str, with_nav: bool = True) -> bytes:
+    return (
+        f"<!doctype html><html><head><meta charset='utf-8'><title>{html.escape(title)}</title>"
+        f"<style>{_STYLE}</style></head><body>"
+        f"{_NAV if with_nav else ''}{body}{_NAV_SCRIPT if with_nav else ''}</body></html>"
+    ).encode()
+
+
+def _post(i: int) -> str:
+    user = f"creator_{i:03d}"
+    return (
+        f'<article class="post"><header><a href="/{user}/" tabindex="0">{user}</a>'
+        f'<button class="follow" type="button"><div>Follow</div></button></header>'
+        f'<div class="media"></div></article>'
+    )
+
+
+class FixtureSite:
+    """
+    Serves a tiny Instagram look-alike on 127.0.0.1: a login + verification-code form
+    for visitors without a session cookie, a scrollable feed with Follow buttons, the
+    explore grid, profile pages and the search/notification panels. Every hook used by
+    `instagram.*` and the `auto_*` flows exists with the same selector.
+
+    Args:
+        posts: Feed length (each post is 640px tall, so this controls scroll depth).
+        latency: Seconds added to every response, to imitate the network.
+    """
+
+    def __init__(self, posts: int = 30, latency: float = 0.0, port: int = 0):
+        self.posts = posts
+        self.latency = latency
+        self.hits: Counter = Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> 'FixtureSite':
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fixture-site", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, kind: str) -> None:
+        with self._lock:
+            self.hits[kind] += 1
+
+    def render(self, path: str, logged_in: bool) -> bytes:
+        if not logged_in:
+            self._count("login")
+            return _page("Login • Instagram", _LOGIN_BODY, with_nav=False)
+        if path == "/":
+            self._count("feed")
+            return _page("Instagram", "<main>" + "".join(_post(i) for i in range(self.posts)) + "</main>")
+        if path == "/explore/":
+            self._count("explore")
+            return _page("Explore", '<main class="grid"></main>' + _EXPLORE_SCRIPT)
+        self._count("profile")
+        name = html.escape(path.strip("/"))
+        return _page(name, f'<main><h2>{name}</h2><button class="follow" type="button"><div>Follow</div></button></main>')
+
+    def explore_page(self, query: str) -> bytes:
+        self._count("explore_api")
+        max_id = int(parse_qs(query).get("max_id", ["0"])[0])
+        total = self.posts * 3
+        end = min(total, max_id + _EXPLORE_PAGE_SIZE)
+        return json.dumps({
+            "items": _explore_items(max_id, end),
+            "more_available": end < total,
+            "next_max_id": end,
+        }).encode()
+
+    def _handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, body: bytes, content_type: str = "text/html; charset=utf-8") -> None:
+                if site.latency:
+                    time.sleep(site.latency)
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                path, _, query = self.path.partition("?")
+                if path == "/favicon.ico":
+                    self.send_error(404)
+                    return
+                if path == "/api/v1/discover/web/explore_grid/":
+                    self._send(site.explore_page(query), "application/json")
+                    return
+                logged_in = "sessionid=" in (self.headers.get("Cookie") or "")
+                self._send(site.render(path, logged_in))
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                site._count(self.path.strip("/").replace("/", "."))
+                self._send(b'{"status": "ok"}', "application/json")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,84 @@
+# flows.py – auto_*-style activities that finish on their own, for benchmark runs
+import functools
+import os
+
+import pyotp
+from camoufox.sync_api import BrowserContext
+from playwright.sync_api import Page
+
+import pacing
+from camoufox_browser_manager import CamoufoxBrowser
+from harvest import harvesting
+from instagram import INSTAGRAM_URL, explore, follow, notifications, profile, search
+from readiness import settle
+from scrape_sink import shared_sink
+from util import human_type, wait
+from web import AccountStatus
+
+# Seconds of explore-page scrolling per account in the browse flow.
+EXPLORE_SECONDS = float(os.environ.get("SM_BENCH_EXPLORE_SECONDS", "20"))
+
+
+def _use_bench_clock() -> None:
+    # Runs in each worker process: SM_BENCH_VIRTUAL=1 fast-forwards every human-like pause.
+    if os.environ.get("SM_BENCH_VIRTUAL") == "1" and not pacing.clock().virtual:
+        pacing.set_default_clock(pacing.VirtualClock())
+
+
+def _log_in(browser_instance: CamoufoxBrowser, page: Page) -> None:
+    # Same steps as auto_not_setup_totp.
+    human_type(page, "input[name='username']", browser_instance.profile.profile)
+    wait(1, 2)
+    page.wait_for_selector("input[name='password']")
+    page.click("input[type='password']")
+    human_type(page, "input[name='password']", browser_instance.profile.password)
+    wait(1, 2)
+    page.wait_for_selector("button[type='submit']")
+    page.click("button[type='submit']")
+
+    page.wait_for_selector("input[name='verificationCode']")
+    human_type(page, "input[name='verificationCode']", pyotp.TOTP(browser_instance.profile.authenticator).now())
+    page.click("button")
+    page.wait_for_selector('svg[aria-label="Home"]')
+
+
+def login_flow(browser_instance: CamoufoxBrowser, ctx: BrowserContext, page: Page) -> AccountStatus:
+    """
+    auto_not_setup_totp without the wait for the window to close.
+    """
+    _use_bench_clock()
+    page.goto(INSTAGRAM_URL, wait_until="domcontentloaded")
+    settle(page, "login_form", selector="input[name='username']")
+    _log_in(browser_instance, page)
+    return AccountStatus.FRAGILE
+
+
+def browse_flow(browser_instance: CamoufoxBrowser, ctx: BrowserContext, page: Page) -> AccountStatus:
+    """
+    Logs in if needed, then follows, searches, explores (harvesting the explore grid's
+    API responses), checks notifications and opens a profile from the feed: one pass
+    over every `instagram.*` action.
+    """
+    _use_bench_clock()
+    page.goto(INSTAGRAM_URL, wait_until="domcontentloaded")
+    # Either the feed or, for a fresh profile, the login form.
+    settle(page, "home", selector="svg[aria-label=\"Home\"], input[name='username']")
+    if page.locator("input[name='username']").count():
+        _log_in(browser_instance, page)
+
+    follow(page)
+    search(page, account=browser_instance.profile.profile)
+    # The fixture's explore grid runs out of tiles, so this also exercises the early stop.
+    # Every account sees the same tiles, so after the first one the sink drops them all.
+    sink = functools.partial(shared_sink().put, account=browser_instance.profile.profile)
+    with harvesting(page, on_record=sink) as harvester:
+        explore(page, seconds=EXPLORE_SECONDS, harvester=harvester)
+    notifications(page)
+    profile(page, "creator_001")
+    return AccountStatus.FRAGILE
+
+
+FLOWS = {
+    "login": login_flow,
+    "browse": browse_flow,
+}
@@ -0,0 +1,202 @@
+# run.py – offline end-to-end benchmark: many profiles through an auto_* flow, no internet
+#
+#   python -m benchmark.run --accounts 40 --concurrency 4 --flow browse --virtual
+#
+# Starts the fixture site, the fake backend and the fake piactl, points the code at them
+# through its environment overrides (SM_INSTAGRAM_URL, SM_BASE_URL, PIACTL_PATH, ...),
+# runs every account through `runner.run_accounts` and reports accounts/hour, the
+# per-phase timings from `metrics` and peak memory.
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+try:
+    import psutil                         # optional: whole process-tree memory sampling
+except ImportError:
+    psutil = None
+
+from benchmark.fake_backend import FakeBackend
+from benchmark.fixture_site import FixtureSite
+
+_HERE = Path(__file__).resolve().parent
+
+
+class MemorySampler:
+    """
+    Tracks the peak resident memory of this process and everything it started
+    (runner workers, Camoufox processes). Without psutil only this process and its
+    reaped children are visible, via getrusage.
+    """
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+
+    def _tree_rss(self) -> int:
+        me = psutil.Process()
+        total = 0
+        for proc in [me, *me.children(recursive=True)]:
+            try:
+                total += proc.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak_bytes = max(self.peak_bytes, self._tree_rss())
+
+    def __enter__(self) -> 'MemorySampler':
+        if psutil is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        if psutil is not None:
+            self._thread.join()
+            return
+        try:
+            import resource
+        except ImportError:                   # Windows without psutil: nothing to report
+            return
+        # ru_maxrss is in KiB on Linux (bytes on macOS); take the larger of self/children.
+        scale = 1 if sys.platform == "darwin" else 1024
+        self.peak_bytes = scale * max(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        )
+
+    def describe(self) -> str:
+        if not self.peak_bytes:
+            return "n/a (install psutil)"
+        how = "process tree" if psutil is not None else "largest single process"
+        return f"{self.peak_bytes / 2**20:.0f} MiB ({how})"
+
+
+def _write_piactl_wrapper(workdir: Path) -> Path:
+    # vpn.py executes PIACTL_PATH directly, so wrap the script for this interpreter.
+    script = _HERE / "fake_piactl.py"
+    if sys.platform == "win32":
+        wrapper = workdir / "piactl.cmd"
+        wrapper.write_text(f'@"{sys.executable}" "{script}" %*\r\n', encoding="utf-8")
+    else:
+        wrapper = workdir / "piactl"
+        wrapper.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{script}" "$@"\n', encoding="utf-8")
+        wrapper.chmod(0o755)
+    return wrapper
+
+
+def _configure_environment(args, workdir: Path, site: FixtureSite, backend: FakeBackend) -> None:
+    # Must happen before the repo modules are imported: they read these at import time,
+    # and the spawned runner workers inherit them.
+    os.environ.update({
+        "SM_INSTAGRAM_URL": site.url,
+        "SM_BASE_URL": backend.url,
+        "PIACTL_PATH": str(_write_piactl_wrapper(workdir)),
+        "FAKE_PIACTL_STATE": str(workdir / "piactl_state.json"),
+        "FAKE_PIACTL_DELAY": str(args.vpn_delay),
+        "VPN_EGRESS_PROBE_HOST": "127.0.0.1",
+        "VPN_EGRESS_PROBE_PORT": str(site.port),
+        "VPN_EGRESS_PROBE_TLS": "0",
+        "SM_HEADLESS": "0" if args.headful else "1",
+        "SM_GEOIP": "0",
+        "SM_METRICS_FILE": str(workdir / "metrics.jsonl"),
+        "SM_BENCH_VIRTUAL": "1" if args.virtual else "0",
+        "SM_BENCH_EXPLORE_SECONDS": str(args.explore_seconds),
+    })
+    os.environ.setdefault("COMPUTERNAME", "BENCHMARK")
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the account runner.")
+    parser.add_argument("--accounts", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--flow", choices=["login", "browse"], default="browse")
+    parser.add_argument("--regions", default="us,de,uk", help="comma-separated VPN codes ('' for none)")
+    parser.add_argument("--posts", type=int, default=30, help="feed length on the fixture site")
+    parser.add_argument("--site-latency", type=float, default=0.0, help="seconds added to every page")
+    parser.add_argument("--backend-latency", type=float, default=0.0, help="seconds added to every API call")
+    parser.add_argument("--vpn-delay", type=float, default=0.5, help="seconds the fake piactl takes to (dis)connect")
+    parser.add_argument("--explore-seconds", type=float, default=20)
+    parser.add_argument("--virtual", action="store_true", help="fast-forward human-like pauses")
+    parser.add_argument("--headful", action="store_true")
+    parser.add_argument("--workdir", type=Path, default=None, help="keep profiles and metrics here")
+    parser.add_argument("--json", type=Path, default=None, help="also write the results here")
+    args = parser.parse_args(argv)
+
+    workdir = (args.workdir or Path(tempfile.mkdtemp(prefix="sm-bench-"))).resolve()
+    workdir.mkdir(parents=True, exist_ok=True)
+    json_path = args.json.resolve() if args.json else None
+    regions = [r for r in args.regions.split(",") if r]
+    site = FixtureSite(posts=args.posts, latency=args.site_latency).start()
+    backend = FakeBackend(accounts=args.accounts, regions=regions, latency=args.backend_latency).start()
+    _configure_environment(args, workdir, site, backend)
+    # Profiles, the template and journals are created relative to the working directory.
+    os.chdir(workdir)
+
+    from benchmark.flows import FLOWS
+    from runner import AccountResult, run_accounts
+    from scrape_sink import SCRAPE_DIR, iter_records
+    from status_queue import StatusUpdateQueue
+    from vpn import disconnect_vpn, run_sync
+    from web import AccountStatus, get_call_stats, iter_accounts
+
+    print(f"Benchmark: {args.accounts} account(s), flow={args.flow}, concurrency={args.concurrency}, "
+          f"virtual={args.virtual}, workdir={workdir}")
+    started = time.monotonic()
+    try:
+        with MemorySampler() as memory, StatusUpdateQueue(journal_path=workdir / "status_updates.jsonl") as updates:
+            def queue_status(result: AccountResult) -> None:
+                if result.ok and result.value is not None:
+                    updates.put(result.profile, result.value)
+
+            summary = run_accounts(
+                iter_accounts(status=AccountStatus.NOT_SETUP),
+                FLOWS[args.flow],
+                concurrency=args.concurrency,
+                on_result=queue_status,
+                group_by_region=True,
+            )
+        if regions:
+            run_sync(disconnect_vpn())
+    finally:
+        site.stop()
+        backend.stop()
+
+    summary.print_report()
+    print(f"Peak memory:  {memory.describe()}")
+    print(f"Fixture hits: {dict(site.hits)}")
+    print(f"Backend:      {dict(backend.calls)}; {len(backend.status_updates)} status update(s) received")
+    for endpoint, stats in get_call_stats().items():
+        print(f"  {endpoint}: {stats.calls} call(s), mean {stats.mean_seconds * 1000:.1f}ms, {stats.retries} retries")
+    print(f"Scraped:      {sum(1 for _ in iter_records(SCRAPE_DIR))} unique record(s) in {workdir / SCRAPE_DIR}")
+    print(f"Total time:   {time.monotonic() - started:.1f}s; span log in {workdir / 'metrics.jsonl'}")
+
+    if json_path:
+        json_path.write_text(json.dumps({
+            "accounts": summary.accounts,
+            "succeeded": len(summary.succeeded),
+            "concurrency": summary.concurrency,
+            "wall_time": summary.wall_time,
+            "accounts_per_hour": summary.accounts_per_hour,
+            "vpn_connects": summary.vpn_connects,
+            "peak_memory_bytes": memory.peak_bytes,
+            "phases": {
+                name: {"count": s.count, "errors": s.errors, "total": s.total_seconds,
+                       "wait": s.wait_seconds, "p50": s.p50, "p95": s.p95}
+                for name, s in summary.timings.items()
+            },
+        }, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
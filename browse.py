@@ -1,10 +1,13 @@
 import random
 
 from playwright.sync_api import Page
+from playwright.async_api import Page as AsyncPage
 
-from util import wait
+import metrics
+from util import wait, async_wait
 
 
+@metrics.timed("browse.scroll")
 def scroll(page: Page, up: bool, min_turns: int, max_turns: int):
     num_turns: int = int(random.uniform(min_turns, max_turns))
     delta_y: float = 100 * (-1 if up else 1);
@@ -18,31 +21,94 @@ def scroll_down(page: Page, min_turns: int = 2, max_turns: int = 5):
 def scroll_up(page: Page, min_turns: int = 2, max_turns: int = 5):
     scroll(page, up=True, min_turns=min_turns, max_turns=max_turns)
 
+@metrics.timed("browse.scroll")
+async def async_scroll(page: AsyncPage, up: bool, min_turns: int, max_turns: int):
+    num_turns: int = int(random.uniform(min_turns, max_turns))
+    delta_y: float = 100 * (-1 if up else 1)
+    for i in range(num_turns):
+        await page.mouse.wheel(0, delta_y)
+        await async_wait(.2, .4)
+
+async def async_scroll_down(page: AsyncPage, min_turns: int = 2, max_turns: int = 5):
+    await async_scroll(page, up=False, min_turns=min_turns, max_turns=max_turns)
+
+async def async_scroll_up(page: AsyncPage, min_turns: int = 2, max_turns: int = 5):
+    await async_scroll(page, up=True, min_turns=min_turns, max_turns=max_turns)
 
-from typing import List
 
-from typing import List
+from typing import Dict, List, Optional, Tuple
+
 from playwright.sync_api import Locator, Page
 
+# Runs once over every element matched by a locator and returns the indices of those
+# that are visible and entirely inside the viewport, so the whole check is one round trip.
+# It also installs a per-document "layout generation" stamp that scroll, resize and DOM
+# mutations advance; when the caller's cached stamp still matches, nothing is measured.
+_VISIBLE_INDICES_JS = """
+(els, cachedStamp) => {
+    if (!window.__smVisibility) {
+        const state = window.__smVisibility = { id: Math.random().toString(36).slice(2), gen: 0 };
+        const bump = () => { state.gen++; };
+        window.addEventListener('scroll', bump, { capture: true, passive: true });
+        window.addEventListener('resize', bump, { passive: true });
+        new MutationObserver(bump).observe(document, {
+            subtree: true, childList: true, attributes: true, characterData: true
+        });
+    }
+    const stamp = window.__smVisibility.id + ':' + window.__smVisibility.gen + ':' + els.length;
+    if (stamp === cachedStamp) {
+        return { stamp, indices: null };
+    }
+    const vw = window.innerWidth, vh = window.innerHeight;
+    const indices = [];
+    els.forEach((el, i) => {
+        const r = el.getBoundingClientRect();
+        if (r.width <= 0 || r.height <= 0) return;
+        if (window.getComputedStyle(el).visibility === 'hidden') return;
+        if (r.left >= 0 && r.top >= 0 && r.right <= vw && r.bottom <= vh) indices.push(i);
+    });
+    return { stamp, indices };
+}
+"""
+
+
+def _visible_indices(locator: Locator, cached_stamp: Optional[str] = None) -> Dict:
+    return locator.evaluate_all(_VISIBLE_INDICES_JS, cached_stamp)
+
+
+@metrics.timed("browse.visible_locators")
 def get_visible_locators(page: Page, selector: str) -> List[Locator]:
+    """
+    Returns a locator for every element matching `selector` that is visible and fully
+    inside the viewport. Visibility and geometry for all matches are measured in one
+    in-page script, so this costs a single round trip however many elements match.
+    """
     locator = page.locator(selector)
+    result = _visible_indices(locator)
+    return [locator.nth(i) for i in result["indices"]]
+
+
+class VisibleLocatorCache:
+    """
+    Cached `get_visible_locators` for one page. A result is reused until the page
+    scrolls, resizes, mutates or navigates; checking that still takes one round trip,
+    but skips measuring every element when nothing has changed.
+    """
+
+    def __init__(self, page: Page):
+        self.page = page
+        self._cache: Dict[str, Tuple[str, List[int]]] = {}
+
+    def get(self, selector: str) -> List[Locator]:
+        locator = self.page.locator(selector)
+        cached_stamp, cached_indices = self._cache.get(selector, (None, []))
+        result = _visible_indices(locator, cached_stamp)
+        if result["indices"] is None:
+            indices = cached_indices
+        else:
+            indices = result["indices"]
+            self._cache[selector] = (result["stamp"], indices)
+        return [locator.nth(i) for i in indices]
 
-    count = locator.count()
-    locators: List[Locator] = []
-
-    # Get current viewport size
-    vp = page.evaluate("() => ({ width: window.innerWidth, height: window.innerHeight })")
-
-    for i in range(count):
-        el = locator.nth(i)
-        if el.is_visible():
-            bb = el.bounding_box()
-            if bb and bb["width"] > 0 and bb["height"] > 0:
-                if (
-                    bb["x"] >= 0 and bb["y"] >= 0 and
-                    bb["x"] + bb["width"] <= vp["width"] and
-                    bb["y"] + bb["height"] <= vp["height"]
-                ):
-                    locators.append(el)
-
-    return locators
\ No newline at end of file
+    def clear(self) -> None:
+        self._cache.clear()
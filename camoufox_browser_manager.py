@@ -1,14 +1,25 @@
 import asyncio
 import os
-import pprint
+from contextlib import AsyncExitStack, ExitStack
 
+from pathlib import Path
+
+from browserforge.fingerprints import Fingerprint
+from camoufox.async_api import AsyncCamoufox
 from camoufox.sync_api import Camoufox, BrowserContext # Import BrowserContext
 from profile_store import load_or_create_fp, _paths
-from typing import Callable, Any
+from profile_template import clone_template
+from typing import Awaitable, Callable, Any, Dict, Optional
 
+import asset_cache
+import metrics
+import resource_policy
+import target_pool
+from egress import Egress, default_egress
+from asset_cache import CacheStats
 from profile import Profile
+from resource_policy import ResourcePolicy, SessionTraffic
 from util import print_filtered_traceback
-from vpn import connect_and_verify, disconnect_vpn
 
 
 class CamoufoxBrowser:
@@ -16,27 +27,86 @@ class CamoufoxBrowser:
     Manages the lifecycle of a Camoufox browser instance for a specific profile.
     Initializes with a Profile object.
     """
-    def __init__(self, profile_data: Profile):
+    # Seed brand-new profile directories from the golden template (see profile_template).
+    use_template: bool = True
+    # SM_HEADLESS=1 (or "virtual") hides the window; SM_GEOIP=0 skips the public-IP lookup,
+    # which an offline run such as the benchmark can't do.
+    headless: bool | str = "virtual" if os.environ.get("SM_HEADLESS") == "virtual" else os.environ.get("SM_HEADLESS") == "1"
+    geoip: bool = os.environ.get("SM_GEOIP", "1") != "0"
+    # Request policy for the whole session (SM_RESOURCE_POLICY, default FULL, which routes
+    # nothing); activities such as instagram.explore switch to a lighter one while they
+    # run. None skips the router and its traffic report altogether.
+    routing_policy: Optional[ResourcePolicy] = resource_policy.default_policy()
+    # Serve hash-named static assets from the cache shared by all profiles (SM_ASSET_CACHE=1).
+    use_asset_cache: bool = os.environ.get("SM_ASSET_CACHE") == "1"
+    # Start filling the search-target pool while the browser starts (SM_PREFETCH_TARGETS=0: don't).
+    prefetch_targets: bool = os.environ.get("SM_PREFETCH_TARGETS", "1") != "0"
+
+    def __init__(self, profile_data: Profile, egress: Optional[Egress] = None):
         self.profile = profile_data
+        # How this session reaches the internet; defaults to SM_EGRESS (the system-wide PIA VPN).
+        self.egress = egress or default_egress()
+        # Byte accounting and asset-cache hits for the session when routing is on.
+        self.traffic: Optional[SessionTraffic] = None
+        self.cache_stats: Optional[CacheStats] = None
 
-    """
-        if not all([self.profile.profile,
-                    self.profile.proxy_address,
-                    self.profile.proxy_port,
-                    self.profile.proxy_username,
-                    self.profile.proxy_password]):
-            raise ValueError(
-                f"Incomplete profile data provided for CamoufoxBrowser for profile: {self.profile.profile}"
-            )
-        if self.profile.proxy_username is None:
-            raise ValueError(
-                f"Proxy username is missing for profile: {self.profile.profile}"
-            )
-    """
+    def camoufox_options(self, fp: Fingerprint, profile_dir: Path) -> Dict[str, Any]:
+        """
+        Builds the keyword arguments passed to `Camoufox(...)` for this profile,
+        including the upstream proxy chosen by its egress, if any.
 
+        Args:
+            fp: The profile's persisted fingerprint.
+            profile_dir: The profile's persistent user_data_dir.
+        """
+        options = dict(
+            persistent_context=True,
+            user_data_dir=str(profile_dir),
+            fingerprint=fp,
+            geoip=self.geoip,               # resolved through the proxy when there is one
+            headless=self.headless,
+            i_know_what_im_doing=True,
+            humanize = 1.0,
+            locale="en-US",
+            config={
+                'disableTheming': True
+            }
+        )
+        proxy = self.egress.proxy_for(self.profile)
+        if proxy is not None:
+            options["proxy"] = proxy
+        return options
+
+    def _report_traffic(self) -> None:
+        parts = [x.describe() for x in (self.traffic, self.cache_stats) if x is not None]
+        if parts:
+            print(f"{self.profile.profile}: {'; '.join(parts)}")
+
+    def install_routing(self, ctx: BrowserContext, stack: ExitStack) -> None:
+        """
+        Installs the shared asset cache and `routing_policy`, whichever are enabled, and
+        reports the session's traffic when `stack` unwinds. The cache goes first so the
+        policy (which Playwright consults first) can still block before it is reached.
+        """
+        if self.use_asset_cache:
+            self.cache_stats = asset_cache.install(ctx, asset_cache.shared_cache()).stats
+        if self.routing_policy is not None:
+            self.traffic = resource_policy.install(ctx, self.routing_policy).traffic
+        stack.callback(self._report_traffic)
+
+    async def async_install_routing(self, ctx: Any, stack: AsyncExitStack) -> None:
+        """
+        `install_routing` for an async BrowserContext.
+        """
+        if self.use_asset_cache:
+            cache = await asyncio.to_thread(asset_cache.shared_cache)
+            self.cache_stats = (await asset_cache.async_install(ctx, cache)).stats
+        if self.routing_policy is not None:
+            self.traffic = (await resource_policy.async_install(ctx, self.routing_policy)).traffic
+        stack.callback(self._report_traffic)
 
     # Update the type hint for playwright_activity to include BrowserContext
-    def launch(self, playwright_activity: Callable[[Any, Any, BrowserContext], None]):
+    def launch(self, playwright_activity: Callable[[Any, Any, BrowserContext], Any], reraise: bool = False) -> Any:
         """
         Launches a Camoufox browser instance with the configured profile and proxy,
         then executes the provided Playwright activity.
@@ -48,40 +118,95 @@ class CamoufoxBrowser:
                                  3. The Camoufox `BrowserContext` object.
                                  This function should contain all the specific Playwright actions
                                  you want to perform within the browser.
+            reraise: If True, errors raised inside the browser session are re-raised
+                     after being printed instead of being swallowed.
+
+        Returns:
+            Whatever `playwright_activity` returns, or None if it failed and `reraise` is False.
         """
 
 
-        if self.profile.code is not None:
-            asyncio.run(connect_and_verify(self.profile))
-
-        fp = load_or_create_fp(self.profile.profile)
-        #pprint.pprint(fp)
-        profile_dir, _ = _paths(self.profile.profile)
-
-        try:
-            with Camoufox(
-
-                    persistent_context=True,
-                    user_data_dir=str(profile_dir),
-                    fingerprint=fp,
-                    geoip=True,
-                    i_know_what_im_doing=True,
-                    #proxy={
-                    #    "server": f"http://{self.profile.proxy_address}:{self.profile.proxy_port}",
-                    #    "username": self.profile.proxy_username,
-                    #    "password": self.profile.proxy_password,
-                    #},
-                    humanize = 1.0,
-                    locale="en-US",
-                    config={
-                        'disableTheming': True
-                    }
-            ) as ctx:
-                page = ctx.pages[0]
-
-                # Pass the ctx object to the playwright_activity
-                playwright_activity(self, ctx, page)
-
-        except Exception as e:
-            print(f"An error occurred for profile {self.profile.profile}: {e}")
-            print_filtered_traceback()
\ No newline at end of file
+        target_pool.current_account.set(self.profile.profile)
+        if self.prefetch_targets:
+            target_pool.default_pool()
+        with metrics.span("session", profile=self.profile.profile):
+            with metrics.span("egress.connect"):
+                self.egress.connect(self.profile)
+
+            with metrics.span("profile.prepare"):
+                fp = load_or_create_fp(self.profile.profile)
+                profile_dir, _ = _paths(self.profile.profile)
+                if self.use_template:
+                    clone_template(profile_dir)
+
+            try:
+                with ExitStack() as stack:
+                    with metrics.span("browser.start"):
+                        ctx = stack.enter_context(Camoufox(**self.camoufox_options(fp, profile_dir)))
+                        self.install_routing(ctx, stack)
+                        page = ctx.pages[0]
+
+                    # Pass the ctx object to the playwright_activity
+                    with metrics.span("activity"):
+                        return playwright_activity(self, ctx, page)
+
+            except Exception as e:
+                print(f"An error occurred for profile {self.profile.profile}: {e}")
+                print_filtered_traceback()
+                if reraise:
+                    raise
+                return None
+
+
+class AsyncCamoufoxBrowser(CamoufoxBrowser):
+    """
+    Async-native variant of CamoufoxBrowser built on `camoufox.async_api`.
+    Many of these can share one event loop; the activity is a coroutine function
+    and should use the `async_*` helpers from util and browse for its pauses.
+    """
+
+    async def launch(self, playwright_activity: Callable[[Any, Any, Any], Awaitable[Any]], reraise: bool = False) -> Any:
+        """
+        Launches a Camoufox browser instance for the profile and awaits the provided activity.
+
+        Args:
+            playwright_activity: A coroutine function taking the AsyncCamoufoxBrowser instance,
+                                 the async `BrowserContext` and the async `Page`.
+            reraise: If True, errors raised inside the browser session are re-raised
+                     after being printed instead of being swallowed.
+
+        Returns:
+            Whatever `playwright_activity` returns, or None if it failed and `reraise` is False.
+        """
+        # Each session runs in its own task, so this doesn't leak into other sessions.
+        target_pool.current_account.set(self.profile.profile)
+        if self.prefetch_targets:
+            target_pool.default_pool()
+        with metrics.span("session", profile=self.profile.profile):
+            with metrics.span("egress.connect"):
+                await self.egress.async_connect(self.profile)
+
+            with metrics.span("profile.prepare"):
+                # Fingerprint loading/generation is blocking work; keep it off the event loop.
+                fp = await asyncio.to_thread(load_or_create_fp, self.profile.profile)
+                profile_dir, _ = _paths(self.profile.profile)
+                if self.use_template:
+                    # Building the template uses the sync API, which can't run on the event loop thread.
+                    await asyncio.to_thread(clone_template, profile_dir)
+
+            try:
+                async with AsyncExitStack() as stack:
+                    with metrics.span("browser.start"):
+                        ctx = await stack.enter_async_context(AsyncCamoufox(**self.camoufox_options(fp, profile_dir)))
+                        await self.async_install_routing(ctx, stack)
+                        page = ctx.pages[0]
+
+                    with metrics.span("activity"):
+                        return await playwright_activity(self, ctx, page)
+
+            except Exception as e:
+                print(f"An error occurred for profile {self.profile.profile}: {e}")
+                print_filtered_traceback()
+                if reraise:
+                    raise
+                return None
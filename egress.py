@@ -0,0 +1,197 @@
+# egress.py – how a browser session reaches the internet: the global VPN or its own proxy
+import hashlib
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from profile import Profile
+from vpn import connect_and_verify, run_sync
+
+
+@dataclass(frozen=True)
+class Proxy:
+    """
+    One upstream HTTP proxy, as listed in files like `Webshare 20 proxies.txt`.
+    """
+    host: str
+    port: int
+    username: Optional[str] = None
+    password: Optional[str] = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    @classmethod
+    def from_line(cls, line: str) -> 'Proxy':
+        """
+        Parses a `host:port` or `host:port:username:password` line.
+        """
+        parts = line.strip().split(":")
+        if len(parts) not in (2, 4):
+            raise ValueError(f"Expected host:port[:username:password], got {line!r}")
+        host, port = parts[0], int(parts[1])
+        username, password = (parts[2], parts[3]) if len(parts) == 4 else (None, None)
+        return cls(host=host, port=port, username=username, password=password)
+
+    def playwright(self) -> Dict[str, str]:
+        """
+        The proxy in the format Camoufox/Playwright expect for `proxy=`.
+        """
+        settings = {"server": f"http://{self.host}:{self.port}"}
+        if self.username is not None:
+            settings["username"] = self.username
+            settings["password"] = self.password
+        return settings
+
+
+def load_proxy_file(path: Path) -> List[Proxy]:
+    """
+    Reads one proxy per line, skipping blank lines and # comments.
+    """
+    proxies = []
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            proxies.append(Proxy.from_line(line))
+    return proxies
+
+
+class Egress:
+    """
+    Decides how a profile's browser session reaches the internet. `connect` runs before
+    the browser starts; `proxy_for` returns the `proxy=` setting for that browser, if any.
+    """
+    # True when sessions share one machine-wide tunnel and so can't overlap across regions.
+    uses_vpn = False
+
+    def connect(self, profile: Profile) -> None:
+        pass
+
+    async def async_connect(self, profile: Profile) -> None:
+        pass
+
+    def proxy_for(self, profile: Profile) -> Optional[Dict[str, str]]:
+        return None
+
+    def bind(self, profile: Profile) -> Optional['Egress']:
+        """
+        The egress one session of `profile` should use. Pooled egresses pick (and reserve)
+        an exit here and return None while every suitable exit is at its load cap.
+        """
+        return self
+
+    def release(self, profile: Profile) -> None:
+        """
+        Called once the session started with `bind(profile)` has finished.
+        """
+        pass
+
+
+class VpnEgress(Egress):
+    """
+    The original behaviour: switch the system-wide PIA VPN to the profile's region.
+    """
+    uses_vpn = True
+
+    def connect(self, profile: Profile) -> None:
+        if profile.code is not None:
+            run_sync(connect_and_verify(profile))
+
+    async def async_connect(self, profile: Profile) -> None:
+        if profile.code is not None:
+            await connect_and_verify(profile)
+
+
+class ProxyEgress(Egress):
+    """
+    Gives every profile its own upstream proxy, so sessions with different exit IPs can
+    run side by side on one host. A profile always maps to the same proxy in the list.
+    """
+
+    def __init__(self, proxies: List[Proxy]):
+        if not proxies:
+            raise ValueError("ProxyEgress needs at least one proxy")
+        self.proxies = list(proxies)
+
+    @classmethod
+    def from_file(cls, path: Path) -> 'ProxyEgress':
+        return cls(load_proxy_file(path))
+
+    def proxy_for(self, profile: Profile) -> Optional[Dict[str, str]]:
+        # A stable hash (unlike hash()) so the assignment survives restarts.
+        digest = hashlib.sha1(profile.profile.encode()).digest()
+        return self.proxies[int.from_bytes(digest[:8], "big") % len(self.proxies)].playwright()
+
+
+class ProfileProxyEgress(Egress):
+    """
+    Uses the proxy the backend sends with each account (`proxy_address`, `proxy_port`,
+    `proxy_username`, `proxy_password`), falling back to `fallback` when it has none.
+    """
+
+    def __init__(self, fallback: Optional[Egress] = None):
+        self.fallback = fallback or VpnEgress()
+
+    def _own_proxy(self, profile: Profile) -> Optional[Proxy]:
+        if not profile.proxy_address or not profile.proxy_port:
+            return None
+        return Proxy(profile.proxy_address, int(profile.proxy_port), profile.proxy_username, profile.proxy_password)
+
+    @property
+    def uses_vpn(self) -> bool:
+        return self.fallback.uses_vpn
+
+    def connect(self, profile: Profile) -> None:
+        if self._own_proxy(profile) is None:
+            self.fallback.connect(profile)
+
+    async def async_connect(self, profile: Profile) -> None:
+        if self._own_proxy(profile) is None:
+            await self.fallback.async_connect(profile)
+
+    def proxy_for(self, profile: Profile) -> Optional[Dict[str, str]]:
+        proxy = self._own_proxy(profile)
+        return proxy.playwright() if proxy else self.fallback.proxy_for(profile)
+
+
+_default_egress: Optional[Egress] = None
+_default_egress_lock = threading.Lock()
+
+
+def egress_from_spec(spec: str) -> Egress:
+    """
+    Builds an egress from a setting such as SM_EGRESS:
+
+        vpn                 the PIA VPN (default)
+        proxy:<file>        ProxyEgress over the proxies listed in <file>
+        pool:<file>         proxy_pool.PooledProxyEgress over <file>, health-checked
+        profile             the account's own proxy, else the VPN (ProfileProxyEgress)
+    """
+    kind, _, arg = spec.strip().partition(":")
+    if kind in ("", "vpn"):
+        return VpnEgress()
+    if kind == "profile":
+        return ProfileProxyEgress()
+    if kind in ("proxy", "pool") and arg:
+        if kind == "proxy":
+            return ProxyEgress.from_file(Path(arg))
+        # proxy_pool builds on this module, so it can only be imported here.
+        from proxy_pool import PooledProxyEgress, ProxyPool
+        pool = ProxyPool.from_file(Path(arg))
+        pool.start_health_checks()
+        return PooledProxyEgress(pool)
+    raise ValueError(f"Unknown egress {spec!r}; expected vpn, profile, proxy:<file> or pool:<file>")
+
+
+def default_egress() -> Egress:
+    """
+    The process-wide egress selected by SM_EGRESS, used wherever none is passed in.
+    """
+    global _default_egress
+    with _default_egress_lock:
+        if _default_egress is None:
+            _default_egress = egress_from_spec(os.environ.get("SM_EGRESS", "vpn"))
+        return _default_egress
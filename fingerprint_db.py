@@ -0,0 +1,186 @@
+# fingerprint_db.py – one indexed SQLite store for every profile's fingerprint
+import json
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import asdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from browserforge.fingerprints import Fingerprint, NavigatorFingerprint, ScreenFingerprint, VideoCard
+
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    profile       TEXT PRIMARY KEY,
+    os            TEXT NOT NULL,
+    user_agent    TEXT NOT NULL,
+    screen_width  INTEGER NOT NULL,
+    screen_height INTEGER NOT NULL,
+    created_at    REAL NOT NULL,
+    data          BLOB NOT NULL          -- zlib-compressed JSON, see encode_fp()
+);
+CREATE INDEX IF NOT EXISTS fingerprints_os ON fingerprints (os);
+"""
+
+
+def encode_fp(fp: Fingerprint) -> bytes:
+    """
+    Compact serialized form of a fingerprint: zlib-compressed JSON of its fields.
+    Unlike a pickle it doesn't depend on browserforge's class layout to be read back.
+    """
+    return zlib.compress(json.dumps(asdict(fp), separators=(",", ":")).encode(), 6)
+
+
+def decode_fp(data: bytes) -> Fingerprint:
+    d = json.loads(zlib.decompress(data))
+    return Fingerprint(
+        **{
+            **d,
+            "screen": ScreenFingerprint(**d["screen"]),
+            "navigator": NavigatorFingerprint(**d["navigator"]),
+            "videoCard": VideoCard(**d["videoCard"]) if d["videoCard"] is not None else None,
+        }
+    )
+
+
+def fp_os(fp: Fingerprint) -> str:
+    """
+    The operating system a fingerprint claims, from its navigator.platform.
+    """
+    platform = fp.navigator.platform.lower()
+    if platform.startswith("win"):
+        return "windows"
+    if platform.startswith("mac"):
+        return "macos"
+    if "linux" in platform:
+        return "linux"
+    return platform or "unknown"
+
+
+class FingerprintStore:
+    """
+    All profiles' fingerprints in a single SQLite database, keyed by profile name.
+
+    Writes are transactional (so a crash never leaves a half-written fingerprint),
+    the schema version is tracked in `PRAGMA user_version`, and the os/user-agent/screen
+    columns are indexed so bulk questions are answered without decoding any fingerprint.
+    WAL mode lets several runner processes read and write the same file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._migrate_schema()
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads, so keep one per thread.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _migrate_schema(self) -> None:
+        conn = self._conn()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version > SCHEMA_VERSION:
+            raise RuntimeError(
+                f"{self.path} has schema version {version}, newer than this code supports ({SCHEMA_VERSION})."
+            )
+        if version < SCHEMA_VERSION:
+            with conn:
+                conn.executescript(_SCHEMA)
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def get(self, profile: str) -> Optional[Fingerprint]:
+        row = self._conn().execute("SELECT data FROM fingerprints WHERE profile = ?", (profile,)).fetchone()
+        return decode_fp(row[0]) if row else None
+
+    def put(self, profile: str, fp: Fingerprint) -> None:
+        self.put_many([(profile, fp)])
+
+    def put_many(self, items: Iterable[Tuple[str, Fingerprint]]) -> int:
+        """
+        Stores several fingerprints in one transaction. Returns how many were written.
+        """
+        now = time.time()
+        rows = [
+            (profile, fp_os(fp), fp.navigator.userAgent, fp.screen.width, fp.screen.height, now, encode_fp(fp))
+            for profile, fp in items
+        ]
+        with self._conn() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO fingerprints "
+                "(profile, os, user_agent, screen_width, screen_height, created_at, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def profiles(self) -> List[str]:
+        return [row[0] for row in self._conn().execute("SELECT profile FROM fingerprints ORDER BY profile")]
+
+    def missing(self, profiles: Iterable[str]) -> List[str]:
+        """
+        Which of `profiles` have no fingerprint stored, in their original order.
+        """
+        conn = self._conn()
+        wanted = list(dict.fromkeys(profiles))
+        with conn:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (profile TEXT PRIMARY KEY, pos INTEGER)")
+            conn.execute("DELETE FROM wanted")
+            conn.executemany("INSERT INTO wanted VALUES (?, ?)", ((p, i) for i, p in enumerate(wanted)))
+            rows = conn.execute(
+                "SELECT w.profile FROM wanted w LEFT JOIN fingerprints f ON f.profile = w.profile "
+                "WHERE f.profile IS NULL ORDER BY w.pos"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def os_distribution(self) -> Dict[str, int]:
+        rows = self._conn().execute("SELECT os, COUNT(*) FROM fingerprints GROUP BY os ORDER BY COUNT(*) DESC")
+        return {os_name: count for os_name, count in rows}
+
+    def migrate_from_pickles(self, base: Path, remove: bool = False) -> int:
+        """
+        Imports every `<base>/<profile>/fingerprint.pkl` that isn't in the store yet.
+
+        Args:
+            base: The directory holding the per-profile folders.
+            remove: Delete each pickle once it has been imported.
+
+        Returns:
+            The number of fingerprints imported.
+        """
+        pickles = {p.parent.name: p for p in Path(base).glob("*/fingerprint.pkl")}
+        todo = self.missing(pickles)
+        imported = self.put_many((profile, pickle.loads(pickles[profile].read_bytes())) for profile in todo)
+        if remove:
+            for profile in pickles:
+                pickles[profile].unlink()
+        return imported
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from profile_store import _BASE, fingerprint_store
+
+    parser = argparse.ArgumentParser(description="Maintain the fingerprint store.")
+    parser.add_argument("command", choices=["migrate", "stats"])
+    parser.add_argument("--remove-pickles", action="store_true", help="delete fingerprint.pkl files after import")
+    args = parser.parse_args()
+
+    store = fingerprint_store()
+    if args.command == "migrate":
+        print(f"Imported {store.migrate_from_pickles(_BASE, remove=args.remove_pickles)} fingerprint(s) into {store.path}")
+    else:
+        print(f"{len(store.profiles())} fingerprint(s) in {store.path}")
+        for os_name, count in store.os_distribution().items():
+            print(f"  {os_name}: {count}")
@@ -0,0 +1,308 @@
+# harvest.py – post and profile records parsed from the page's own API responses while scrolling
+import json
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import metrics
+
+# URL path fragments of the JSON endpoints the feed, explore grid and profile pages
+# load their items from. Everything else the page downloads is ignored unread.
+API_PATTERNS: Tuple[str, ...] = (
+    "/graphql",
+    "/api/graphql",
+    "/api/v1/feed/",
+    "/api/v1/discover/",
+    "/api/v1/clips/",
+    "/api/v1/users/",
+)
+
+# Scroll rounds in a row without a single new post before the feed counts as exhausted.
+DEFAULT_STALL_ROUNDS = int(os.environ.get("SM_HARVEST_STALL_ROUNDS", "4"))
+
+# Some endpoints prefix their JSON with an anti-hijacking guard.
+_JSON_GUARDS = ("for (;;);", ")]}'")
+
+
+@dataclass
+class PostRecord:
+    id: str
+    code: str                            # the shortcode in /p/<code>/
+    author: Optional[str] = None
+    taken_at: Optional[int] = None
+    caption: Optional[str] = None
+    like_count: Optional[int] = None
+    comment_count: Optional[int] = None
+    media_type: Optional[int] = None     # 1 image, 2 video, 8 carousel (GraphQL: None)
+    source: str = ""                     # path of the response it came from
+
+
+@dataclass
+class ProfileRecord:
+    id: str
+    username: str
+    full_name: Optional[str] = None
+    is_verified: Optional[bool] = None
+    is_private: Optional[bool] = None
+    follower_count: Optional[int] = None
+    source: str = ""
+
+
+HarvestRecord = Union[PostRecord, ProfileRecord]
+
+
+def _id(node: Dict[str, Any]) -> Optional[str]:
+    value = node.get("pk", node.get("id"))
+    return None if value is None else str(value).split("_", 1)[0]
+
+
+def _caption(node: Dict[str, Any]) -> Optional[str]:
+    caption = node.get("caption")
+    if isinstance(caption, dict):
+        return caption.get("text")
+    if isinstance(caption, str):
+        return caption
+    # GraphQL: edge_media_to_caption.edges[0].node.text
+    edges = (node.get("edge_media_to_caption") or {}).get("edges") or []
+    if edges and isinstance(edges[0], dict):
+        return (edges[0].get("node") or {}).get("text")
+    return None
+
+
+def _count(node: Dict[str, Any], key: str, *edges: str) -> Optional[int]:
+    if isinstance(node.get(key), int):
+        return node[key]
+    for edge in edges:
+        value = (node.get(edge) or {}).get("count")
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def _as_post(node: Dict[str, Any], source: str) -> Optional[PostRecord]:
+    code = node.get("code") or node.get("shortcode")
+    post_id = _id(node)
+    if not isinstance(code, str) or post_id is None:
+        return None
+    author = node.get("user") or node.get("owner") or {}
+    return PostRecord(
+        id=post_id,
+        code=code,
+        author=author.get("username") if isinstance(author, dict) else None,
+        taken_at=node.get("taken_at") or node.get("taken_at_timestamp"),
+        caption=_caption(node),
+        like_count=_count(node, "like_count", "edge_liked_by", "edge_media_preview_like"),
+        comment_count=_count(node, "comment_count", "edge_media_to_comment"),
+        media_type=node.get("media_type"),
+        source=source,
+    )
+
+
+def _as_profile(node: Dict[str, Any], source: str) -> Optional[ProfileRecord]:
+    username = node.get("username")
+    user_id = _id(node)
+    if not isinstance(username, str) or user_id is None:
+        return None
+    return ProfileRecord(
+        id=user_id,
+        username=username,
+        full_name=node.get("full_name"),
+        is_verified=node.get("is_verified"),
+        is_private=node.get("is_private"),
+        follower_count=_count(node, "follower_count", "edge_followed_by"),
+        source=source,
+    )
+
+
+def iter_records(payload: Any, source: str = "") -> Iterator[HarvestRecord]:
+    """
+    Yields every post and profile found anywhere in a decoded API payload, in document
+    order. Works on both the REST (`items[].media`, `user`) and the GraphQL
+    (`edges[].node`, `owner`) shapes, since it recognises records by their fields
+    rather than by where they sit.
+    """
+    stack: List[Any] = [payload]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if "code" in node or "shortcode" in node:
+                post = _as_post(node, source)
+                if post is not None:
+                    yield post
+            elif "username" in node:
+                profile = _as_profile(node, source)
+                if profile is not None:
+                    yield profile
+            children = node.values()
+        elif isinstance(node, list):
+            children = node
+        else:
+            continue
+        # Reversed, so the stack pops them in their original order.
+        stack.extend(child for child in reversed(list(children)) if isinstance(child, (dict, list)))
+
+
+def parse_body(text: str) -> Any:
+    """
+    Decodes a response body, dropping a leading anti-hijacking guard.
+    """
+    text = text.lstrip()
+    for guard in _JSON_GUARDS:
+        if text.startswith(guard):
+            text = text[len(guard):]
+    return json.loads(text)
+
+
+def is_api_response(url: str) -> bool:
+    path = urlsplit(url).path
+    return any(pattern in path for pattern in API_PATTERNS)
+
+
+class Harvester:
+    """
+    Collects the posts and profiles the page loads while an activity scrolls.
+
+    The response listener only queues matching responses; their bodies are read and
+    parsed in `poll()`, which the scrolling loop calls between rounds, so the browser's
+    event dispatch is never held up by parsing. Each body is decoded once, walked for
+    records and dropped. Records are de-duplicated by id.
+
+    Args:
+        target: Stop once this many distinct posts have been collected (None: no limit).
+        stall_rounds: Stop after this many `poll()` rounds in a row without a new post.
+        on_record: Called with every new record, e.g. to write it out as it arrives.
+    """
+
+    def __init__(self, target: Optional[int] = None, stall_rounds: int = DEFAULT_STALL_ROUNDS,
+                 on_record: Optional[Callable[[HarvestRecord], None]] = None):
+        self.target = target
+        self.stall_rounds = stall_rounds
+        self.on_record = on_record
+        self.posts: Dict[str, PostRecord] = {}
+        self.profiles: Dict[str, ProfileRecord] = {}
+        self.responses = 0
+        self.rounds = 0
+        self.stalled_rounds = 0
+        self.stop_reason: Optional[str] = None
+        self._pending: Deque[Any] = deque()
+        self._page = None
+        self._started = time.monotonic()
+
+    def attach(self, page) -> 'Harvester':
+        self._page = page
+        self._started = time.monotonic()
+        page.on("response", self._on_response)
+        return self
+
+    def detach(self) -> None:
+        if self._page is not None:
+            self._page.remove_listener("response", self._on_response)
+            self._page = None
+
+    def __enter__(self) -> 'Harvester':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.detach()
+
+    def _on_response(self, response) -> None:
+        if response.status != 200 or response.request.resource_type not in ("xhr", "fetch"):
+            return
+        if is_api_response(response.url):
+            self._pending.append(response)
+
+    def _add(self, payload: Any, source: str) -> int:
+        new_posts = 0
+        for record in iter_records(payload, source):
+            if isinstance(record, PostRecord):
+                if record.id in self.posts:
+                    continue
+                self.posts[record.id] = record
+                new_posts += 1
+            else:
+                if record.id in self.profiles:
+                    continue
+                self.profiles[record.id] = record
+            if self.on_record is not None:
+                self.on_record(record)
+        return new_posts
+
+    def _end_round(self, new_posts: int) -> int:
+        self.rounds += 1
+        self.stalled_rounds = 0 if new_posts else self.stalled_rounds + 1
+        if self.target is not None and len(self.posts) >= self.target:
+            self.stop_reason = "target"
+        elif self.stalled_rounds >= self.stall_rounds:
+            self.stop_reason = "stalled"
+        return new_posts
+
+    def poll(self) -> int:
+        """
+        Parses the responses received since the last call and ends a scroll round.
+        Returns the number of new posts.
+        """
+        new_posts = 0
+        if self._pending:
+            with metrics.span("harvest.parse"):
+                while self._pending:
+                    response = self._pending.popleft()
+                    try:
+                        text = response.text()
+                    except Exception:
+                        # The body is gone once the page navigates away; nothing to recover.
+                        continue
+                    new_posts += self._ingest(text, response.url)
+        return self._end_round(new_posts)
+
+    async def async_poll(self) -> int:
+        """
+        `poll` for an async Page.
+        """
+        new_posts = 0
+        if self._pending:
+            with metrics.span("harvest.parse"):
+                while self._pending:
+                    response = self._pending.popleft()
+                    try:
+                        text = await response.text()
+                    except Exception:
+                        continue
+                    new_posts += self._ingest(text, response.url)
+        return self._end_round(new_posts)
+
+    def _ingest(self, text: str, url: str) -> int:
+        try:
+            payload = parse_body(text)
+        except ValueError:
+            return 0
+        self.responses += 1
+        return self._add(payload, urlsplit(url).path)
+
+    @property
+    def done(self) -> bool:
+        return self.stop_reason is not None
+
+    @property
+    def posts_per_minute(self) -> float:
+        elapsed = time.monotonic() - self._started
+        return len(self.posts) * 60 / elapsed if elapsed > 0 else 0.0
+
+    def describe(self) -> str:
+        reason = f", stopped: {self.stop_reason}" if self.stop_reason else ""
+        return (f"{len(self.posts)} post(s), {len(self.profiles)} profile(s) from {self.responses} "
+                f"response(s) in {self.rounds} round(s), {self.posts_per_minute:.0f}/min{reason}")
+
+
+def harvesting(page, target: Optional[int] = None, stall_rounds: int = DEFAULT_STALL_ROUNDS,
+               on_record: Optional[Callable[[HarvestRecord], None]] = None) -> Harvester:
+    """
+    A Harvester listening on `page`; use it as a context manager so the listener is
+    removed afterwards:
+
+        with harvesting(page, target=200) as harvester:
+            instagram.explore(page, seconds=120, harvester=harvester)
+    """
+    return Harvester(target, stall_rounds, on_record).attach(page)
@@ -1,67 +1,96 @@
-import time
+import os
 import random
-from typing import List
+from typing import List, Optional
 
 from playwright.sync_api import Page, Locator
 import browse
+from harvest import Harvester
+import metrics
+import pacing
+from readiness import path_is, settle
+from resource_policy import PASSIVE, with_policy
+from target_pool import default_pool
 from util import wait, human_type
-from web import get_random_profile
 
+# Where sessions start. SM_INSTAGRAM_URL points them at a local fixture site instead.
+INSTAGRAM_URL = os.environ.get("SM_INSTAGRAM_URL", "https://www.instagram.com")
 
+@metrics.timed("instagram.go_home")
 def go_home(page: Page):
     locator: Locator = page.locator('svg[aria-label="Home"]')
     locator.first.click()
-    wait(1, 2)
+    settle(page, "home", url=path_is("/"), floor=(0.5, 1.5))
 
-def scroll_for_a_while(page: Page, seconds: int = 59):
-    start = time.time()
-    while time.time() - start < seconds:
+@metrics.timed("instagram.scroll_for_a_while")
+@with_policy(PASSIVE)
+def scroll_for_a_while(page: Page, seconds: int = 59, harvester: Optional[Harvester] = None):
+    """
+    Scrolls the current feed for up to `seconds`. With a `harvester` attached to the
+    page, the posts the feed loads are collected as it goes, and scrolling stops early
+    once the harvester has its target or the feed stops producing new posts.
+    """
+    start = pacing.now()
+    while pacing.now() - start < seconds:
         # Scroll down for a bit
         browse.scroll_down(page, min_turns=3, max_turns=6)
         wait(1, 2)
+        if harvester is not None:
+            harvester.poll()
+            if harvester.done:
+                metrics.annotate(harvested=len(harvester.posts), stop=harvester.stop_reason)
+                break
         # Occasionally scroll up a little
         if random.random() < 0.1:
             browse.scroll_up(page, min_turns=1, max_turns=2)
         wait(2, 5)
 
-def explore(page: Page, seconds: int = 59):
+@metrics.timed("instagram.explore")
+@with_policy(PASSIVE)
+def explore(page: Page, seconds: int = 59, harvester: Optional[Harvester] = None):
     locator: Locator = page.locator('a[href="/explore/"]')
     locator.first.click()
-    wait(5, 7)
-    scroll_for_a_while(page, seconds)
+    settle(page, "explore", url=path_is("/explore/"))
+    scroll_for_a_while(page, seconds, harvester)
     go_home(page)
 
+@metrics.timed("instagram.notifications")
 def notifications(page: Page):
     locator: Locator = page.locator('svg[aria-label="Notifications"]')
     locator.first.click()
-    wait(5, 7)
+    # The panel has no URL of its own; once its requests are done, read it for a moment.
+    settle(page, "notifications", network_quiet=True, floor=(2, 4))
     locator.first.click()
 
+@metrics.timed("instagram.profile")
 def profile (page: Page, profile_name: str):
     selector:str = 'a[href="/' + profile_name + '/"][tabindex="0"]'
     locator: Locator = page.locator(selector)
     locator.first.click(force=True)
-    wait(5, 7)
+    settle(page, "profile", url=path_is(f"/{profile_name}/"), floor=(2, 4))
     go_home(page)
 
-def search(page: Page, go_home_after = True, profile_name = None):
+@metrics.timed("instagram.search")
+def search(page: Page, go_home_after = True, profile_name = None, account: str = None):
+    # Pick the target before clicking so a pool refill never lands mid-interaction.
+    # `account` defaults to the session's own profile (see target_pool.current_account).
+    if profile_name is None:
+        profile_name = default_pool().take(account)
     locator: Locator = page.locator('svg[aria-label="Search"]')
     locator.first.click()
-    wait(2, 4)
-    if profile_name is None:
-        profile_name = get_random_profile()
-    human_type(page, 'input[aria-label="Search input"]', profile_name)
+    settle(page, "search_panel", selector='input[aria-label="Search input"]')
+    human_type(page, 'input[aria-label="Search input"]', profile_name, error_rate=0.03)
     page.wait_for_selector('a[href="/' + profile_name + '/"]')
     locator = page.locator('a[href="/' + profile_name + '/"]')
     locator.first.click(force=True)
-    wait(5, 7)
+    settle(page, "search_result", url=path_is(f"/{profile_name}/"), floor=(2, 4))
     if go_home_after:
         go_home(page)
 
+@metrics.timed("instagram.follow")
 def follow(page: Page):
     locators: List[Locator] = browse.get_visible_locators(page, 'xpath=//button[.//div[text()="Follow"]]')
     if locators:
         random.choice(locators).click()
-        wait(3, 5)
+        settle(page, "follow", network_quiet=True, floor=(1, 2))
     go_home(page)
 
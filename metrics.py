@@ -0,0 +1,326 @@
+# metrics.py – lightweight timing spans for every phase of a session
+import contextvars
+import functools
+import inspect
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+# Where finished spans are appended as JSON lines, and the port and interface for
+# /metrics. All are read from the environment so spawned runner workers inherit them.
+METRICS_FILE_ENV = "SM_METRICS_FILE"
+METRICS_PORT_ENV = "SM_METRICS_PORT"
+METRICS_HOST_ENV = "SM_METRICS_HOST"
+# Only this machine by default: the metrics name the accounts being run.
+DEFAULT_METRICS_HOST = "127.0.0.1"
+
+# Durations kept per span name for the percentiles.
+_MAX_SAMPLES = 1000
+
+
+def percentile(values: Iterable[float], q: float) -> Optional[float]:
+    """
+    Nearest-rank percentile (q in 0..100); None when there are no values.
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+@dataclass
+class SpanStats:
+    """
+    Aggregated timings for every span with one name. `wait_seconds` is the part spent
+    in deliberate pauses (pacing waits, backoff); the rest is real work.
+    """
+    count: int = 0
+    errors: int = 0
+    total_seconds: float = 0.0
+    wait_seconds: float = 0.0
+    samples: List[float] = field(default_factory=list)
+
+    @property
+    def work_seconds(self) -> float:
+        return max(0.0, self.total_seconds - self.wait_seconds)
+
+    @property
+    def p50(self) -> Optional[float]:
+        return percentile(self.samples, 50)
+
+    @property
+    def p95(self) -> Optional[float]:
+        return percentile(self.samples, 95)
+
+    def add(self, duration: float, wait: float, ok: bool) -> None:
+        self.count += 1
+        self.total_seconds += duration
+        self.wait_seconds += wait
+        if not ok:
+            self.errors += 1
+        self.samples.append(duration)
+        del self.samples[:-_MAX_SAMPLES]
+
+    def merge(self, other: 'SpanStats') -> None:
+        self.count += other.count
+        self.errors += other.errors
+        self.total_seconds += other.total_seconds
+        self.wait_seconds += other.wait_seconds
+        self.samples.extend(other.samples)
+        del self.samples[:-_MAX_SAMPLES]
+
+    def copy(self) -> 'SpanStats':
+        c = SpanStats()
+        c.merge(self)
+        return c
+
+
+class Span:
+    """
+    One timed phase. Created by `span(...)`; `attrs` end up in the JSONL record.
+    """
+
+    def __init__(self, name: str, attrs: Dict[str, Any], parent: Optional['Span']):
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.wait_seconds = 0.0
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar("metrics_span", default=None)
+_collectors: contextvars.ContextVar = contextvars.ContextVar("metrics_collectors", default=())
+_registry: Dict[str, SpanStats] = {}
+_lock = threading.Lock()
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def _add(target: Dict[str, SpanStats], name: str, duration: float, wait: float, ok: bool) -> None:
+    target.setdefault(name, SpanStats()).add(duration, wait, ok)
+
+
+def _write_jsonl(record: Dict[str, Any]) -> None:
+    path = os.environ.get(METRICS_FILE_ENV)
+    if not path:
+        return
+    try:
+        # One short append per span; O_APPEND keeps lines from several workers intact.
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+    except OSError as e:
+        print(f"Could not write metrics to {path}: {e}")
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Span]:
+    """
+    Times the enclosed block as `name`. Spans nest (per thread / asyncio task), and
+    pauses noted with `note_wait` count against every open span.
+
+        with metrics.span("browser.start", profile=p.profile):
+            ...
+    """
+    s = Span(name, attrs, _current.get())
+    token = _current.set(s)
+    ok, error = True, None
+    try:
+        yield s
+    except BaseException as e:
+        ok, error = False, f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        duration = time.perf_counter() - s._t0
+        with _lock:
+            _add(_registry, name, duration, s.wait_seconds, ok)
+            for collected in _collectors.get():
+                _add(collected, name, duration, s.wait_seconds, ok)
+        _write_jsonl({
+            "name": name,
+            "start": s.started,
+            "duration": round(duration, 6),
+            "wait": round(s.wait_seconds, 6),
+            "ok": ok,
+            "error": error,
+            "parent": s.parent.name if s.parent else None,
+            "pid": os.getpid(),
+            **({"attrs": attrs} if attrs else {}),
+        })
+
+
+def timed(name: Optional[str] = None) -> Callable:
+    """
+    Decorator form of `span` for plain and coroutine functions.
+    The span name defaults to `<module>.<function>`.
+    """
+    def decorate(fn: Callable) -> Callable:
+        span_name = name or f"{fn.__module__}.{fn.__name__}"
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def annotate(**attrs: Any) -> None:
+    """
+    Adds attributes to the innermost open span, if there is one.
+    """
+    s = _current.get()
+    if s is not None:
+        s.attrs.update(attrs)
+
+
+def note_wait(seconds: float) -> None:
+    """
+    Records `seconds` of deliberate waiting against every open span in this context.
+    """
+    s = _current.get()
+    while s is not None:
+        s.wait_seconds += seconds
+        s = s.parent
+
+
+@contextmanager
+def collecting() -> Iterator[Dict[str, SpanStats]]:
+    """
+    Collects the spans finished inside the block (including asyncio tasks created in
+    it) into a separate dict, e.g. for one run's report.
+    """
+    collected: Dict[str, SpanStats] = {}
+    token = _collectors.set(_collectors.get() + (collected,))
+    try:
+        yield collected
+    finally:
+        _collectors.reset(token)
+
+
+def snapshot() -> Dict[str, SpanStats]:
+    with _lock:
+        return {name: stats.copy() for name, stats in _registry.items()}
+
+
+def drain() -> Dict[str, SpanStats]:
+    """
+    Returns and clears this process's timings, e.g. to ship them from a worker process.
+    """
+    global _registry
+    with _lock:
+        drained, _registry = _registry, {}
+    return drained
+
+
+def merge(stats: Dict[str, SpanStats]) -> None:
+    """
+    Adds timings drained in another process to this one (and to open `collecting` blocks).
+    """
+    with _lock:
+        for target in (_registry, *_collectors.get()):
+            for name, s in stats.items():
+                target.setdefault(name, SpanStats()).merge(s)
+
+
+def configure(jsonl_path: Optional[Path] = None, prometheus_port: Optional[int] = None) -> None:
+    """
+    Turns on the JSONL sink and/or the Prometheus endpoint. The settings go into the
+    environment so worker processes spawned afterwards write to the same file.
+    """
+    if jsonl_path is not None:
+        os.environ[METRICS_FILE_ENV] = str(jsonl_path)
+    if prometheus_port is not None:
+        serve_prometheus(prometheus_port)
+
+
+def serve_from_env() -> None:
+    """
+    Starts the Prometheus endpoint if SM_METRICS_PORT is set, on SM_METRICS_HOST
+    (default 127.0.0.1). Called by the runners in the parent process only, so workers
+    never compete for the port.
+    """
+    port = os.environ.get(METRICS_PORT_ENV)
+    if port:
+        serve_prometheus(int(port), os.environ.get(METRICS_HOST_ENV, DEFAULT_METRICS_HOST))
+
+
+def prometheus_text(stats: Optional[Dict[str, SpanStats]] = None) -> str:
+    """
+    The timings in the Prometheus text exposition format.
+    """
+    stats = snapshot() if stats is None else stats
+    lines = [
+        "# HELP sm_span_seconds Time spent in each instrumented phase.",
+        "# TYPE sm_span_seconds summary",
+    ]
+    for name, s in sorted(stats.items()):
+        label = name.replace("\\", "\\\\").replace('"', '\\"')
+        for q, v in (("0.5", s.p50), ("0.95", s.p95)):
+            if v is not None:
+                lines.append(f'sm_span_seconds{{span="{label}",quantile="{q}"}} {v:.6f}')
+        lines.append(f'sm_span_seconds_sum{{span="{label}"}} {s.total_seconds:.6f}')
+        lines.append(f'sm_span_seconds_count{{span="{label}"}} {s.count}')
+    lines += ["# HELP sm_span_wait_seconds_total Deliberate waiting inside each phase.",
+              "# TYPE sm_span_wait_seconds_total counter"]
+    lines += [f'sm_span_wait_seconds_total{{span="{n}"}} {s.wait_seconds:.6f}' for n, s in sorted(stats.items())]
+    lines += ["# HELP sm_span_errors_total Phases that ended with an exception.",
+              "# TYPE sm_span_errors_total counter"]
+    lines += [f'sm_span_errors_total{{span="{n}"}} {s.errors}' for n, s in sorted(stats.items())]
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_prometheus(port: int, host: str = DEFAULT_METRICS_HOST) -> None:
+    """
+    Serves `/metrics` on `host`:`port` from a daemon thread (once per process). Pass
+    "0.0.0.0" to let other machines scrape it.
+    """
+    global _server
+    if _server is not None:
+        return
+    _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"Serving metrics on http://{host}:{port}/metrics")
+
+
+def print_report(stats: Optional[Dict[str, SpanStats]] = None) -> None:
+    """
+    Prints one line per span name: count, errors, total/wait/work time and p50/p95.
+    """
+    stats = snapshot() if stats is None else stats
+    if not stats:
+        return
+    print(f"{'phase':<32} {'n':>5} {'err':>4} {'total':>9} {'wait':>9} {'work':>9} {'p50':>8} {'p95':>8}")
+    for name, s in sorted(stats.items(), key=lambda item: -item[1].total_seconds):
+        print(f"{name:<32} {s.count:>5} {s.errors:>4} {s.total_seconds:>8.1f}s {s.wait_seconds:>8.1f}s "
+              f"{s.work_seconds:>8.1f}s {s.p50:>7.2f}s {s.p95:>7.2f}s")
+
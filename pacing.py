@@ -0,0 +1,128 @@
+# pacing.py – the one place human-like pauses are slept (or, in tests, only recorded)
+import asyncio
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List
+
+import metrics
+
+
+class RealClock:
+    """
+    Pauses really happen: the sync helpers sleep the thread and the async helpers
+    yield to the event loop, so other sessions on that loop run in the meantime.
+    """
+    virtual = False
+
+    def now(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+    async def async_sleep(self, seconds: float) -> None:
+        await asyncio.sleep(seconds)
+
+
+class VirtualClock:
+    """
+    Fast-forward mode: every pause is recorded and advances a virtual clock
+    instead of being slept, so flows can be tested and benchmarked at full speed.
+    """
+    virtual = True
+
+    def __init__(self, start: float = 0.0):
+        self._now = start
+        self._lock = threading.Lock()
+        self.waits: List[float] = []
+
+    @property
+    def total_waited(self) -> float:
+        return sum(self.waits)
+
+    def now(self) -> float:
+        return self._now
+
+    def sleep(self, seconds: float) -> None:
+        with self._lock:
+            self._now += seconds
+            self.waits.append(seconds)
+
+    async def async_sleep(self, seconds: float) -> None:
+        self.sleep(seconds)
+        await asyncio.sleep(0)            # still a scheduling point for other sessions
+
+
+_default_clock = RealClock()
+_clock: contextvars.ContextVar = contextvars.ContextVar("pacing_clock", default=None)
+
+
+def clock():
+    """
+    The clock in effect: the one set with `use_clock` in this context, else the process default.
+    """
+    return _clock.get() or _default_clock
+
+
+def set_default_clock(new_clock) -> None:
+    """
+    Replaces the process-wide clock, e.g. `set_default_clock(VirtualClock())` for a benchmark.
+    Unlike `use_clock` this also covers threads started afterwards.
+    """
+    global _default_clock
+    _default_clock = new_clock
+
+
+@contextmanager
+def use_clock(new_clock) -> Iterator:
+    """
+    Uses `new_clock` for pauses made in the current context (thread or asyncio task).
+    """
+    token = _clock.set(new_clock)
+    try:
+        yield new_clock
+    finally:
+        _clock.reset(token)
+
+
+@contextmanager
+def virtual_clock() -> Iterator[VirtualClock]:
+    """
+    Shorthand for `use_clock(VirtualClock())`.
+    """
+    with use_clock(VirtualClock()) as c:
+        yield c
+
+
+def now() -> float:
+    return clock().now()
+
+
+def sleep(seconds: float) -> None:
+    c = clock()
+    c.sleep(seconds)
+    if not c.virtual:
+        metrics.note_wait(seconds)
+
+
+async def async_sleep(seconds: float) -> None:
+    c = clock()
+    await c.async_sleep(seconds)
+    if not c.virtual:
+        metrics.note_wait(seconds)
+
+
+def browser_delay_ms(seconds: float, count: int = 1) -> float:
+    """
+    Converts a per-key delay that the browser itself will wait (e.g. keyboard.type's
+    `delay`) into milliseconds. Under a virtual clock the delay is recorded for all
+    `count` keys and the browser is told not to wait at all.
+    """
+    c = clock()
+    if c.virtual:
+        c.sleep(seconds * count)
+        return 0
+    metrics.note_wait(seconds * count)
+    return seconds * 1000
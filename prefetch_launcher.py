@@ -0,0 +1,251 @@
+# prefetch_launcher.py – start the next profile's browser while the current one works
+import contextvars
+import threading
+import time
+import traceback
+from contextlib import ExitStack
+from typing import Any, Callable, Iterable, Optional
+
+from camoufox.sync_api import Camoufox
+import metrics
+import target_pool
+from camoufox_browser_manager import CamoufoxBrowser
+from egress import Egress, default_egress
+from profile import Profile
+from profile_store import load_or_create_fp, _paths
+from profile_template import clone_template
+from runner import AccountResult, RunSummary
+from util import print_filtered_traceback
+
+
+class _PreparedSession(threading.Thread):
+    """
+    One account's browser session, prepared ahead of time on its own thread.
+
+    Playwright's sync API is bound to the thread that started it, so the whole
+    session (launch, activity, close) lives on this thread. Preparation runs as soon
+    as the thread starts; the activity only begins once `go` is set.
+    """
+    def __init__(self, profile_obj: Profile, activity: Callable, warm: bool, egress: Egress, bound: bool):
+        super().__init__(name=f"session-{profile_obj.profile}", daemon=True)
+        self.browser = CamoufoxBrowser(profile_obj, egress)
+        self.activity = activity
+        # When False only the fingerprint and user_data_dir are staged; the browser
+        # is started after `go` because its egress (VPN region, or a proxy slot) isn't
+        # in place yet.
+        self.warm = warm
+        # Whether `egress` came from `bind()`, i.e. holds a slot the launcher must release.
+        self.bound = bound
+        self.ready = threading.Event()
+        self.go = threading.Event()
+        self.cancelled = False
+        self.started: Optional[float] = None
+        self.result: Optional[AccountResult] = None
+        # Threads don't inherit context variables; carry the launcher's over so this
+        # session's spans land in the run's metrics.
+        self._context = contextvars.copy_context()
+
+    def run(self):
+        self._context.run(self._run_session)
+
+    def _run_session(self):
+        try:
+            with metrics.span("profile.prepare", profile=self.browser.profile.profile):
+                fp = load_or_create_fp(self.browser.profile.profile)
+                profile_dir, _ = _paths(self.browser.profile.profile)
+                if self.browser.use_template:
+                    clone_template(profile_dir)
+
+            if self.warm:
+                with ExitStack() as stack:
+                    with metrics.span("browser.start", profile=self.browser.profile.profile, prefetched=True):
+                        ctx = stack.enter_context(Camoufox(**self.browser.camoufox_options(fp, profile_dir)))
+                        self.browser.install_routing(ctx, stack)
+                        page = ctx.pages[0]
+                        page.goto("about:blank")
+                    self.ready.set()
+                    value = self._run_when_released(ctx, page)
+            else:
+                self.ready.set()
+                self.go.wait()
+                if self.cancelled:
+                    return
+                # The egress may have been bound only now, so the options are built here.
+                with ExitStack() as stack:
+                    with metrics.span("browser.start", profile=self.browser.profile.profile, prefetched=False):
+                        ctx = stack.enter_context(Camoufox(**self.browser.camoufox_options(fp, profile_dir)))
+                        self.browser.install_routing(ctx, stack)
+                    value = self._run_activity(ctx, ctx.pages[0])
+
+            if not self.cancelled:
+                self.result = AccountResult(
+                    profile=self.browser.profile.profile, ok=True, started=self.started, finished=time.time(), value=value
+                )
+        except Exception as e:
+            print(f"An error occurred for profile {self.browser.profile.profile}: {e}")
+            print_filtered_traceback()
+            self.result = AccountResult(
+                profile=self.browser.profile.profile,
+                ok=False,
+                started=self.started or time.time(),
+                finished=time.time(),
+                error=f"{type(e).__name__}: {e}",
+                traceback=traceback.format_exc(),
+            )
+        finally:
+            self.ready.set()
+
+    def _run_when_released(self, ctx, page) -> Any:
+        self.go.wait()
+        if self.cancelled:
+            return None
+        return self._run_activity(ctx, page)
+
+    def _run_activity(self, ctx, page) -> Any:
+        # Session time is measured from the moment the activity is released, not from staging.
+        self.started = time.time()
+        target_pool.current_account.set(self.browser.profile.profile)
+        with metrics.span("activity", profile=self.browser.profile.profile):
+            return self.activity(self.browser, ctx, page)
+
+    def release(self) -> None:
+        self.go.set()
+
+    def cancel(self) -> None:
+        self.cancelled = True
+        self.go.set()
+
+
+class PrefetchingLauncher:
+    """
+    Runs accounts one after another, but prepares account N+1 (fingerprint loaded,
+    user_data_dir staged and, when its egress allows, the Camoufox process started and
+    parked on about:blank) while account N's activity is still running.
+
+    A browser is only pre-started when the next profile uses the VPN region that is
+    already connected (or no VPN at all), because Camoufox resolves GeoIP at launch.
+    When the region changes, the VPN is switched after the current session closes and
+    only the fingerprint/profile directory work is saved. With a non-VPN egress every
+    session brings its own exit, so the next browser is always pre-started.
+
+    Staged sessions take their slot through `egress.bind` like run_accounts' sessions do,
+    so a pooled proxy egress's load cap holds. When the next profile's exit is at its
+    cap, it is staged cold and bound once the current session has released its slot.
+
+    The launcher is opt-in: run_accounts does not use it, since it runs sessions on
+    threads of this process rather than in worker processes and keeps no RunJournal.
+    """
+    def __init__(self, activity: Callable, egress: Optional[Egress] = None):
+        self.activity = activity
+        self.egress = egress or default_egress()
+        self.connected_code: Optional[str] = None
+
+    def _connect_if_needed(self, profile_obj: Profile) -> None:
+        if not self.egress.uses_vpn:
+            self.egress.connect(profile_obj)
+        elif profile_obj.code is not None and profile_obj.code != self.connected_code:
+            # A failed switch has already taken the old tunnel down: forget the region
+            # until the new one is confirmed, so nothing is warmed (or skips connecting)
+            # on the strength of a tunnel that is gone.
+            self.connected_code = None
+            self.egress.connect(profile_obj)
+            self.connected_code = profile_obj.code
+
+    def _prepare(self, profile_obj: Profile) -> _PreparedSession:
+        # Only called once the current profile's region is confirmed (or failed, which
+        # clears connected_code), so a warm start never runs outside the tunnel.
+        bound = self.egress.bind(profile_obj)
+        warm = bound is not None and (
+            not self.egress.uses_vpn or profile_obj.code is None or profile_obj.code == self.connected_code)
+        session = _PreparedSession(profile_obj, self.activity, warm, bound or self.egress, bound is not None)
+        session.start()
+        return session
+
+    def _bind(self, session: _PreparedSession) -> None:
+        # A session staged while its exit was at the load cap gets its slot now.
+        if not session.bound:
+            bound = self.egress.bind(session.browser.profile)
+            if bound is None:
+                raise RuntimeError("no egress available (every proxy is down or at its load cap)")
+            session.browser.egress = bound
+            session.bound = True
+
+    def _release(self, session: _PreparedSession) -> None:
+        if session.bound:
+            session.bound = False
+            self.egress.release(session.browser.profile)
+
+    def run(
+        self,
+        accounts: Iterable[Profile],
+        on_result: Optional[Callable[[AccountResult], None]] = None,
+    ) -> RunSummary:
+        """
+        Runs the activity for every account, pipelining each launch behind the previous session.
+
+        Args:
+            accounts: The profiles to run, in order.
+            on_result: Optional callback invoked as each account finishes.
+
+        Returns:
+            A RunSummary covering all accounts.
+        """
+        summary = RunSummary(concurrency=1)
+        started = time.monotonic()
+        accounts = iter(accounts)
+
+        metrics.serve_from_env()
+        with metrics.collecting() as summary.timings:
+            current_profile = next(accounts, None)
+            current = self._prepare(current_profile) if current_profile is not None else None
+            upcoming: Optional[_PreparedSession] = None
+
+            try:
+                while current is not None:
+                    current.ready.wait()
+                    try:
+                        self._bind(current)
+                        self._connect_if_needed(current.browser.profile)
+                    except Exception as e:
+                        current.cancel()
+                        current.result = AccountResult(
+                            profile=current.browser.profile.profile,
+                            ok=False,
+                            started=time.time(),
+                            finished=time.time(),
+                            error=f"{type(e).__name__}: {e}",
+                            traceback=traceback.format_exc(),
+                        )
+                    current.release()
+
+                    # While this session runs, stage the next one.
+                    next_profile = next(accounts, None)
+                    upcoming = self._prepare(next_profile) if next_profile is not None else None
+
+                    current.join()
+                    self._release(current)
+                    result = current.result or AccountResult(
+                        profile=current.browser.profile.profile,
+                        ok=False,
+                        started=time.time(),
+                        finished=time.time(),
+                        error="session ended without a result",
+                    )
+                    summary.results.append(result)
+                    status = "ok" if result.ok else f"FAILED ({result.error})"
+                    print(f"[{len(summary.results)}] {result.profile}: {status} in {result.duration:.1f}s")
+                    if on_result is not None:
+                        on_result(result)
+
+                    current, upcoming = upcoming, None
+            finally:
+                # Don't leave parked browsers behind if the run is interrupted.
+                for session in (current, upcoming):
+                    if session is not None:
+                        if session.is_alive():
+                            session.cancel()
+                            session.join()
+                        self._release(session)
+
+        summary.wall_time = time.monotonic() - started
+        return summary
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Any, Dict # Added Dict and Any for the example of creating from a dict
+from typing import Any, Dict, Optional # Added Dict and Any for the example of creating from a dict
 
 @dataclass(frozen=False) # frozen=True makes instances immutable, similar to not having setters
 class Profile:
@@ -12,6 +12,11 @@ class Profile:
     password: str
     recovery: str
     authenticator: str
+    # Optional per-account upstream proxy, used by egress.ProfileProxyEgress.
+    proxy_address: Optional[str] = None
+    proxy_port: Optional[int] = None
+    proxy_username: Optional[str] = None
+    proxy_password: Optional[str] = None
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'Profile':
@@ -27,5 +32,9 @@ class Profile:
             code=data['code'],
             password=data['password'],
             recovery=data['recovery'],
-            authenticator=data['authenticator']
+            authenticator=data['authenticator'],
+            proxy_address=data.get('proxy_address'),
+            proxy_port=data.get('proxy_port'),
+            proxy_username=data.get('proxy_username'),
+            proxy_password=data.get('proxy_password'),
         )
@@ -1,40 +1,131 @@
-# profile_store.py  – bullet‑proof with pickle
+# profile_store.py  – profile directories and their persisted fingerprints
+import argparse
+import os
 import pickle
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Tuple
+from typing import Iterable, Tuple
 
 from browserforge.fingerprints import Fingerprint, FingerprintGenerator, Screen
 
+from fingerprint_db import FingerprintStore
+
 _BASE = Path("camoufox_profiles")
+_DB_PATH = _BASE / "fingerprints.sqlite3"
 
 _SCREEN_DESKTOP = Screen(min_width=1024, min_height=700)   # keeps phones/tablets out
 
-_GEN = FingerprintGenerator(
+# How many loaded fingerprints to keep in memory per process.
+FP_CACHE_SIZE = 256
+
+
+@lru_cache(maxsize=1)
+def _generator() -> FingerprintGenerator:
+    """
+    The fingerprint generator, built on first use – loading the browserforge
+    models is slow and not needed when every profile already has a fingerprint.
+    """
+    return FingerprintGenerator(
         browser="firefox",
         device="desktop",                # ← **no mobile fingerprints**
         os=("windows", "macos"),
         screen=_SCREEN_DESKTOP,
-)
+    )
+
+
+@lru_cache(maxsize=1)
+def fingerprint_store() -> FingerprintStore:
+    """
+    The shared fingerprint database under camoufox_profiles/.
+    """
+    return FingerprintStore(_DB_PATH)
 
 
 def _paths(user: str) -> Tuple[Path, Path]:
     """
-    Returns (profile_dir, fingerprint_file).
+    Returns (profile_dir, legacy_fingerprint_file).
+    Fingerprints now live in the fingerprint store; the pickle is only read for
+    profiles created before it existed.
     """
     d = _BASE / user
     d.mkdir(parents=True, exist_ok=True)
-    return d, d / "fingerprint.pkl"            # <- binary pickle now
+    return d, d / "fingerprint.pkl"
 
 
+@lru_cache(maxsize=FP_CACHE_SIZE)
 def load_or_create_fp(user: str) -> Fingerprint:
     """
     Load a persisted Fingerprint for `user`, or generate & save a new one.
+    Results are kept in an in-process LRU, so repeated launches skip the disk.
     """
-    profile_dir, fp_file = _paths(user)
+    store = fingerprint_store()
+    fp = store.get(user)
+    if fp is not None:
+        return fp
 
+    # Not migrated yet: import the old per-profile pickle on first use.
+    _, fp_file = _paths(user)
     if fp_file.exists():
-        return pickle.loads(fp_file.read_bytes())      # 🎉 object fully intact
-
-    fp = _GEN.generate()
-    fp_file.write_bytes(pickle.dumps(fp, protocol=pickle.HIGHEST_PROTOCOL))
+        fp = pickle.loads(fp_file.read_bytes())
+    else:
+        fp = _generator().generate()
+    store.put(user, fp)
     return fp
+
+
+def _pregenerate_one(user: str) -> Fingerprint:
+    # Worker-process entry point; each worker loads the generator once and reuses it.
+    return _generator().generate()
+
+
+def pregenerate_fingerprints(users: Iterable[str], workers: int | None = None) -> int:
+    """
+    Generates fingerprints ahead of time for every user that doesn't have one yet,
+    spreading the work over a process pool.
+
+    Args:
+        users: Profile names to prepare.
+        workers: Number of worker processes (defaults to the CPU count).
+
+    Returns:
+        The number of fingerprints created.
+    """
+    store = fingerprint_store()
+    missing = [user for user in store.missing(users) if not (_BASE / user / "fingerprint.pkl").exists()]
+    if not missing:
+        return 0
+
+    # Workers only generate; this process writes to the store in batched transactions.
+    batch = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for done, (user, fp) in enumerate(zip(missing, pool.map(_pregenerate_one, missing, chunksize=8)), start=1):
+            batch.append((user, fp))
+            if len(batch) >= 100:
+                store.put_many(batch)
+                batch.clear()
+            print(f"[{done}/{len(missing)}] fingerprint created for {user}")
+    store.put_many(batch)
+    return len(missing)
+
+
+if __name__ == "__main__":
+    from web import AccountStatus, iter_accounts
+
+    parser = argparse.ArgumentParser(description="Pre-generate fingerprints for every account with a given status.")
+    parser.add_argument("--status", default=AccountStatus.NOT_SETUP.value,
+                        choices=[s.value for s in AccountStatus])
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    if 'COMPUTERNAME' not in os.environ:
+        os.environ['COMPUTERNAME'] = 'MY_DEV_MACHINE'
+        print("Set dummy COMPUTERNAME environment variable for testing.")
+
+    imported = fingerprint_store().migrate_from_pickles(_BASE)
+    if imported:
+        print(f"Imported {imported} legacy fingerprint.pkl file(s) into {_DB_PATH}.")
+
+    profiles = [p.profile for p in iter_accounts(status=AccountStatus(args.status))]
+    created = pregenerate_fingerprints(profiles, workers=args.workers)
+    print(f"Created {created} fingerprint(s) for {len(profiles)} account(s).")
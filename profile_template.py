@@ -0,0 +1,154 @@
+# profile_template.py – clone new profile directories from a pre-built "golden" template
+import fnmatch
+import os
+import shutil
+import sys
+from pathlib import Path
+
+from camoufox.sync_api import Camoufox
+
+_TEMPLATE_DIR = Path("camoufox_profiles") / "_template"
+
+# Files that are never written after creation: add-on packages, which an update replaces
+# with a new file rather than rewriting. These are shared between profiles with hardlinks.
+# Everything else, including compatibility.ini and startupCache/*, which Firefox rewrites
+# in place, gets its own copy (a reflink where the filesystem supports it), since a write
+# through a hardlink would change the template and every other profile with it.
+SHARED_PATTERNS = (
+    "*.xpi",
+)
+
+# Per-profile state that must never come from the template at all.
+EXCLUDED_PATTERNS = (
+    "fingerprint.pkl",
+    "times.json",                                 # profile creation time
+    "cookies.sqlite*",
+    "webappsstore.sqlite*",
+    "storage/*",
+    "sessionstore*",
+    "sessionCheckpoints.json",
+    "places.sqlite*",
+    "formhistory.sqlite*",
+    "key4.db",
+    "logins.json",
+    "cache2/*",
+    "lock",
+    ".parentlock",
+    "parent.lock",
+)
+
+
+def _matches(relative: str, patterns) -> bool:
+    return any(fnmatch.fnmatch(relative, pattern) for pattern in patterns)
+
+
+def _reflink(src: Path, dst: Path) -> bool:
+    """
+    Copy-on-write clone of `src` to `dst` where the filesystem supports it
+    (btrfs, XFS and friends via FICLONE). Returns False if it doesn't.
+    """
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl
+
+    FICLONE = 0x40049409
+    try:
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        shutil.copystat(src, dst)
+        return True
+    except OSError:
+        if dst.exists():
+            dst.unlink()
+        return False
+
+
+def _clone_file(src: Path, dst: Path, shared: bool) -> None:
+    if shared:
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass                               # different volume, FAT, ...
+    if not _reflink(src, dst):
+        shutil.copy2(src, dst)
+
+
+def build_template(template_dir: Path = _TEMPLATE_DIR) -> Path:
+    """
+    Builds the golden template once: a clean Camoufox launch and shutdown, so the
+    profile databases, caches and extension state exist before any account uses them.
+    """
+    if template_dir.exists():
+        return template_dir
+
+    # Several runner processes may get here at once: each builds into its own
+    # directory and only the first rename wins.
+    building = template_dir.with_name(f"{template_dir.name}.building-{os.getpid()}")
+    building.mkdir(parents=True, exist_ok=True)
+    print(f"Building profile template in {template_dir} ...")
+    try:
+        with Camoufox(persistent_context=True, user_data_dir=str(building), headless=True, i_know_what_im_doing=True) as ctx:
+            ctx.pages[0].goto("about:blank")
+        building.rename(template_dir)
+    except OSError:
+        if not template_dir.exists():
+            raise
+    finally:
+        shutil.rmtree(building, ignore_errors=True)
+    return template_dir
+
+
+# Paths older templates hardlinked although Firefox may rewrite them in place.
+_FORMERLY_SHARED = ("compatibility.ini", "startupCache/*", "extensions/*", "features/*", "gmp-*/*")
+
+# Written once a profile is known to share nothing mutable with the template, so the
+# one-time `_unshare` pass doesn't rescan it on every launch.
+_UNSHARED_MARKER = ".template-unshared"
+
+
+def _unshare(profile_dir: Path) -> None:
+    """
+    Gives an already seeded profile private copies of any mutable file it still shares
+    with the template through a hardlink. Runs once per profile (see _UNSHARED_MARKER).
+    """
+    marker = profile_dir / _UNSHARED_MARKER
+    if marker.exists():
+        return
+    for pattern in _FORMERLY_SHARED:
+        for path in profile_dir.glob(pattern):
+            relative = path.relative_to(profile_dir).as_posix()
+            if not path.is_file() or _matches(relative, SHARED_PATTERNS) or path.stat().st_nlink < 2:
+                continue
+            private = path.with_name(path.name + ".unshare")
+            shutil.copy2(path, private)
+            os.replace(private, path)
+    marker.touch()
+
+
+def clone_template(profile_dir: Path, template_dir: Path = _TEMPLATE_DIR) -> bool:
+    """
+    Seeds an empty `profile_dir` from the template. Immutable files are hardlinked,
+    mutable ones are reflinked or copied, and per-profile state (cookies, storage,
+    history, sessions, logins) is left out so it stays private to the account.
+
+    Returns:
+        True if the directory was seeded, False if it already had content.
+    """
+    if any(p.name not in ("fingerprint.pkl", _UNSHARED_MARKER) for p in profile_dir.iterdir()):
+        _unshare(profile_dir)
+        return False
+    build_template(template_dir)
+
+    for src in template_dir.rglob("*"):
+        relative = src.relative_to(template_dir).as_posix()
+        if _matches(relative, EXCLUDED_PATTERNS):
+            continue
+        dst = profile_dir / relative
+        if src.is_dir():
+            dst.mkdir(parents=True, exist_ok=True)
+        else:
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            _clone_file(src, dst, shared=_matches(relative, SHARED_PATTERNS))
+    (profile_dir / _UNSHARED_MARKER).touch()
+    return True
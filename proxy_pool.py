@@ -0,0 +1,351 @@
+# proxy_pool.py – health-checked upstream proxies with sticky, load-capped assignment
+import asyncio
+import base64
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Deque, Dict, Iterable, List, Optional
+
+from egress import Egress, Proxy, load_proxy_file
+from metrics import percentile
+from profile import Profile
+from vpn import EGRESS_PROBE_HOST, EGRESS_PROBE_PORT
+
+_ASSIGNMENTS_PATH = Path("camoufox_profiles") / "proxy_assignments.json"
+
+# Sessions one proxy may carry at once, unless the pool is told otherwise.
+DEFAULT_MAX_SESSIONS = int(os.environ.get("SM_PROXY_MAX_SESSIONS", "2"))
+
+
+@dataclass
+class ProxyHealth:
+    """
+    Health-check history and current load for one proxy.
+    """
+    checks: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    alive: bool = True
+    last_error: Optional[str] = None
+    sessions: int = 0                     # sessions currently using this proxy
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=100))
+
+    @property
+    def success_rate(self) -> Optional[float]:
+        return (self.checks - self.failures) / self.checks if self.checks else None
+
+    @property
+    def p50(self) -> Optional[float]:
+        return percentile(self.latencies, 50)
+
+    @property
+    def p95(self) -> Optional[float]:
+        return percentile(self.latencies, 95)
+
+
+async def check_proxy(proxy: Proxy, timeout: float = 10.0) -> float:
+    """
+    Opens a CONNECT tunnel through `proxy` to EGRESS_PROBE_HOST, the same handshake
+    the browser does before its first request.
+
+    Returns:
+        The seconds from opening the TCP connection to the proxy's `200` answer.
+
+    Raises:
+        OSError, ConnectionError or asyncio.TimeoutError if the proxy is unusable.
+    """
+    async def probe() -> float:
+        started = time.monotonic()
+        reader, writer = await asyncio.open_connection(proxy.host, proxy.port)
+        try:
+            target = f"{EGRESS_PROBE_HOST}:{EGRESS_PROBE_PORT}"
+            request = f"CONNECT {target} HTTP/1.1\r\nHost: {target}\r\n"
+            if proxy.username is not None:
+                token = base64.b64encode(f"{proxy.username}:{proxy.password}".encode()).decode()
+                request += f"Proxy-Authorization: Basic {token}\r\n"
+            writer.write((request + "\r\n").encode())
+            await writer.drain()
+            status = (await reader.readline()).decode(errors="replace").strip()
+            parts = status.split()
+            if len(parts) < 2 or parts[1] != "200":
+                raise ConnectionError(f"proxy answered {status!r}")
+            return time.monotonic() - started
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    return await asyncio.wait_for(probe(), timeout)
+
+
+class ProxyPool:
+    """
+    A set of upstream proxies that are health-checked concurrently and handed out to
+    profiles.
+
+    Every profile keeps the proxy it was first given (persisted in `assignments_path`)
+    for as long as that proxy stays healthy, so an account doesn't hop between exit IPs
+    from run to run. New profiles go to the alive proxy with the fewest profiles, then
+    the lowest median latency. A proxy carries at most `max_sessions` sessions at once,
+    and is evicted after `max_failures` failed checks in a row until a check passes again.
+    """
+
+    def __init__(
+        self,
+        proxies: Iterable[Proxy],
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        max_failures: int = 3,
+        assignments_path: Path = _ASSIGNMENTS_PATH,
+    ):
+        self.proxies: Dict[str, Proxy] = {proxy.key: proxy for proxy in proxies}
+        if not self.proxies:
+            raise ValueError("ProxyPool needs at least one proxy")
+        self.health: Dict[str, ProxyHealth] = {key: ProxyHealth() for key in self.proxies}
+        self.max_sessions = max(1, max_sessions)
+        self.max_failures = max(1, max_failures)
+        self.assignments_path = Path(assignments_path)
+        self._lock = threading.Lock()
+        self._assignments: Dict[str, str] = self._load_assignments()
+        self._leases: Dict[str, str] = {}
+        self._checker: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_file(cls, path: Path, **kwargs) -> 'ProxyPool':
+        return cls(load_proxy_file(path), **kwargs)
+
+    # --- persistence ---
+
+    def _load_assignments(self) -> Dict[str, str]:
+        try:
+            return json.loads(self.assignments_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable proxy assignments in {self.assignments_path}: {e}")
+            return {}
+
+    def _save_assignments(self) -> None:
+        # Written to a temp file first; os.replace keeps the swap atomic.
+        self.assignments_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.assignments_path.with_suffix(self.assignments_path.suffix + ".tmp")
+        tmp.write_text(json.dumps(self._assignments, indent=1, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, self.assignments_path)
+
+    # --- health checks ---
+
+    def _record_check(self, key: str, latency: Optional[float], error: Optional[BaseException]) -> None:
+        with self._lock:
+            health = self.health[key]
+            health.checks += 1
+            if error is None:
+                health.latencies.append(latency)
+                health.consecutive_failures = 0
+                if not health.alive:
+                    print(f"Proxy {key} is healthy again.")
+                health.alive = True
+            else:
+                health.failures += 1
+                health.consecutive_failures += 1
+                health.last_error = f"{type(error).__name__}: {error}"
+                if health.alive and health.consecutive_failures >= self.max_failures:
+                    health.alive = False
+                    print(f"Evicting proxy {key} after {health.consecutive_failures} failed checks ({health.last_error}).")
+
+    async def check_all(self, concurrency: int = 20, timeout: float = 10.0) -> int:
+        """
+        Checks every proxy (at most `concurrency` at a time) and updates their health.
+
+        Returns:
+            The number of proxies alive afterwards.
+        """
+        slots = asyncio.Semaphore(max(1, concurrency))
+
+        async def check_one(key: str) -> None:
+            async with slots:
+                try:
+                    latency = await check_proxy(self.proxies[key], timeout)
+                except (OSError, ConnectionError, asyncio.TimeoutError) as e:
+                    self._record_check(key, None, e)
+                else:
+                    self._record_check(key, latency, None)
+
+        await asyncio.gather(*(check_one(key) for key in self.proxies))
+        return len(self.alive())
+
+    def check_now(self, concurrency: int = 20, timeout: float = 10.0) -> int:
+        """
+        Synchronous wrapper around `check_all`.
+        """
+        return asyncio.run(self.check_all(concurrency, timeout))
+
+    def start_health_checks(self, interval: float = 300.0) -> None:
+        """
+        Checks the pool now and then every `interval` seconds on a background thread.
+        """
+        if self._checker is not None:
+            return
+        self._stop.clear()
+
+        def loop() -> None:
+            while True:
+                try:
+                    self.check_now()
+                except Exception as e:
+                    print(f"Proxy health check failed: {e}")
+                if self._stop.wait(interval):
+                    return
+
+        self._checker = threading.Thread(target=loop, name="proxy-health", daemon=True)
+        self._checker.start()
+
+    def stop_health_checks(self) -> None:
+        self._stop.set()
+        if self._checker is not None:
+            self._checker.join()
+            self._checker = None
+
+    def alive(self) -> List[str]:
+        return [key for key, health in self.health.items() if health.alive]
+
+    # --- assignment ---
+
+    def _assigned_key(self, profile_name: str) -> Optional[str]:
+        """
+        The profile's sticky proxy, (re)assigning it if it has none or its proxy died.
+        Must be called with the lock held.
+        """
+        key = self._assignments.get(profile_name)
+        if key in self.proxies and self.health[key].alive:
+            return key
+
+        candidates = self.alive()
+        if not candidates:
+            return None
+        assigned = {k: 0 for k in candidates}
+        for assigned_key in self._assignments.values():
+            if assigned_key in assigned:
+                assigned[assigned_key] += 1
+        key = min(candidates, key=lambda k: (assigned[k], self.health[k].p50 or math.inf))
+        self._assignments[profile_name] = key
+        self._save_assignments()
+        return key
+
+    def proxy_for(self, profile_name: str) -> Optional[Proxy]:
+        """
+        The profile's sticky proxy, without taking a session slot on it.
+        None only when no proxy in the pool is alive.
+        """
+        with self._lock:
+            key = self._assigned_key(profile_name)
+        return self.proxies[key] if key is not None else None
+
+    def acquire(self, profile_name: str) -> Optional[Proxy]:
+        """
+        Reserves a session slot on the profile's sticky proxy.
+
+        Returns:
+            The proxy, or None if it is at its load cap (or nothing is alive). A profile
+            waits for its own proxy rather than borrowing another exit.
+        """
+        with self._lock:
+            key = self._assigned_key(profile_name)
+            if key is None or self.health[key].sessions >= self.max_sessions:
+                return None
+            self.health[key].sessions += 1
+            self._leases[profile_name] = key
+        return self.proxies[key]
+
+    def release(self, profile_name: str) -> None:
+        with self._lock:
+            key = self._leases.pop(profile_name, None)
+            if key is not None:
+                self.health[key].sessions -= 1
+
+    # --- metrics ---
+
+    def metrics(self) -> Dict[str, ProxyHealth]:
+        """
+        A snapshot of every proxy's health and load.
+        """
+        with self._lock:
+            return {
+                key: ProxyHealth(
+                    checks=h.checks,
+                    failures=h.failures,
+                    consecutive_failures=h.consecutive_failures,
+                    alive=h.alive,
+                    last_error=h.last_error,
+                    sessions=h.sessions,
+                    latencies=deque(h.latencies, maxlen=h.latencies.maxlen),
+                )
+                for key, h in self.health.items()
+            }
+
+    def print_report(self) -> None:
+        def ms(seconds: Optional[float]) -> str:
+            return f"{seconds * 1000:.0f}ms" if seconds is not None else "-"
+
+        print(f"{'proxy':<24} {'alive':<6} {'ok':>5} {'p50':>7} {'p95':>7} {'load':>5}")
+        for key, h in sorted(self.metrics().items(), key=lambda item: item[1].p50 or math.inf):
+            rate = f"{h.success_rate:.0%}" if h.success_rate is not None else "-"
+            print(f"{key:<24} {'yes' if h.alive else 'no':<6} {rate:>5} {ms(h.p50):>7} {ms(h.p95):>7} "
+                  f"{h.sessions:>2}/{self.max_sessions}")
+
+
+class _LeasedProxyEgress(Egress):
+    """
+    One session's fixed exit, handed to the worker that runs it.
+    """
+
+    def __init__(self, proxy: Proxy):
+        self.proxy = proxy
+
+    def proxy_for(self, profile: Profile) -> Optional[Dict[str, str]]:
+        return self.proxy.playwright()
+
+
+class PooledProxyEgress(Egress):
+    """
+    Egress backed by a ProxyPool: each session gets the profile's sticky proxy and
+    counts against that proxy's load cap until it is released.
+    """
+
+    def __init__(self, pool: ProxyPool):
+        self.pool = pool
+
+    def bind(self, profile: Profile) -> Optional[Egress]:
+        proxy = self.pool.acquire(profile.profile)
+        return _LeasedProxyEgress(proxy) if proxy is not None else None
+
+    def release(self, profile: Profile) -> None:
+        self.pool.release(profile.profile)
+
+    def proxy_for(self, profile: Profile) -> Optional[Dict[str, str]]:
+        proxy = self.pool.proxy_for(profile.profile)
+        if proxy is None:
+            # Never fall back to the host's own IP.
+            raise RuntimeError(f"No healthy proxy left for profile {profile.profile}")
+        return proxy.playwright()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Health-check a proxy list and show latency metrics.")
+    parser.add_argument("path", nargs="?", default="Webshare 20 proxies.txt")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    args = parser.parse_args()
+
+    pool = ProxyPool.from_file(Path(args.path))
+    for _ in range(args.rounds):
+        pool.check_now(timeout=args.timeout)
+    pool.print_report()
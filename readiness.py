@@ -0,0 +1,120 @@
+# readiness.py – wait for the page to be ready, then only a short human-like pause
+import os
+import time
+from typing import Callable, Dict, Optional, Pattern, Tuple, Union
+from urllib.parse import urlsplit
+
+from playwright.async_api import Page as AsyncPage
+from playwright.async_api import TimeoutError as AsyncTimeoutError
+from playwright.sync_api import Page
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+import metrics
+from util import async_wait, wait
+
+UrlMatcher = Union[str, Pattern[str], Callable[[str], bool]]
+
+# Seconds each step may take to become ready before it counts as failed. Steps not
+# listed get DEFAULT_BUDGET; SM_READY_BUDGET_SCALE stretches all of them (slow proxies).
+STEP_BUDGETS: Dict[str, float] = {
+    "home": 30.0,
+    "login_form": 30.0,
+    "explore": 20.0,
+    "profile": 20.0,
+    "search_panel": 10.0,
+    "search_result": 20.0,
+}
+DEFAULT_BUDGET = 15.0
+BUDGET_SCALE = float(os.environ.get("SM_READY_BUDGET_SCALE", "1"))
+
+# The pause added once the page is ready, so actions never follow each other instantly.
+DEFAULT_FLOOR: Tuple[float, float] = (0.4, 1.2)
+
+
+def _budget(step: str, budget: Optional[float]) -> float:
+    return (budget if budget is not None else STEP_BUDGETS.get(step, DEFAULT_BUDGET)) * BUDGET_SCALE
+
+
+def settle(
+    page: Page,
+    step: str,
+    *,
+    selector: Optional[str] = None,
+    url: Optional[UrlMatcher] = None,
+    network_quiet: bool = False,
+    floor: Tuple[float, float] = DEFAULT_FLOOR,
+    budget: Optional[float] = None,
+) -> None:
+    """
+    Replaces a fixed worst-case sleep after an action: waits until the page shows the
+    given readiness signals, then pauses for `floor` seconds like a person would.
+
+    Args:
+        page: The page the action happened on.
+        step: A short name for the step; its readiness time is recorded as the
+              `ready.<step>` span, so the run report shows what each step really needs.
+        selector: Wait until this selector is visible.
+        url: Wait until the main frame's URL matches (glob, regex or predicate).
+        network_quiet: Also wait for the network to go idle. Best effort – pages that
+                       keep a connection open never go idle, so this never fails the step.
+        floor: (min, max) seconds of human-like pause once ready.
+        budget: Seconds all signals together may take (default: STEP_BUDGETS[step]).
+
+    Raises:
+        playwright.sync_api.TimeoutError: If `url` or `selector` isn't reached within the budget.
+    """
+    deadline = time.monotonic() + _budget(step, budget)
+
+    def remaining_ms() -> float:
+        return max(1.0, (deadline - time.monotonic()) * 1000)
+
+    with metrics.span(f"ready.{step}"):
+        if url is not None:
+            page.wait_for_url(url, wait_until="commit", timeout=remaining_ms())
+        if selector is not None:
+            page.wait_for_selector(selector, state="visible", timeout=remaining_ms())
+        if network_quiet:
+            try:
+                page.wait_for_load_state("networkidle", timeout=remaining_ms())
+            except PlaywrightTimeoutError:
+                metrics.annotate(network_quiet="timeout")
+    wait(*floor)
+
+
+async def async_settle(
+    page: AsyncPage,
+    step: str,
+    *,
+    selector: Optional[str] = None,
+    url: Optional[UrlMatcher] = None,
+    network_quiet: bool = False,
+    floor: Tuple[float, float] = DEFAULT_FLOOR,
+    budget: Optional[float] = None,
+) -> None:
+    """
+    Async counterpart of `settle`.
+    """
+    deadline = time.monotonic() + _budget(step, budget)
+
+    def remaining_ms() -> float:
+        return max(1.0, (deadline - time.monotonic()) * 1000)
+
+    with metrics.span(f"ready.{step}"):
+        if url is not None:
+            await page.wait_for_url(url, wait_until="commit", timeout=remaining_ms())
+        if selector is not None:
+            await page.wait_for_selector(selector, state="visible", timeout=remaining_ms())
+        if network_quiet:
+            try:
+                await page.wait_for_load_state("networkidle", timeout=remaining_ms())
+            except AsyncTimeoutError:
+                metrics.annotate(network_quiet="timeout")
+    await async_wait(*floor)
+
+
+def path_is(path: str) -> Callable[[str], bool]:
+    """
+    A URL matcher for `settle(url=...)` that compares only the path, so it works on
+    instagram.com and on the benchmark's fixture site alike.
+    """
+    return lambda url: urlsplit(url).path == path
@@ -0,0 +1,333 @@
+# resource_policy.py – per-activity request routing that keeps heavy media off the wire
+import functools
+import inspect
+import os
+import re
+import threading
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, FrozenSet, Iterator, Optional, Pattern
+
+# Substrings of analytics / logging endpoints a passive session doesn't need answered
+# by the real server. They get an empty 204 so the page sees the beacon succeed.
+BEACON_PATTERNS = (
+    "/logging_client_events",
+    "/ajax/bz",
+    "/api/v1/web/log",
+    "/falco",
+    "/qp/batch_fetch_web",
+    "connect.facebook.net",
+    "facebook.com/tr",
+    "google-analytics.com",
+    "doubleclick.net",
+)
+
+# URL regexes for requests that may be of a resource type, used to route only those.
+# Instagram's images and video come from its media CDN hosts (not static.*, which
+# serves scripts and CSS) or carry a media file extension.
+_TYPE_URLS = {
+    "image": r"^https://(?!static\.)[^/]*(?:cdninstagram\.com|fbcdn\.net)/|\.(?:jpe?g|png|gif|webp|avif|heic|ico)(?:\?|$)",
+    "media": r"^https://(?!static\.)[^/]*(?:cdninstagram\.com|fbcdn\.net)/|\.(?:mp4|webm|m4a|m4v|mp3)(?:\?|$)",
+    "font": r"\.(?:woff2?|ttf|otf)(?:\?|$)",
+}
+
+# A transparent 1x1 GIF: what stubbed images are answered with.
+_PIXEL_GIF = (
+    b"GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\x00\x00\x00!\xf9\x04\x01\x00\x00\x00\x00"
+    b",\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;"
+)
+
+# Rough sizes used to estimate the savings for requests that never went out,
+# until this process has seen real responses of that type.
+_TYPICAL_BYTES = {"image": 120_000, "media": 1_500_000, "font": 40_000}
+
+
+@dataclass(frozen=True)
+class ResourcePolicy:
+    """
+    What a session may download. Resource types (Playwright's `request.resource_type`:
+    "image", "media", "font", ...) listed in `block` are aborted, those in `stub` are
+    answered locally with a tiny placeholder, and with `stub_beacons` tracking beacons
+    (BEACON_PATTERNS) get an empty 204. Documents, scripts, XHR and CSS always go through.
+    """
+    name: str
+    block: FrozenSet[str] = frozenset()
+    stub: FrozenSet[str] = frozenset()
+    stub_beacons: bool = False
+
+    def action(self, resource_type: str, url: str) -> Optional[str]:
+        """
+        "block", "stub" or None (let the request through).
+        """
+        if resource_type in self.block:
+            return "block"
+        if resource_type in self.stub:
+            return "stub"
+        if self.stub_beacons and any(pattern in url for pattern in BEACON_PATTERNS):
+            return "stub"
+        return None
+
+    @functools.cached_property
+    def url_pattern(self) -> Optional[Pattern[str]]:
+        """
+        A regex matching every URL this policy may act on, or None if it acts on none.
+        Only these are routed: a routed request skips the browser's HTTP cache, and a
+        regex (unlike a Python predicate) is matched by the browser, so nothing else is
+        intercepted at all.
+        """
+        parts = [_TYPE_URLS[t] for t in sorted(self.block | self.stub) if t in _TYPE_URLS]
+        if self.stub_beacons:
+            parts += [re.escape(pattern) for pattern in BEACON_PATTERNS]
+        return re.compile("|".join(f"(?:{part})" for part in parts)) if parts else None
+
+
+FULL = ResourcePolicy("full")
+# Scrolling past posts: nothing is looked at closely, so images and video stay local.
+PASSIVE = ResourcePolicy("passive", stub=frozenset({"image", "media"}), stub_beacons=True)
+LEAN = ResourcePolicy("lean", block=frozenset({"font", "media"}), stub=frozenset({"image"}), stub_beacons=True)
+
+POLICIES: Dict[str, ResourcePolicy] = {p.name: p for p in (FULL, PASSIVE, LEAN)}
+
+
+def default_policy() -> ResourcePolicy:
+    """
+    The session-wide policy named by SM_RESOURCE_POLICY ("full", "passive", "lean");
+    FULL when unset, which routes nothing until an activity asks for a lighter policy.
+    """
+    name = os.environ.get("SM_RESOURCE_POLICY")
+    if not name:
+        return FULL
+    if name not in POLICIES:
+        raise ValueError(f"Unknown SM_RESOURCE_POLICY {name!r}; expected one of {sorted(POLICIES)}")
+    return POLICIES[name]
+
+
+@dataclass
+class TypeTraffic:
+    requests: int = 0
+    bytes: int = 0
+    blocked: int = 0
+    stubbed: int = 0
+
+
+@dataclass
+class SessionTraffic:
+    """
+    Per-session request and byte counts by resource type. Downloaded bytes come from
+    Content-Length, so chunked responses without one count as zero.
+    """
+    by_type: Dict[str, TypeTraffic] = field(default_factory=dict)
+
+    def _type(self, resource_type: str) -> TypeTraffic:
+        return self.by_type.setdefault(resource_type, TypeTraffic())
+
+    @property
+    def bytes(self) -> int:
+        return sum(t.bytes for t in self.by_type.values())
+
+    @property
+    def avoided(self) -> int:
+        return sum(t.blocked + t.stubbed for t in self.by_type.values())
+
+    @property
+    def estimated_saved_bytes(self) -> int:
+        """
+        Blocked and stubbed requests times the average size of that resource type.
+        """
+        saved = 0
+        for resource_type, t in self.by_type.items():
+            saved += (t.blocked + t.stubbed) * _average_size(resource_type)
+        return saved
+
+    def describe(self) -> str:
+        return (f"{sum(t.requests for t in self.by_type.values())} request(s), "
+                f"{self.bytes / 2**20:.1f} MiB downloaded, {self.avoided} avoided "
+                f"(~{self.estimated_saved_bytes / 2**20:.1f} MiB saved)")
+
+
+# Average response size per resource type across every session in this process.
+_sizes: Dict[str, list] = {}
+_sizes_lock = threading.Lock()
+
+
+def _note_size(resource_type: str, size: int) -> None:
+    with _sizes_lock:
+        total = _sizes.setdefault(resource_type, [0, 0])
+        total[0] += size
+        total[1] += 1
+
+
+def _average_size(resource_type: str) -> int:
+    with _sizes_lock:
+        total, count = _sizes.get(resource_type, (0, 0))
+    if count:
+        return total // count
+    return _TYPICAL_BYTES.get(resource_type, 0)
+
+
+class PolicyRouter:
+    """
+    The route handler for one browser context. Its policy is swapped with `using`,
+    which re-registers the route for the new policy's `url_pattern`, so only requests
+    the policy may act on are routed (routing makes the browser skip its own HTTP
+    cache) and FULL routes nothing. Requests it lets through are passed on with
+    `route.fallback()` so routes registered earlier (e.g. the asset cache) still see them.
+    """
+
+    def __init__(self, policy: ResourcePolicy):
+        self.policy = policy
+        self.traffic = SessionTraffic()
+        self._pattern: Optional[Pattern[str]] = None     # currently routed to this handler
+        # Requests answered with a local placeholder. Playwright fires "response" for
+        # those too, with the placeholder's Content-Length, which must not count as traffic.
+        self._stubbed: "weakref.WeakSet[Any]" = weakref.WeakSet()
+
+    def _decide(self, route) -> Optional[str]:
+        request = route.request
+        action = self.policy.action(request.resource_type, request.url)
+        t = self.traffic._type(request.resource_type)
+        if action == "block":
+            t.blocked += 1
+        elif action == "stub":
+            t.stubbed += 1
+            self._stubbed.add(request)
+        return action
+
+    @staticmethod
+    def _placeholder(resource_type: str) -> Dict[str, Any]:
+        if resource_type == "image":
+            return dict(status=200, content_type="image/gif", body=_PIXEL_GIF)
+        return dict(status=204, body=b"")
+
+    def handle(self, route) -> None:
+        action = self._decide(route)
+        if action == "block":
+            route.abort("blockedbyclient")
+        elif action == "stub":
+            route.fulfill(**self._placeholder(route.request.resource_type))
+        else:
+            route.fallback()
+
+    async def async_handle(self, route) -> None:
+        action = self._decide(route)
+        if action == "block":
+            await route.abort("blockedbyclient")
+        elif action == "stub":
+            await route.fulfill(**self._placeholder(route.request.resource_type))
+        else:
+            await route.fallback()
+
+    def apply(self, ctx, policy: ResourcePolicy) -> None:
+        """
+        Switches a sync context to `policy`, routing only what it may act on.
+        """
+        pattern = policy.url_pattern
+        if pattern != self._pattern:
+            if self._pattern is not None:
+                ctx.unroute(self._pattern, self.handle)
+            if pattern is not None:
+                ctx.route(pattern, self.handle)
+            self._pattern = pattern
+        self.policy = policy
+
+    async def async_apply(self, ctx, policy: ResourcePolicy) -> None:
+        pattern = policy.url_pattern
+        if pattern != self._pattern:
+            if self._pattern is not None:
+                await ctx.unroute(self._pattern, self.async_handle)
+            if pattern is not None:
+                await ctx.route(pattern, self.async_handle)
+            self._pattern = pattern
+        self.policy = policy
+
+    def on_response(self, response) -> None:
+        if response.request in self._stubbed:
+            return
+        resource_type = response.request.resource_type
+        t = self.traffic._type(resource_type)
+        t.requests += 1
+        try:
+            size = int(response.headers.get("content-length", 0))
+        except ValueError:
+            size = 0
+        if size and response.status != 204:
+            t.bytes += size
+            _note_size(resource_type, size)
+
+
+_routers: "weakref.WeakKeyDictionary[Any, PolicyRouter]" = weakref.WeakKeyDictionary()
+
+
+def install(ctx, policy: ResourcePolicy) -> PolicyRouter:
+    """
+    Attaches a PolicyRouter to a sync BrowserContext: counts its traffic and routes
+    the requests `policy` may act on.
+    """
+    router = PolicyRouter(FULL)
+    ctx.on("response", router.on_response)
+    _routers[ctx] = router
+    router.apply(ctx, policy)
+    return router
+
+
+async def async_install(ctx, policy: ResourcePolicy) -> PolicyRouter:
+    """
+    `install` for an async BrowserContext.
+    """
+    router = PolicyRouter(FULL)
+    ctx.on("response", router.on_response)
+    _routers[ctx] = router
+    await router.async_apply(ctx, policy)
+    return router
+
+
+@contextmanager
+def using(page, policy: ResourcePolicy) -> Iterator[PolicyRouter]:
+    """
+    Applies `policy` to the page's (sync) context for the duration of the block,
+    attaching a router first if the context has none.
+    """
+    ctx = page.context
+    router = _routers.get(ctx) or install(ctx, FULL)
+    previous = router.policy
+    router.apply(ctx, policy)
+    try:
+        yield router
+    finally:
+        router.apply(ctx, previous)
+
+
+@asynccontextmanager
+async def async_using(page, policy: ResourcePolicy) -> AsyncIterator[PolicyRouter]:
+    """
+    `using` for an async page.
+    """
+    ctx = page.context
+    router = _routers.get(ctx) or await async_install(ctx, FULL)
+    previous = router.policy
+    await router.async_apply(ctx, policy)
+    try:
+        yield router
+    finally:
+        await router.async_apply(ctx, previous)
+
+
+def with_policy(policy: ResourcePolicy) -> Callable:
+    """
+    Decorator form of `using` for activities whose first argument is the page.
+    """
+    def decorate(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(page, *args, **kwargs):
+                async with async_using(page, policy):
+                    return await fn(page, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(page, *args, **kwargs):
+            with using(page, policy):
+                return fn(page, *args, **kwargs)
+        return wrapper
+    return decorate
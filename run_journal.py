@@ -0,0 +1,248 @@
+# run_journal.py – per-profile progress of a multi-account run, so a crashed run can resume
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+_JOURNAL = Path("run_journal.sqlite3")
+
+# Attempts per profile before a run gives up on it (SM_RUN_MAX_ATTEMPTS).
+DEFAULT_MAX_ATTEMPTS = int(os.environ.get("SM_RUN_MAX_ATTEMPTS", "3"))
+
+# Delay before retrying a failed profile: doubled per attempt, with jitter, capped.
+RETRY_BASE = 60.0
+RETRY_CAP = 15 * 60.0
+
+# A live run refreshes its heartbeat this often; one silent for STALE_AFTER is dead.
+HEARTBEAT_INTERVAL = 15.0
+STALE_AFTER = 90.0
+
+PENDING = "pending"
+IN_PROGRESS = "in_progress"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    name      TEXT PRIMARY KEY,
+    host      TEXT NOT NULL,
+    pid       INTEGER NOT NULL,
+    started   REAL NOT NULL,
+    heartbeat REAL NOT NULL,
+    finished  REAL
+);
+CREATE TABLE IF NOT EXISTS accounts (
+    run          TEXT NOT NULL,
+    profile      TEXT NOT NULL,
+    state        TEXT NOT NULL,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    started      REAL,
+    finished     REAL,
+    next_attempt REAL,
+    error        TEXT,
+    PRIMARY KEY (run, profile)
+);
+"""
+
+
+def retry_delay(attempts: int) -> float:
+    """
+    Seconds to wait before the next try of a profile that has failed `attempts` times.
+    """
+    return min(RETRY_CAP, RETRY_BASE * 2 ** (attempts - 1)) * random.uniform(0.75, 1.25)
+
+
+def _pid_alive(pid: int) -> Optional[bool]:
+    # Only answerable on POSIX; on Windows os.kill would terminate the process.
+    if os.name != "posix":
+        return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class RunJournal:
+    """
+    Records the state of every profile of a named run (pending, in progress, done,
+    failed) in SQLite, so a run that crashes or is killed picks up where it stopped.
+
+    • Opening a journal whose last run under `name` never finished resumes it: done
+      profiles are skipped, and profiles that were in progress when it died are queued
+      again. A run that did finish is cleared and the new one starts from scratch.
+      Set `resume=False` (or SM_RESUME=0) to always start from scratch.
+    • A failed profile is retried after `retry_delay`, up to `max_attempts` in total,
+      across restarts as well as within a run.
+    • While open, a background thread keeps the run's heartbeat fresh. A run counts as
+      dead once its heartbeat is older than STALE_AFTER, or at once when its process
+      on this machine is gone; a live one is never taken over.
+
+    Use it as a context manager; the run is marked finished only if the block completes
+    without an exception.
+    """
+
+    def __init__(self, name: str, path: Path = _JOURNAL, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 resume: Optional[bool] = None):
+        self.name = name
+        self.path = Path(path)
+        self.max_attempts = max_attempts
+        if resume is None:
+            resume = os.environ.get("SM_RESUME", "1") != "0"
+        self._local = threading.local()
+        self._stop = threading.Event()
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+        self.resumed = self._claim(resume)
+        self._thread = threading.Thread(target=self._heartbeat, name="run-journal", daemon=True)
+        self._thread.start()
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads, so keep one per thread.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _claim(self, resume: bool) -> bool:
+        now = time.time()
+        host, pid = socket.gethostname(), os.getpid()
+        conn = self._conn()
+        with conn:
+            # BEGIN IMMEDIATE: two instances starting together can't both claim the run.
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT host, pid, heartbeat, finished FROM runs WHERE name = ?",
+                               (self.name,)).fetchone()
+            resumed = False
+            if row is not None and row[3] is None:
+                prev_host, prev_pid, heartbeat, _ = row
+                alive = _pid_alive(prev_pid) if prev_host == host else None
+                if alive is not False and now - heartbeat < STALE_AFTER:
+                    raise RuntimeError(f"Run {self.name!r} is already in progress (pid {prev_pid} on {prev_host})")
+                resumed = resume
+            if resumed:
+                requeued = conn.execute(
+                    "UPDATE accounts SET state = ?, error = 'interrupted: the run died' WHERE run = ? AND state = ?",
+                    (PENDING, self.name, IN_PROGRESS),
+                ).rowcount
+                counts = self._counts(conn)
+                print(f"Resuming run {self.name!r}: {counts.get(DONE, 0)} done, {counts.get(FAILED, 0)} failed, "
+                      f"{requeued} interrupted profile(s) re-queued")
+            else:
+                conn.execute("DELETE FROM accounts WHERE run = ?", (self.name,))
+            conn.execute(
+                "INSERT OR REPLACE INTO runs (name, host, pid, started, heartbeat, finished) VALUES (?, ?, ?, ?, ?, NULL)",
+                (self.name, host, pid, now, now),
+            )
+        return resumed
+
+    def _counts(self, conn: sqlite3.Connection) -> Dict[str, int]:
+        return dict(conn.execute("SELECT state, COUNT(*) FROM accounts WHERE run = ? GROUP BY state", (self.name,)))
+
+    def _heartbeat(self) -> None:
+        while not self._stop.wait(HEARTBEAT_INTERVAL):
+            with self._conn() as conn:
+                conn.execute("UPDATE runs SET heartbeat = ? WHERE name = ?", (time.time(), self.name))
+
+    def admit(self, profile: str) -> Optional[float]:
+        """
+        When `profile` may run next: None to skip it (done, or out of attempts), otherwise
+        the time from which it may start (now, or later for a failure still backing off).
+        """
+        row = self._conn().execute("SELECT state, attempts, next_attempt FROM accounts WHERE run = ? AND profile = ?",
+                                   (self.name, profile)).fetchone()
+        if row is None:
+            return time.time()
+        state, attempts, next_attempt = row
+        if state == DONE or attempts >= self.max_attempts:
+            return None
+        return next_attempt or time.time()
+
+    def start(self, profile: str) -> None:
+        """
+        Marks `profile` in progress; call right before its session is started.
+        """
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO accounts (run, profile, state, attempts, started) VALUES (?, ?, ?, 1, ?) "
+                "ON CONFLICT (run, profile) DO UPDATE SET state = excluded.state, "
+                "attempts = attempts + 1, started = excluded.started, next_attempt = NULL",
+                (self.name, profile, IN_PROGRESS, now),
+            )
+
+    def finish(self, profile: str, ok: bool, error: Optional[str] = None) -> Optional[float]:
+        """
+        Records the outcome of `profile`'s attempt. A failure that never got to `start`
+        (e.g. the VPN didn't connect) counts as an attempt too.
+
+        Returns:
+            When a failed profile may be retried, or None if it succeeded or is out of attempts.
+        """
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            row = conn.execute("SELECT state, attempts FROM accounts WHERE run = ? AND profile = ?",
+                               (self.name, profile)).fetchone()
+            state, attempts = row or (None, 0)
+            if state != IN_PROGRESS:
+                attempts += 1
+            retry_at = None
+            if not ok and attempts < self.max_attempts:
+                retry_at = now + retry_delay(attempts)
+            conn.execute(
+                "INSERT OR REPLACE INTO accounts (run, profile, state, attempts, started, finished, next_attempt, error) "
+                "VALUES (?, ?, ?, ?, (SELECT started FROM accounts WHERE run = ? AND profile = ?), ?, ?, ?)",
+                (self.name, profile, DONE if ok else FAILED, attempts, self.name, profile, now, retry_at, error),
+            )
+        return retry_at
+
+    def counts(self) -> Dict[str, int]:
+        """
+        Number of profiles per state in this run.
+        """
+        return self._counts(self._conn())
+
+    def describe(self) -> str:
+        """
+        The profile counts as text, e.g. "12 done, 1 failed".
+        """
+        counts = self.counts()
+        return ", ".join(f"{counts[state]} {state.replace('_', ' ')}"
+                         for state in (DONE, FAILED, IN_PROGRESS, PENDING) if counts.get(state)) or "no profiles"
+
+    def close(self, finished: bool = False) -> None:
+        """
+        Stops the heartbeat. With `finished`, the run is complete and the next one with
+        this name starts from scratch; otherwise it stays resumable.
+        """
+        self._stop.set()
+        self._thread.join()
+        with self._conn() as conn:
+            if finished:
+                conn.execute("UPDATE runs SET finished = ? WHERE name = ?", (time.time(), self.name))
+            else:
+                # Hand over at once instead of making the next run wait out STALE_AFTER.
+                conn.execute("UPDATE runs SET heartbeat = 0 WHERE name = ?", (self.name,))
+
+    def __enter__(self) -> 'RunJournal':
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        self.close(finished=exc_type is None)
+
+
+if __name__ == "__main__":
+    conn = sqlite3.connect(_JOURNAL)
+    for name, started, finished in conn.execute("SELECT name, started, finished FROM runs ORDER BY started"):
+        counts = dict(conn.execute("SELECT state, COUNT(*) FROM accounts WHERE run = ? GROUP BY state", (name,)))
+        status = "finished" if finished else "resumable"
+        print(f"{name}: {status}, started {time.ctime(started)}, {counts or 'no profiles'}")
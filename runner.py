@@ -0,0 +1,430 @@
+# runner.py – run one Playwright activity across many accounts at once
+import asyncio
+import heapq
+import itertools
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait as wait_futures
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import metrics
+from camoufox_browser_manager import AsyncCamoufoxBrowser, CamoufoxBrowser
+from egress import Egress, default_egress
+from profile import Profile
+from run_journal import RunJournal
+from scrape_sink import close_shared_sink
+from vpn import iter_by_region
+
+# Default number of browser sessions running side by side. Override with SM_CONCURRENCY.
+DEFAULT_CONCURRENCY = int(os.environ.get("SM_CONCURRENCY", min(4, os.cpu_count() or 1)))
+
+
+@dataclass
+class AccountResult:
+    """
+    The outcome of running an activity for a single account.
+    """
+    profile: str
+    ok: bool
+    started: float
+    finished: float
+    value: Any = None
+    error: Optional[str] = None
+    traceback: Optional[str] = None
+    # Span timings recorded while this account ran in a worker process (see metrics).
+    timings: Dict[str, metrics.SpanStats] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return self.finished - self.started
+
+
+@dataclass
+class RunSummary:
+    """
+    Per-account results plus throughput figures for a whole run.
+    """
+    results: List[AccountResult] = field(default_factory=list)
+    concurrency: int = 1
+    wall_time: float = 0.0
+    vpn_accounts: int = 0
+    vpn_connects: int = 0
+    timings: Dict[str, metrics.SpanStats] = field(default_factory=dict)
+
+    @property
+    def vpn_reconnects_saved(self) -> int:
+        """
+        VPN connects avoided compared to reconnecting for every account that has a region.
+        """
+        return max(0, self.vpn_accounts - self.vpn_connects)
+
+    @property
+    def accounts(self) -> int:
+        """
+        Distinct accounts run; `results` also holds every retried attempt.
+        """
+        return len({r.profile for r in self.results})
+
+    @property
+    def succeeded(self) -> List[AccountResult]:
+        return [r for r in self.results if r.ok]
+
+    @property
+    def failed(self) -> List[AccountResult]:
+        # One entry per account that never succeeded: its last failed attempt.
+        recovered = {r.profile for r in self.results if r.ok}
+        last: Dict[str, AccountResult] = {}
+        for r in self.results:
+            if not r.ok and r.profile not in recovered:
+                last[r.profile] = r
+        return list(last.values())
+
+    @property
+    def accounts_per_hour(self) -> float:
+        if self.wall_time <= 0:
+            return 0.0
+        return self.accounts * 3600 / self.wall_time
+
+    def print_report(self) -> None:
+        session_time = sum(r.duration for r in self.results)
+        print("=" * 40)
+        retried = len(self.results) - self.accounts
+        attempts = f", {retried} retried attempt(s)" if retried else ""
+        print(f"Accounts:     {self.accounts} ({len(self.succeeded)} ok, {len(self.failed)} failed{attempts})")
+        print(f"Concurrency:  {self.concurrency}")
+        print(f"Wall time:    {self.wall_time:.1f}s (sum of sessions {session_time:.1f}s)")
+        print(f"Throughput:   {self.accounts_per_hour:.1f} accounts/hour")
+        if self.vpn_connects:
+            print(f"VPN:          {self.vpn_connects} connect(s) for {self.vpn_accounts} account(s), "
+                  f"{self.vpn_reconnects_saved} reconnect(s) saved")
+        for r in self.failed:
+            print(f"  FAILED {r.profile}: {r.error}")
+        if self.timings:
+            print("-" * 40)
+            metrics.print_report(self.timings)
+        print("=" * 40)
+
+
+def _run_one(profile: Profile, activity: Callable, egress: Optional[Egress]) -> AccountResult:
+    """
+    Worker-process entry point: runs `activity` for one profile and captures the outcome.
+    """
+    started = time.time()
+    try:
+        value = CamoufoxBrowser(profile, egress).launch(activity, reraise=True)
+        result = AccountResult(profile=profile.profile, ok=True, started=started, finished=time.time(), value=value)
+    except Exception as e:
+        result = AccountResult(
+            profile=profile.profile,
+            ok=False,
+            started=started,
+            finished=time.time(),
+            error=f"{type(e).__name__}: {e}",
+            traceback=traceback.format_exc(),
+        )
+    # Spawned workers exit without running atexit, so the sink's last segment is closed here.
+    sink_stats = close_shared_sink()
+    if sink_stats is not None:
+        print(f"{profile.profile}: {sink_stats.describe()}")
+    result.timings = metrics.drain()
+    return result
+
+
+def _record(summary: RunSummary, result: AccountResult, on_result: Optional[Callable[[AccountResult], None]]) -> None:
+    summary.results.append(result)
+    status = "ok" if result.ok else f"FAILED ({result.error})"
+    print(f"[{len(summary.results)}] {result.profile}: {status} in {result.duration:.1f}s")
+    if on_result is not None:
+        on_result(result)
+
+
+def run_accounts(
+    accounts: Iterable[Profile],
+    activity: Callable,
+    *,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    on_result: Optional[Callable[[AccountResult], None]] = None,
+    group_by_region: Optional[bool] = None,
+    egress: Optional[Egress] = None,
+    journal: Optional[RunJournal] = None,
+) -> RunSummary:
+    """
+    Runs `activity` once per account, with up to `concurrency` CamoufoxBrowser
+    sessions alive at the same time, each in its own worker process.
+
+    With `group_by_region`, accounts are reordered so each VPN region is visited once
+    (see `vpn.iter_by_region`). The tunnel is switched here, between regions, only after
+    every session of the previous region has finished; sessions of one region then run
+    concurrently over the same tunnel and skip reconnecting. Accounts without a code and
+    those of the first region start as they arrive; other regions wait until the account
+    listing is exhausted.
+
+    Args:
+        accounts: The profiles to run, e.g. the list from `web.get_accounts()`.
+        activity: The Playwright activity passed to `CamoufoxBrowser.launch`. It must be a
+                  module-level function so it can be sent to the worker processes.
+        concurrency: The maximum number of browser sessions running at once.
+        on_result: Optional callback invoked in this process as each account finishes.
+        group_by_region: Order accounts by VPN region and keep the tunnel up within a region.
+                         Defaults to on whenever the egress is the machine-wide VPN. Turning
+                         it off with the VPN runs one session at a time, since concurrent
+                         sessions in different regions would switch the tunnel under each other.
+        egress: How sessions reach the internet (default: the one SM_EGRESS selects, normally
+                the PIA VPN). With a proxy egress every session has its own exit, so
+                regions don't need to be serialised.
+        journal: Records every account's progress. Accounts it has seen finish are
+                 skipped, and failed ones are run again after a backoff, once the other
+                 accounts are through, until the journal's max_attempts.
+
+    Returns:
+        A RunSummary with every account's result, wall time and throughput.
+    """
+    concurrency = max(1, concurrency)
+    summary = RunSummary(concurrency=concurrency)
+    started = time.monotonic()
+    # Failed accounts waiting for their retry: (not before, tie-breaker, profile).
+    retries: List[Tuple[float, int, Profile]] = []
+    retry_order = itertools.count()
+    region: Optional[str] = None
+    egress = egress or default_egress()
+    if group_by_region is None:
+        group_by_region = egress.uses_vpn
+    group_by_region = group_by_region and egress.uses_vpn
+    if egress.uses_vpn and not group_by_region and concurrency > 1:
+        print("Accounts with a VPN code share one machine-wide PIA tunnel; without group_by_region "
+              "they run one at a time.")
+        concurrency = summary.concurrency = 1
+    if group_by_region:
+        accounts = iter_by_region(accounts)
+
+    # "spawn" gives every worker a clean interpreter (Playwright does not survive fork),
+    # and one task per child means a crashed browser can never poison the next account.
+    ctx = multiprocessing.get_context("spawn")
+    metrics.serve_from_env()
+    with (
+        metrics.collecting() as summary.timings,
+        ProcessPoolExecutor(max_workers=concurrency, mp_context=ctx, max_tasks_per_child=1) as pool,
+    ):
+        pending: Dict[Future, Profile] = {}
+
+        def record(profile_obj: Profile, result: AccountResult) -> None:
+            # on_result (e.g. queueing the status update) runs before the journal marks the
+            # account done, so a crash in between re-runs it instead of losing the update.
+            _record(summary, result, on_result)
+            if journal is not None:
+                retry_at = journal.finish(profile_obj.profile, result.ok, result.error)
+                if retry_at is not None:
+                    heapq.heappush(retries, (retry_at, next(retry_order), profile_obj))
+
+        def collect(done: Iterable[Future]) -> None:
+            for future in done:
+                profile_obj = pending.pop(future)
+                egress.release(profile_obj)
+                try:
+                    result = future.result()
+                    metrics.merge(result.timings)
+                except Exception as e:
+                    # The worker itself died, or the activity's return value could not be pickled.
+                    result = AccountResult(
+                        profile=profile_obj.profile,
+                        ok=False,
+                        started=time.time(),
+                        finished=time.time(),
+                        error=f"{type(e).__name__}: {e}",
+                    )
+                record(profile_obj, result)
+
+        def drain(limit: int) -> None:
+            while len(pending) > limit:
+                done, _ = wait_futures(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+
+        def admitted(source: Iterable[Profile]) -> Iterator[Profile]:
+            for profile_obj in source:
+                not_before = journal.admit(profile_obj.profile)
+                if not_before is None:
+                    continue                  # done in an earlier run, or out of attempts
+                if not_before > time.time():
+                    heapq.heappush(retries, (not_before, next(retry_order), profile_obj))
+                    continue
+                yield profile_obj
+
+        def retried() -> Iterator[Profile]:
+            # Runs once every fresh account is submitted; sessions still running may fail
+            # and add retries, so keep collecting them while waiting for the next one due.
+            while retries or pending:
+                if not retries:
+                    drain(len(pending) - 1)
+                    continue
+                delay = retries[0][0] - time.time()
+                if delay > 0:
+                    if pending:
+                        done, _ = wait_futures(pending, timeout=delay, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    else:
+                        time.sleep(delay)
+                    continue
+                yield heapq.heappop(retries)[2]
+
+        if journal is not None:
+            accounts = itertools.chain(admitted(accounts), retried())
+
+        for profile_obj in accounts:
+            if egress.uses_vpn and profile_obj.code is not None:
+                summary.vpn_accounts += 1
+
+            if group_by_region and profile_obj.code is not None and profile_obj.code != region:
+                # The tunnel is machine-wide: let the previous region's sessions finish first.
+                drain(0)
+                region = None
+                try:
+                    egress.connect(profile_obj)
+                except Exception as e:
+                    record(profile_obj, AccountResult(
+                        profile=profile_obj.profile,
+                        ok=False,
+                        started=time.time(),
+                        finished=time.time(),
+                        error=f"{type(e).__name__}: {e}",
+                        traceback=traceback.format_exc(),
+                    ))
+                    continue
+                summary.vpn_connects += 1
+                region = profile_obj.code
+
+            # Keep at most `concurrency` accounts queued so results stream back in order of work.
+            drain(concurrency - 1)
+
+            # Pooled egresses reserve an exit per session and may be at their load cap.
+            session_egress = egress.bind(profile_obj)
+            while session_egress is None and pending:
+                drain(len(pending) - 1)
+                session_egress = egress.bind(profile_obj)
+            if session_egress is None:
+                record(profile_obj, AccountResult(
+                    profile=profile_obj.profile,
+                    ok=False,
+                    started=time.time(),
+                    finished=time.time(),
+                    error="no egress available (every proxy is down)",
+                ))
+                continue
+            if journal is not None:
+                journal.start(profile_obj.profile)
+            pending[pool.submit(_run_one, profile_obj, activity, session_egress)] = profile_obj
+
+        drain(0)
+
+    summary.wall_time = time.monotonic() - started
+    return summary
+
+
+async def run_accounts_async(
+    accounts: Iterable[Profile],
+    activity: Callable[[Any, Any, Any], Awaitable[Any]],
+    *,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    on_result: Optional[Callable[[AccountResult], None]] = None,
+    egress: Optional[Egress] = None,
+) -> RunSummary:
+    """
+    Event-loop counterpart of `run_accounts`: drives up to `concurrency`
+    AsyncCamoufoxBrowser sessions from the current event loop instead of worker processes.
+
+    With the machine-wide VPN, accounts are grouped by region (see `vpn.iter_by_region`)
+    and a session only starts once no session of another region is running, so sessions
+    never switch the tunnel under each other.
+
+    Args:
+        accounts: The profiles to run.
+        activity: A coroutine function passed to `AsyncCamoufoxBrowser.launch`.
+        concurrency: The maximum number of browser sessions running at once.
+        on_result: Optional callback invoked as each account finishes.
+        egress: How sessions reach the internet (default: the one SM_EGRESS selects).
+
+    Returns:
+        A RunSummary with every account's result, wall time and throughput.
+    """
+    concurrency = max(1, concurrency)
+    summary = RunSummary(concurrency=concurrency)
+    started = time.monotonic()
+    slots = asyncio.Semaphore(concurrency)
+    egress = egress or default_egress()
+    running = 0
+    # The VPN region sessions are currently using, and how many of them are running.
+    region_gate = asyncio.Condition()
+    region: Optional[str] = None
+    in_region = 0
+    if egress.uses_vpn:
+        accounts = iter_by_region(accounts)
+
+    async def enter_region(code: Optional[str]) -> None:
+        nonlocal region, in_region
+        if not egress.uses_vpn or code is None:
+            return
+        async with region_gate:
+            await region_gate.wait_for(lambda: in_region == 0 or region == code)
+            region = code
+            in_region += 1
+
+    async def leave_region(code: Optional[str]) -> None:
+        nonlocal in_region
+        if not egress.uses_vpn or code is None:
+            return
+        async with region_gate:
+            in_region -= 1
+            region_gate.notify_all()
+
+    async def run_one(profile_obj: Profile) -> None:
+        async with slots:
+            await enter_region(profile_obj.code)
+            try:
+                await run_session(profile_obj)
+            finally:
+                await leave_region(profile_obj.code)
+
+    async def run_session(profile_obj: Profile) -> None:
+        nonlocal running
+        account_started = time.time()
+        session_egress = egress.bind(profile_obj)
+        while session_egress is None and running:
+            await asyncio.sleep(0.5)          # the profile's exit is at its load cap
+            session_egress = egress.bind(profile_obj)
+        if session_egress is None:
+            _record(summary, AccountResult(
+                profile=profile_obj.profile,
+                ok=False,
+                started=account_started,
+                finished=time.time(),
+                error="no egress available (every proxy is down)",
+            ), on_result)
+            return
+        running += 1
+        try:
+            value = await AsyncCamoufoxBrowser(profile_obj, session_egress).launch(activity, reraise=True)
+            result = AccountResult(
+                profile=profile_obj.profile, ok=True, started=account_started, finished=time.time(), value=value
+            )
+        except Exception as e:
+            result = AccountResult(
+                profile=profile_obj.profile,
+                ok=False,
+                started=account_started,
+                finished=time.time(),
+                error=f"{type(e).__name__}: {e}",
+                traceback=traceback.format_exc(),
+            )
+        finally:
+            running -= 1
+            egress.release(profile_obj)
+        _record(summary, result, on_result)
+
+    metrics.serve_from_env()
+    with metrics.collecting() as summary.timings:
+        await asyncio.gather(*(run_one(profile_obj) for profile_obj in accounts))
+
+    summary.wall_time = time.monotonic() - started
+    return summary
@@ -0,0 +1,437 @@
+# scrape_sink.py – batched, compressed record writer with a dedup index shared by every session
+import atexit
+import gzip
+import hashlib
+import json
+import math
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+import uuid
+import zlib
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, is_dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+try:
+    import fcntl                          # POSIX
+except ImportError:
+    fcntl = None
+    import msvcrt                         # Windows
+
+from harvest import PostRecord, ProfileRecord
+from util import print_filtered_traceback
+
+# Where segments and the dedup index live (SM_SCRAPE_DIR).
+SCRAPE_DIR = Path(os.environ.get("SM_SCRAPE_DIR", "scraped"))
+
+# Distinct post/profile ids the dedup index is sized for; past this its false-positive
+# rate (records wrongly dropped as duplicates) climbs above ERROR_RATE.
+DEFAULT_CAPACITY = int(os.environ.get("SM_SCRAPE_INDEX_CAPACITY", "10000000"))
+ERROR_RATE = 1e-4
+
+# Uncompressed MiB (SM_SCRAPE_SEGMENT_MB) or seconds after which a segment is closed.
+DEFAULT_SEGMENT_MB = int(os.environ.get("SM_SCRAPE_SEGMENT_MB", "64"))
+DEFAULT_SEGMENT_SECONDS = 3600.0
+
+_SEGMENT_SUFFIX = ".jsonl.gz"
+_OPEN_SUFFIX = ".part"
+
+# magic, number of bits, number of hash functions, number of bits set; padded so the
+# bit array is aligned. SMSEEN01 files lack the count and get it on first open.
+_INDEX_HEADER = struct.Struct("<8sQIQ36x")
+_INDEX_MAGIC = b"SMSEEN02"
+_INDEX_MAGIC_V1 = b"SMSEEN01"
+_SET_BITS = struct.Struct("<Q")
+_SET_BITS_OFFSET = struct.calcsize("<8sQI")
+
+_STOP = object()
+
+
+class SeenIndex:
+    """
+    A Bloom filter of record keys in a memory-mapped file, so every process and every
+    run consults the same set without loading it. Sized for `capacity` keys at
+    `error_rate` false positives (about 2.4 bytes per key at the defaults); an existing
+    file keeps the size it was created with.
+
+    `add` holds a lock on the file (and one per process, for threads) while it checks
+    and sets, so of several sinks adding the same key exactly one sees it as new. The
+    header keeps a running count of the bits set, for `fill_ratio`.
+    """
+
+    def __init__(self, path: Path, capacity: int = DEFAULT_CAPACITY, error_rate: float = ERROR_RATE):
+        self.path = Path(path)
+        if not self.path.exists():
+            self._create(capacity, error_rate)
+        self._file = self.path.open("r+b")
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+        self._lock = threading.Lock()
+        magic, self.bits, self.hashes, _ = _INDEX_HEADER.unpack_from(self._mm, 0)
+        if magic == _INDEX_MAGIC_V1:
+            self._upgrade()
+        elif magic != _INDEX_MAGIC:
+            raise ValueError(f"{self.path} is not a scrape dedup index")
+
+    def _create(self, capacity: int, error_rate: float) -> None:
+        bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        bits += -bits % 8
+        hashes = max(1, round(bits / capacity * math.log(2)))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with tmp.open("wb") as f:
+            f.write(_INDEX_HEADER.pack(_INDEX_MAGIC, bits, hashes, 0))
+            f.truncate(_INDEX_HEADER.size + bits // 8)      # sparse where supported
+        try:
+            # link() fails if another process created the index first; theirs wins.
+            os.link(tmp, self.path)
+        except FileExistsError:
+            pass
+        finally:
+            tmp.unlink()
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with self._lock:
+            fd = self._file.fileno()
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                else:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+    def _upgrade(self) -> None:
+        # One pass over the bitmap in chunks; afterwards `add` keeps the count current.
+        with self._locked():
+            if self._mm[:8] != _INDEX_MAGIC_V1:
+                return                      # another process got here first
+            set_bits, start, end = 0, _INDEX_HEADER.size, _INDEX_HEADER.size + self.bits // 8
+            for i in range(start, end, 2**20):
+                set_bits += int.from_bytes(self._mm[i:min(end, i + 2**20)], "little").bit_count()
+            _SET_BITS.pack_into(self._mm, _SET_BITS_OFFSET, set_bits)
+            self._mm[:8] = _INDEX_MAGIC
+
+    def _positions(self, key: str) -> Iterator[int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = struct.unpack("<QQ", digest)
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.bits
+
+    def __contains__(self, key: str) -> bool:
+        mm, offset = self._mm, _INDEX_HEADER.size
+        return all(mm[offset + (bit >> 3)] & (1 << (bit & 7)) for bit in self._positions(key))
+
+    def add(self, key: str) -> bool:
+        """
+        Adds `key`; returns True if it wasn't in the index yet.
+        """
+        return self.add_many([key]) == 1
+
+    def add_many(self, keys: Iterable[str]) -> int:
+        """
+        Adds every key under one lock; returns how many of them were new.
+        """
+        mm, offset = self._mm, _INDEX_HEADER.size
+        new_keys = 0
+        with self._locked():
+            set_bits, = _SET_BITS.unpack_from(mm, _SET_BITS_OFFSET)
+            for key in keys:
+                new = False
+                for bit in self._positions(key):
+                    i, mask = offset + (bit >> 3), 1 << (bit & 7)
+                    byte = mm[i]
+                    if not byte & mask:
+                        mm[i] = byte | mask
+                        set_bits += 1
+                        new = True
+                new_keys += new
+            _SET_BITS.pack_into(mm, _SET_BITS_OFFSET, set_bits)
+        return new_keys
+
+    def fill_ratio(self) -> float:
+        """
+        Fraction of bits set; the false-positive rate is roughly this to the power `hashes`.
+        """
+        set_bits, = _SET_BITS.unpack_from(self._mm, _SET_BITS_OFFSET)
+        return set_bits / self.bits
+
+    def flush(self) -> None:
+        self._mm.flush()
+
+    def close(self) -> None:
+        self._mm.flush()
+        self._mm.close()
+        self._file.close()
+
+
+def record_key(record: Any) -> Tuple[str, str]:
+    """
+    (kind, dedup key) for a harvested record, or for a dict with "kind" and "id".
+    """
+    if isinstance(record, PostRecord):
+        return "post", f"post:{record.id}"
+    if isinstance(record, ProfileRecord):
+        return "profile", f"profile:{record.id}"
+    kind = record["kind"]
+    return kind, f"{kind}:{record['id']}"
+
+
+@dataclass
+class SinkStats:
+    queued: int = 0
+    written: int = 0
+    duplicates: int = 0
+    dropped: int = 0             # queue stayed full for put_timeout
+    segments: int = 0
+
+    def describe(self) -> str:
+        dropped = f", {self.dropped} DROPPED (queue full)" if self.dropped else ""
+        return (f"scrape sink {self.written} written, {self.duplicates} duplicate(s) skipped, "
+                f"{self.segments} segment(s){dropped}")
+
+
+class ScrapeSink:
+    """
+    Appends scraped records to gzip-compressed JSONL segments under `root`, from a
+    background thread fed by a bounded queue, so the browser session only ever pays
+    for an in-memory `put`.
+
+    • Records whose key is already in the shared `SeenIndex`, or was written by this
+      sink since its last sync, are dropped on arrival.
+    • Every `fsync_interval` seconds the segment is flushed and fsynced, and only then
+      do the keys written since the previous sync go into the index. A crash loses at
+      most those records, and since they never reached the index, a later run scrapes
+      them again. The price: two sinks that both write a key within one interval
+      keep two copies (readers that care can de-duplicate by "kind" and "id").
+    • A segment is written as `<name>.jsonl.gz.part` and renamed once it's closed,
+      after `segment_bytes` of JSON or `segment_seconds`. A `.part` left by a crash is
+      readable up to its last sync (see `iter_segment`).
+
+    Use it as a context manager so the last segment is closed on shutdown.
+    """
+
+    def __init__(self, root: Path = SCRAPE_DIR, queue_size: int = 10000, put_timeout: float = 1.0,
+                 fsync_interval: float = 5.0, segment_bytes: int = DEFAULT_SEGMENT_MB * 2**20,
+                 segment_seconds: float = DEFAULT_SEGMENT_SECONDS, index: Optional[SeenIndex] = None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.put_timeout = put_timeout
+        self.fsync_interval = fsync_interval
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.index = index or SeenIndex(self.root / "seen.bloom")
+        self.stats = SinkStats()
+        self._stats_lock = threading.Lock()
+
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        self._closed = False
+        self._raw = None
+        self._gz: Optional[gzip.GzipFile] = None
+        self._segment_path: Optional[Path] = None
+        self._segment_opened = 0.0
+        self._segment_written = 0
+        self._sequence = 0
+        self._last_sync = time.monotonic()
+        self._unsynced: Set[str] = set()     # keys written since the last fsync
+
+        self._thread = threading.Thread(target=self._worker, name="scrape-sink", daemon=True)
+        self._thread.start()
+
+    def _count(self, **deltas: int) -> None:
+        with self._stats_lock:
+            for name, delta in deltas.items():
+                setattr(self.stats, name, getattr(self.stats, name) + delta)
+
+    def put(self, record: Any, account: Optional[str] = None) -> bool:
+        """
+        Queues a harvested record (or a dict with "kind" and "id") for writing. Waits at
+        most `put_timeout` for room in the queue; returns False if the record was dropped.
+        """
+        if self._closed:
+            raise RuntimeError("ScrapeSink is closed")
+        try:
+            self._queue.put((record, account, time.time()), timeout=self.put_timeout)
+        except queue.Full:
+            self._count(dropped=1)
+            return False
+        self._count(queued=1)
+        return True
+
+    # --- writer thread ---------------------------------------------------------------
+
+    def _open_segment(self) -> None:
+        self._sequence += 1
+        # The uuid keeps names unique between sinks in one process and across machines.
+        name = (f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._sequence:04d}-"
+                f"{uuid.uuid4().hex[:12]}{_SEGMENT_SUFFIX}")
+        self._segment_path = self.root / name
+        self._raw = open(self._segment_path.with_name(name + _OPEN_SUFFIX), "xb")
+        self._gz = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=6)
+        self._segment_opened = time.monotonic()
+        self._segment_written = 0
+
+    def _write(self, record: Any, account: Optional[str], scraped_at: float) -> None:
+        kind, key = record_key(record)
+        if key in self._unsynced or key in self.index:
+            self._count(duplicates=1)
+            return
+        data: Dict[str, Any] = asdict(record) if is_dataclass(record) else dict(record)
+        data.update(kind=kind, account=account, scraped_at=scraped_at)
+        line = (json.dumps(data, ensure_ascii=False, separators=(",", ":")) + "\n").encode()
+        if self._gz is None:
+            self._open_segment()
+        self._gz.write(line)
+        self._unsynced.add(key)
+        self._segment_written += len(line)
+        self._count(written=1)
+
+    def _sync(self) -> None:
+        if self._gz is not None:
+            self._gz.flush(zlib.Z_SYNC_FLUSH)
+            os.fsync(self._raw.fileno())
+        # Only records that are on disk may be marked as scraped.
+        if self._unsynced:
+            self.index.add_many(self._unsynced)
+            self._unsynced.clear()
+        self._last_sync = time.monotonic()
+
+    def _close_segment(self) -> None:
+        if self._gz is None:
+            return
+        self._sync()
+        self._gz.close()                    # writes the gzip trailer
+        os.fsync(self._raw.fileno())
+        self._raw.close()
+        os.replace(self._segment_path.with_name(self._segment_path.name + _OPEN_SUFFIX), self._segment_path)
+        self._gz = self._raw = self._segment_path = None
+        self._count(segments=1)
+
+    def _worker(self) -> None:
+        stopping = False
+        while not stopping:
+            timeout = max(0.0, self._last_sync + self.fsync_interval - time.monotonic())
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+                # Take whatever else is already waiting, so the disk sees one batch.
+                while len(batch) < 1000:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            try:
+                for item in batch:
+                    if item is _STOP:
+                        stopping = True
+                        continue
+                    self._write(*item)
+                if stopping:
+                    self._close_segment()
+                elif self._gz is not None and (
+                        self._segment_written >= self.segment_bytes
+                        or time.monotonic() - self._segment_opened >= self.segment_seconds):
+                    self._close_segment()
+                elif time.monotonic() - self._last_sync >= self.fsync_interval:
+                    self._sync()
+            except Exception:
+                print("Scrape sink write failed:")
+                print_filtered_traceback()
+
+    def close(self) -> None:
+        """
+        Writes everything queued so far, closes the open segment and the index.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        self.index.close()
+
+    def __enter__(self) -> 'ScrapeSink':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def iter_segment(path: Path) -> Iterator[Dict[str, Any]]:
+    """
+    The records in one segment. A `.part` segment from a crashed writer is read up to
+    the point where it ends; the torn tail is skipped.
+    """
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    return                  # torn final line
+    except (EOFError, zlib.error, gzip.BadGzipFile):
+        return
+
+
+def iter_records(root: Path = SCRAPE_DIR) -> Iterator[Dict[str, Any]]:
+    """
+    Every record under `root`, oldest segment first.
+    """
+    root = Path(root)
+    paths = sorted(list(root.glob("*" + _SEGMENT_SUFFIX)) + list(root.glob("*" + _SEGMENT_SUFFIX + _OPEN_SUFFIX)))
+    for path in paths:
+        yield from iter_segment(path)
+
+
+_shared: Optional[ScrapeSink] = None
+_shared_lock = threading.Lock()
+
+
+def shared_sink() -> ScrapeSink:
+    """
+    The process-wide sink under SCRAPE_DIR, created on first use. Runner workers close
+    it when their account is done (spawned processes skip atexit); everything else
+    closes it at exit.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = ScrapeSink()
+            atexit.register(close_shared_sink)
+        return _shared
+
+
+def close_shared_sink() -> Optional[SinkStats]:
+    """
+    Closes the process-wide sink if one was opened; returns its final stats.
+    """
+    global _shared
+    with _shared_lock:
+        sink, _shared = _shared, None
+    if sink is None:
+        return None
+    sink.close()
+    return sink.stats
+
+
+if __name__ == "__main__":
+    segments = sorted(SCRAPE_DIR.glob("*" + _SEGMENT_SUFFIX + "*"))
+    kinds: Dict[str, int] = {}
+    for record in iter_records():
+        kinds[record.get("kind", "?")] = kinds.get(record.get("kind", "?"), 0) + 1
+    print(f"{SCRAPE_DIR}: {len(segments)} segment(s), {sum(p.stat().st_size for p in segments) / 2**20:.1f} MiB, "
+          f"records {kinds or 'none'}")
+    if (SCRAPE_DIR / "seen.bloom").exists():
+        index = SeenIndex(SCRAPE_DIR / "seen.bloom")
+        print(f"Dedup index: {index.bits // 8 / 2**20:.1f} MiB, {index.hashes} hashes, "
+              f"{index.fill_ratio():.2%} of bits set")
+        index.close()
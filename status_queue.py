@@ -0,0 +1,165 @@
+# status_queue.py – write-behind, journaled account status updates
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict
+
+from util import print_filtered_traceback
+from web import AccountStatus, json_web_call
+
+_JOURNAL = Path("status_updates.jsonl")
+
+# Upper bound in seconds for the pause between send rounds while the backend keeps failing.
+RETRY_CAP = 300.0
+
+
+class StatusUpdateQueue:
+    """
+    Collects account status changes and sends them to change_account_status.php
+    from a background thread, so callers never wait on the backend.
+
+    • Updates are coalesced per profile – the last status written wins.
+    • Pending updates are flushed every `flush_interval` seconds, or sooner once
+      `batch_size` profiles are waiting, and always on `close()`. The endpoint takes one
+      profile per request, so a flush still makes one call per profile; what batching
+      saves is the repeat updates and the wait in the caller.
+    • While sends fail, rounds back off exponentially (from `flush_interval` up to
+      RETRY_CAP) instead of retrying as soon as `batch_size` updates are waiting.
+    • Every update is appended to a local journal and fsynced before `put` returns,
+      and the journal is replayed on start-up, so a crash or power loss never loses
+      an acknowledged update.
+
+    Use it as a context manager so the final flush happens on shutdown.
+    """
+
+    def __init__(self, journal_path: Path = _JOURNAL, flush_interval: float = 5.0, batch_size: int = 20):
+        self.journal_path = Path(journal_path)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self._pending: Dict[str, str] = self._replay_journal()
+        self._cond = threading.Condition()
+        self._closing = False
+        self._sending = False
+        self._rounds = 0
+        self._flush_requested = False
+        self._journal = self.journal_path.open("a", encoding="utf-8")
+
+        self._thread = threading.Thread(target=self._worker, name="status-updates", daemon=True)
+        self._thread.start()
+
+    def _replay_journal(self) -> Dict[str, str]:
+        pending: Dict[str, str] = {}
+        if not self.journal_path.exists():
+            return pending
+        for line in self.journal_path.read_text(encoding="utf-8").splitlines():
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue                        # torn final line from a crash
+            pending[entry["profile"]] = entry["status"]
+        if pending:
+            print(f"Replaying {len(pending)} unsent status update(s) from {self.journal_path}")
+        return pending
+
+    def put(self, profile: str, status: AccountStatus) -> None:
+        """
+        Queues `status` for `profile`. Returns immediately; the update is sent later.
+        """
+        with self._cond:
+            if self._closing:
+                raise RuntimeError("StatusUpdateQueue is closed")
+            self._pending[profile] = status.value
+            self._journal.write(json.dumps({"profile": profile, "status": status.value}) + "\n")
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    def flush(self) -> None:
+        """
+        Blocks until everything queued so far has had a send attempt.
+        """
+        with self._cond:
+            # A round already in progress may have started before our latest put().
+            target = self._rounds + (2 if self._sending else 1)
+            self._flush_requested = True
+            self._cond.notify()
+            self._cond.wait_for(lambda: self._rounds >= target or not self._thread.is_alive())
+
+    def close(self) -> None:
+        """
+        Sends whatever is still pending and stops the background thread.
+        Updates that could not be sent stay in the journal for the next run.
+        """
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._journal.close()
+
+    def __enter__(self) -> "StatusUpdateQueue":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _worker(self) -> None:
+        failed_rounds = 0
+        while True:
+            with self._cond:
+                if failed_rounds:
+                    # The backend is failing: a full batch doesn't cut the backoff short.
+                    self._cond.wait_for(
+                        lambda: self._closing or self._flush_requested,
+                        timeout=min(RETRY_CAP, self.flush_interval * 2 ** (failed_rounds - 1)),
+                    )
+                else:
+                    self._cond.wait_for(
+                        lambda: self._closing or self._flush_requested or len(self._pending) >= self.batch_size,
+                        timeout=self.flush_interval,
+                    )
+                self._flush_requested = False
+                batch = dict(self._pending)
+                closing = self._closing
+                self._sending = True
+
+            sent = self._send(batch)
+            failed_rounds = failed_rounds + 1 if len(sent) < len(batch) else 0
+
+            with self._cond:
+                for profile, status in sent.items():
+                    # Only drop it if nothing newer arrived while we were sending.
+                    if self._pending.get(profile) == status:
+                        del self._pending[profile]
+                if sent:
+                    self._compact_journal()
+                self._sending = False
+                self._rounds += 1
+                self._cond.notify_all()
+            if closing:
+                return
+
+    def _send(self, batch: Dict[str, str]) -> Dict[str, str]:
+        sent: Dict[str, str] = {}
+        for profile, status in batch.items():
+            try:
+                json_web_call("change_account_status.php", {"profile": profile, "status": status})
+                sent[profile] = status
+            except Exception as e:
+                print(f"Could not update status for {profile} (will retry): {e}")
+                print_filtered_traceback()
+        return sent
+
+    def _compact_journal(self) -> None:
+        # Rewrite the journal to hold only what is still unsent; os.replace keeps it atomic.
+        tmp = self.journal_path.with_suffix(self.journal_path.suffix + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            for profile, status in self._pending.items():
+                f.write(json.dumps({"profile": profile, "status": status}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal.close()
+        os.replace(tmp, self.journal_path)
+        self._journal = self.journal_path.open("a", encoding="utf-8")
@@ -0,0 +1,203 @@
+# target_pool.py – locally buffered random target profiles for instagram.search
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Tuple
+
+from profile_store import _paths
+from util import print_filtered_traceback
+from web import get_random_profile, get_random_profiles
+
+# Searches a session typically makes; the default pool fetches about this many targets
+# up front (SM_TARGETS_PER_SESSION) instead of a large batch the session never uses.
+TARGETS_PER_SESSION = int(os.environ.get("SM_TARGETS_PER_SESSION", "3"))
+
+# The account whose session is running in this context; set by CamoufoxBrowser.launch,
+# so `take()` knows whom a target is for without every caller passing it.
+current_account: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_account", default=None)
+
+_HISTORY_FILE = "search_history.json"
+
+
+class TargetProfilePool:
+    """
+    A refillable pool of non-private target profiles, so `instagram.search` doesn't
+    have to call the backend in the middle of a browsing session.
+
+    A background thread tops the pool up with about `batch_size` targets whenever it
+    drops below `low_water`. Every fetched target is usable as soon as its backend call
+    returns, so `take()` never waits for a whole batch.
+
+    A target handed to an account is not handed to the same account again for
+    `repeat_window` seconds. That history is kept in the account's profile directory,
+    so it carries over between sessions and runs even though each runner worker
+    process only ever serves one account. Buffered targets that every account which
+    took one in the last `active_window` seconds has already seen are dropped, and a
+    `take()` that finds nothing usable asks for a refill even if the buffer isn't low.
+    """
+
+    def __init__(self, low_water: int = 1, batch_size: int = TARGETS_PER_SESSION, repeat_window: float = 24 * 3600,
+                 active_window: float = 15 * 60):
+        self.low_water = low_water
+        self.batch_size = batch_size
+        self.repeat_window = repeat_window
+        self.active_window = active_window
+
+        self._targets: Deque[str] = deque()
+        self._recent: Dict[str, Deque[Tuple[float, str]]] = {}
+        self._active: Dict[str, float] = {}   # account -> time of its last take()
+        self._want_refill = False
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._refill_loop, name="target-pool", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def _refill_loop(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._closed or self._want_refill or len(self._targets) < self.low_water)
+                if self._closed:
+                    return
+                self._want_refill = False
+
+            fetched = 0
+            try:
+                # Backends that only return one profile per call get called repeatedly;
+                # each answer is handed out right away rather than after the whole batch.
+                while fetched < self.batch_size:
+                    batch = get_random_profiles(self.batch_size - fetched)
+                    if not batch:
+                        break
+                    fetched += len(batch)
+                    with self._cond:
+                        self._targets.extend(t for t in batch if t not in self._targets)
+                        self._cond.notify_all()
+                        if self._closed:
+                            return
+            except Exception as e:
+                print(f"Could not refill target profile pool: {e}")
+                print_filtered_traceback()
+
+            if not fetched:
+                with self._cond:
+                    self._cond.notify_all()     # let waiting takers fall back to a direct call
+                time.sleep(5)                   # backend trouble; don't spin
+
+    @staticmethod
+    def _history_path(account: str) -> Path:
+        profile_dir, _ = _paths(account)
+        return profile_dir / _HISTORY_FILE
+
+    def _load_history(self, account: str) -> Deque[Tuple[float, str]]:
+        try:
+            entries = json.loads(self._history_path(account).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            entries = []
+        return deque((float(t), str(target)) for t, target in entries)
+
+    def _save_history(self, account: str, recent: List[Tuple[float, str]]) -> None:
+        path = self._history_path(account)
+        # Written to a temp file first; os.replace keeps the swap atomic.
+        tmp = path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps([list(entry) for entry in recent]), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def _recently_given(self, account: str, now: float) -> Deque[Tuple[float, str]]:
+        recent = self._recent.get(account)
+        if recent is None:
+            recent = self._recent[account] = self._load_history(account)
+        while recent and now - recent[0][0] > self.repeat_window:
+            recent.popleft()
+        return recent
+
+    def _prune(self, now: float) -> None:
+        """
+        Drops buffered targets that no active account can use any more.
+        Must be called with the lock held.
+        """
+        active = [account for account, last in self._active.items() if now - last <= self.active_window]
+        if not active:
+            return
+        seen = [{target for _, target in self._recently_given(account, now)} for account in active]
+        stale = [target for target in self._targets if all(target in s for s in seen)]
+        for target in stale:
+            self._targets.remove(target)
+
+    def take(self, account: Optional[str] = None, timeout: float = 10) -> str:
+        """
+        Returns a target profile name, preferring one not given to `account` recently.
+        `account` defaults to the account of the running session (`current_account`).
+
+        Blocks for at most `timeout` seconds if the pool is empty, then falls back to
+        asking the backend directly.
+        """
+        if account is None:
+            account = current_account.get()
+        now = time.time()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if account is not None:
+                self._active[account] = now
+            while True:
+                recent = self._recently_given(account, now) if account is not None else deque()
+                seen = {target for _, target in recent}
+                for target in self._targets:
+                    if target not in seen:
+                        self._targets.remove(target)
+                        break
+                else:
+                    target = None
+
+                if target is not None or self._closed:
+                    break
+                # Nothing usable buffered: drop what nobody can use and wait for a refill.
+                self._prune(now)
+                self._want_refill = True
+                self._cond.notify_all()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    break
+
+            if len(self._targets) < self.low_water:
+                self._cond.notify_all()
+
+        if target is None:
+            target = get_random_profile()
+        if account is not None:
+            with self._cond:
+                recent = self._recently_given(account, now)
+                recent.append((now, target))
+                history: List[Tuple[float, str]] = list(recent)
+            try:
+                self._save_history(account, history)
+            except OSError as e:
+                print(f"Could not save search history for {account}: {e}")
+        return target
+
+
+_default_pool: Optional[TargetProfilePool] = None
+_default_pool_lock = threading.Lock()
+
+
+def default_pool() -> TargetProfilePool:
+    """
+    The process-wide pool used by `instagram.search`, sized for one session's searches
+    (TARGETS_PER_SESSION). CamoufoxBrowser.launch calls it when a session starts, so
+    the first refill runs while the browser is still starting.
+    """
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = TargetProfilePool()
+        return _default_pool
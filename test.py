@@ -1,12 +1,12 @@
-import asyncio
 import os
 import sys
 
 from util import print_filtered_traceback
-from vpn import disconnect_vpn
+from vpn import disconnect_vpn, run_sync
 # Ensure these imports are available in your environment
-from web import get_accounts, AccountStatus
+from web import iter_accounts, AccountStatus
 from camoufox_browser_manager import CamoufoxBrowser
+from runner import run_accounts
 from playwright.sync_api import Page
 from camoufox.sync_api import BrowserContext # Import BrowserContext
 
@@ -19,27 +19,16 @@ def my_playwright_activity(browser_instance: CamoufoxBrowser, ctx: BrowserContex
 
 def main():
     try:
-        accounts = get_accounts(status=AccountStatus.NOT_SETUP)
+        accounts = iter_accounts(status=AccountStatus.NOT_SETUP)
 
-        if not accounts:
+        summary = run_accounts(accounts, my_playwright_activity, group_by_region=True)
+
+        if not summary.results:
             print("No accounts found with status 'ready'.")
             return
+        summary.print_report()
 
-        print(f"Found {len(accounts)} accounts:")
-        print("=" * 40)
-
-        for i, profile_obj in enumerate(accounts):
-            print(f"--- Iteration {i + 1} of {len(accounts)} ---")
-            print(f"  Profile: {profile_obj.profile}")
-            print(f"    Password: {profile_obj.password}")
-            print(f"    Recovery: {profile_obj.recovery}")
-            print(f"    Code: {profile_obj.code}")
-
-            browser_manager = CamoufoxBrowser(profile_obj)
-            browser_manager.launch(my_playwright_activity)
-            print("-" * 30)
-
-        asyncio.run(disconnect_vpn())
+        run_sync(disconnect_vpn())
 
     except Exception as e:
         print(f"An error occurred: {e}")
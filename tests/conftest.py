@@ -0,0 +1,20 @@
+# conftest.py – shared fixtures; the modules under test live flat in the repository root
+import socket
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def closed_port() -> int:
+    """
+    A local port nothing listens on, so connecting to it is refused.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
@@ -0,0 +1,78 @@
+# test_asset_cache.py – CacheRoute's miss/store path, without a browser
+import asyncio
+from types import SimpleNamespace
+
+from asset_cache import _ROUTED_URLS, AssetCache, CacheRoute, is_candidate
+
+URL = "https://static.cdninstagram.com/rsrc/AbCdEf123456.js"
+HEADERS = {"content-type": "text/javascript", "cache-control": "max-age=31536000, immutable"}
+
+
+class _Route:
+    def __init__(self, url: str):
+        self.request = SimpleNamespace(url=url, method="GET")
+        self.outcome = None
+
+    def fallback(self):
+        self.outcome = "fallback"
+
+    def fulfill(self, status, headers, body):
+        self.outcome = ("fulfill", body)
+
+
+def _response(url: str, body: bytes = b"console.log(1)"):
+    return SimpleNamespace(url=url, status=200, request=SimpleNamespace(url=url, method="GET"),
+                           all_headers=lambda: dict(HEADERS), body=lambda: body)
+
+
+def test_miss_falls_back_then_the_response_fills_the_cache(tmp_path):
+    handler = CacheRoute(AssetCache(tmp_path))
+    route = _Route(URL)
+    handler.handle(route)
+    assert route.outcome == "fallback"
+    handler.on_response(_response(URL))
+
+    route = _Route(URL)
+    handler.handle(route)
+    assert route.outcome == ("fulfill", b"console.log(1)")
+    assert (handler.stats.misses, handler.stats.stored, handler.stats.hits) == (1, 1, 1)
+
+
+def test_a_failing_store_is_logged_not_raised(tmp_path, capsys):
+    cache = AssetCache(tmp_path)
+
+    def put(*args):
+        raise OSError("No space left on device")
+
+    cache.put = put
+    handler = CacheRoute(cache)
+    handler.handle(_Route(URL))
+    handler.on_response(_response(URL))
+    assert "No space left on device" in capsys.readouterr().out
+    assert handler.stats.stored == 0
+
+    async def body():
+        return b"x"
+
+    async def all_headers():
+        return dict(HEADERS)
+
+    handler.handle(_Route(URL))
+    response = SimpleNamespace(url=URL, status=200, request=SimpleNamespace(url=URL, method="GET"),
+                               all_headers=all_headers, body=body)
+    asyncio.run(handler.async_on_response(response))
+    assert handler.stats.stored == 0
+
+
+def test_the_route_regex_agrees_with_is_candidate():
+    urls = [
+        URL,
+        URL + "?_nc_x=1",
+        "https://static.cdninstagram.com/rsrc.php/v3/yB/r/AbCdEf123456.css",
+        "https://static.cdninstagram.com/rsrc.php/v3/short.js",
+        "http://static.cdninstagram.com/rsrc/AbCdEf123456.js",
+        "https://scontent.cdninstagram.com/v/AbCdEf123456.png",
+        "https://www.instagram.com/static/AbCdEf123456.js",
+    ]
+    for url in urls:
+        assert bool(_ROUTED_URLS.search(url)) == is_candidate(url), url
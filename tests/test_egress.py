@@ -0,0 +1,93 @@
+# test_egress.py – proxy parsing, per-profile proxy assignment and the SM_EGRESS selector
+import pytest
+
+import egress
+from camoufox_browser_manager import CamoufoxBrowser
+from egress import Egress, ProfileProxyEgress, Proxy, ProxyEgress, VpnEgress, egress_from_spec, load_proxy_file
+from profile import Profile
+
+
+def _profile(name: str = "acct", **proxy) -> Profile:
+    return Profile(profile=name, code="de-berlin", password="", recovery="", authenticator="", **proxy)
+
+
+class _Recording(Egress):
+    uses_vpn = True
+
+    def __init__(self):
+        self.connected = []
+
+    def connect(self, profile: Profile) -> None:
+        self.connected.append(profile.profile)
+
+    def proxy_for(self, profile: Profile):
+        return {"server": "http://fallback:1"}
+
+
+def test_proxy_from_line():
+    assert Proxy.from_line("1.2.3.4:8080\n") == Proxy("1.2.3.4", 8080)
+    proxy = Proxy.from_line("1.2.3.4:8080:user:secret")
+    assert proxy.key == "1.2.3.4:8080"
+    assert proxy.playwright() == {"server": "http://1.2.3.4:8080", "username": "user", "password": "secret"}
+    assert Proxy("1.2.3.4", 8080).playwright() == {"server": "http://1.2.3.4:8080"}
+    for bad in ("1.2.3.4", "1.2.3.4:8080:user"):
+        with pytest.raises(ValueError):
+            Proxy.from_line(bad)
+
+
+def test_load_proxy_file_skips_blanks_and_comments(tmp_path):
+    path = tmp_path / "proxies.txt"
+    path.write_text("# exits\n1.2.3.4:8080:u:p\n\n  5.6.7.8:3128  \n", encoding="utf-8")
+    assert load_proxy_file(path) == [Proxy("1.2.3.4", 8080, "u", "p"), Proxy("5.6.7.8", 3128)]
+
+
+def test_proxy_egress_assignment_is_stable_and_spread():
+    proxies = [Proxy(f"10.0.0.{i}", 8000) for i in range(4)]
+    names = [f"acct{i}" for i in range(40)]
+    first = {name: ProxyEgress(proxies).proxy_for(_profile(name)) for name in names}
+    # A new instance (e.g. after a restart) maps every profile to the same proxy.
+    assert first == {name: ProxyEgress(proxies).proxy_for(_profile(name)) for name in names}
+    assert len({p["server"] for p in first.values()}) == len(proxies)
+    with pytest.raises(ValueError):
+        ProxyEgress([])
+
+
+def test_profile_proxy_egress_prefers_the_accounts_own_proxy():
+    fallback = _Recording()
+    chooser = ProfileProxyEgress(fallback)
+    own = _profile("own", proxy_address="9.9.9.9", proxy_port="3128", proxy_username="u", proxy_password="p")
+    chooser.connect(own)
+    assert chooser.proxy_for(own) == {"server": "http://9.9.9.9:3128", "username": "u", "password": "p"}
+
+    bare = _profile("bare")
+    chooser.connect(bare)
+    assert chooser.proxy_for(bare) == {"server": "http://fallback:1"}
+    assert fallback.connected == ["bare"]
+    assert chooser.uses_vpn
+    assert isinstance(ProfileProxyEgress().fallback, VpnEgress)
+
+
+def test_camoufox_options_carry_the_egress_proxy(tmp_path):
+    proxy = Proxy("1.2.3.4", 8080, "u", "p")
+    options = CamoufoxBrowser(_profile(), ProxyEgress([proxy])).camoufox_options(None, tmp_path)
+    assert options["proxy"] == proxy.playwright()
+    assert options["user_data_dir"] == str(tmp_path)
+    assert "proxy" not in CamoufoxBrowser(_profile(), VpnEgress()).camoufox_options(None, tmp_path)
+
+
+def test_egress_from_spec(tmp_path, monkeypatch):
+    path = tmp_path / "proxies.txt"
+    path.write_text("1.2.3.4:8080\n", encoding="utf-8")
+    assert isinstance(egress_from_spec("vpn"), VpnEgress)
+    assert isinstance(egress_from_spec("profile"), ProfileProxyEgress)
+    chosen = egress_from_spec(f"proxy:{path}")
+    assert isinstance(chosen, ProxyEgress) and chosen.proxies == [Proxy("1.2.3.4", 8080)]
+    with pytest.raises(ValueError):
+        egress_from_spec("proxy")
+    with pytest.raises(ValueError):
+        egress_from_spec("socks:whatever")
+
+    monkeypatch.setattr(egress, "_default_egress", None)
+    monkeypatch.setenv("SM_EGRESS", f"proxy:{path}")
+    assert isinstance(egress.default_egress(), ProxyEgress)
+    assert egress.default_egress() is egress.default_egress()
@@ -0,0 +1,22 @@
+# test_metrics.py – the Prometheus endpoint
+import urllib.request
+
+import metrics
+
+
+def test_prometheus_endpoint_binds_loopback_by_default(monkeypatch):
+    monkeypatch.setattr(metrics, "_server", None)
+    monkeypatch.setenv(metrics.METRICS_PORT_ENV, "0")
+    monkeypatch.delenv(metrics.METRICS_HOST_ENV, raising=False)
+    metrics.serve_from_env()
+    server = metrics._server
+    try:
+        host, port = server.server_address
+        assert host == "127.0.0.1"
+        with metrics.span("test.phase"):
+            pass
+        body = urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5).read().decode()
+        assert 'sm_span_seconds_count{span="test.phase"}' in body
+    finally:
+        server.shutdown()
+        server.server_close()
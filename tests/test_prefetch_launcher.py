@@ -0,0 +1,53 @@
+# test_prefetch_launcher.py – staged sessions respect a pooled egress's load cap
+import threading
+
+import prefetch_launcher
+from egress import Proxy
+from prefetch_launcher import PrefetchingLauncher
+from profile import Profile
+from proxy_pool import PooledProxyEgress, ProxyPool
+
+
+class _FakeCamoufox:
+    """
+    Stands in for the Camoufox context manager; records the proxy each browser got.
+    """
+    launched = []
+
+    def __init__(self, **options):
+        self.options = options
+
+    def __enter__(self):
+        _FakeCamoufox.launched.append(self.options.get("proxy"))
+        page = type("Page", (), {"goto": lambda self, url: None})()
+        return type("Context", (), {"pages": [page]})()
+
+    def __exit__(self, *exc):
+        return False
+
+
+def test_prefetch_waits_for_a_slot_and_releases_it(tmp_path, monkeypatch):
+    monkeypatch.setattr(prefetch_launcher, "Camoufox", _FakeCamoufox)
+    monkeypatch.setattr(prefetch_launcher, "load_or_create_fp", lambda name: None)
+    monkeypatch.setattr(prefetch_launcher, "_paths", lambda name: (tmp_path / name, None))
+    monkeypatch.setattr(prefetch_launcher, "clone_template", lambda path: None)
+    monkeypatch.setattr(prefetch_launcher.CamoufoxBrowser, "routing_policy", None)
+    monkeypatch.setattr(prefetch_launcher.CamoufoxBrowser, "use_asset_cache", False)
+    _FakeCamoufox.launched = []
+
+    pool = ProxyPool([Proxy("10.0.0.1", 8000)], max_sessions=1, assignments_path=tmp_path / "a.json")
+    load = []
+    lock = threading.Lock()
+
+    def activity(browser, ctx, page):
+        with lock:
+            load.append(pool.metrics()["10.0.0.1:8000"].sessions)
+
+    accounts = [Profile(profile=f"acct{i}", code=None, password="", recovery="", authenticator="")
+                for i in range(3)]
+    summary = PrefetchingLauncher(activity, PooledProxyEgress(pool)).run(accounts)
+
+    assert [r.ok for r in summary.results] == [True, True, True]
+    assert load == [1, 1, 1]
+    assert _FakeCamoufox.launched == [{"server": "http://10.0.0.1:8000"}] * 3
+    assert pool.metrics()["10.0.0.1:8000"].sessions == 0
@@ -0,0 +1,44 @@
+# test_profile_template.py – seeding profiles from a template without sharing mutable files
+import os
+
+from profile_template import clone_template
+
+
+def _template(tmp_path):
+    template = tmp_path / "_template"
+    (template / "extensions").mkdir(parents=True)
+    (template / "startupCache").mkdir()
+    (template / "extensions" / "addon@example.xpi").write_bytes(b"xpi")
+    (template / "compatibility.ini").write_text("[Compatibility]\n")
+    (template / "startupCache" / "scriptCache.bin").write_bytes(b"cache")
+    (template / "cookies.sqlite").write_bytes(b"private")
+    return template
+
+
+def test_only_addons_are_hardlinked(tmp_path):
+    template = _template(tmp_path)
+    profile = tmp_path / "acct"
+    profile.mkdir()
+    assert clone_template(profile, template)
+    assert (profile / "extensions" / "addon@example.xpi").stat().st_nlink == 2
+    assert (profile / "compatibility.ini").stat().st_nlink == 1
+    assert (profile / "startupCache" / "scriptCache.bin").stat().st_nlink == 1
+    assert not (profile / "cookies.sqlite").exists()
+    assert not clone_template(profile, template)
+
+
+def test_old_profiles_are_unshared_once(tmp_path):
+    template = _template(tmp_path)
+    profile = tmp_path / "acct"
+    profile.mkdir()
+    # Seeded by an older version that hardlinked compatibility.ini too.
+    os.link(template / "compatibility.ini", profile / "compatibility.ini")
+    assert not clone_template(profile, template)
+    assert (profile / "compatibility.ini").stat().st_nlink == 1
+    assert (template / "compatibility.ini").stat().st_nlink == 1
+
+    # The pass runs once: a later launch doesn't scan the profile again.
+    (profile / "compatibility.ini").unlink()
+    os.link(template / "compatibility.ini", profile / "compatibility.ini")
+    assert not clone_template(profile, template)
+    assert (profile / "compatibility.ini").stat().st_nlink == 2
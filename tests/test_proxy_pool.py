@@ -0,0 +1,175 @@
+# test_proxy_pool.py – ProxyPool assignment and load cap, check_proxy against a local CONNECT stub
+import asyncio
+import base64
+import socketserver
+import threading
+from typing import List
+
+import pytest
+
+import proxy_pool
+from egress import Proxy, egress_from_spec
+from profile import Profile
+from proxy_pool import PooledProxyEgress, ProxyPool, check_proxy
+
+
+class _ConnectStub(socketserver.ThreadingTCPServer):
+    """
+    Answers every CONNECT with `status` (None: never answers) and keeps the request heads.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, status="200 Connection established"):
+        super().__init__(("127.0.0.1", 0), _ConnectHandler)
+        self.status = status
+        self.requests: List[List[str]] = []
+        self.closed = threading.Event()
+
+    @property
+    def proxy(self) -> Proxy:
+        return Proxy("127.0.0.1", self.server_address[1])
+
+
+class _ConnectHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        head = []
+        for line in self.rfile:
+            line = line.decode().rstrip("\r\n")
+            if not line:
+                break
+            head.append(line)
+        self.server.requests.append(head)
+        if self.server.status is None:
+            self.server.closed.wait(5)
+            return
+        self.wfile.write(f"HTTP/1.1 {self.server.status}\r\n\r\n".encode())
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(status="200 Connection established") -> _ConnectStub:
+        server = _ConnectStub(status)
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.closed.set()
+        server.shutdown()
+        server.server_close()
+
+
+def _pool(tmp_path, proxies, **kwargs) -> ProxyPool:
+    return ProxyPool(proxies, assignments_path=tmp_path / "assignments.json", **kwargs)
+
+
+def test_check_proxy_opens_a_tunnel_to_the_probe_host(stub):
+    server = stub()
+    proxy = Proxy("127.0.0.1", server.server_address[1], "user", "secret")
+    latency = asyncio.run(check_proxy(proxy, timeout=5))
+    assert latency >= 0
+    target = f"{proxy_pool.EGRESS_PROBE_HOST}:{proxy_pool.EGRESS_PROBE_PORT}"
+    head = server.requests[0]
+    assert head[0] == f"CONNECT {target} HTTP/1.1"
+    token = base64.b64encode(b"user:secret").decode()
+    assert f"Proxy-Authorization: Basic {token}" in head
+
+
+def test_check_proxy_rejects_a_refused_tunnel(stub):
+    server = stub("407 Proxy Authentication Required")
+    with pytest.raises(ConnectionError, match="407"):
+        asyncio.run(check_proxy(server.proxy, timeout=5))
+
+
+def test_check_proxy_times_out_on_a_silent_proxy(stub):
+    server = stub(None)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(check_proxy(server.proxy, timeout=0.3))
+
+
+def test_check_proxy_fails_when_nothing_listens(closed_port):
+    with pytest.raises(OSError):
+        asyncio.run(check_proxy(Proxy("127.0.0.1", closed_port), timeout=5))
+
+
+def test_assignment_is_sticky_and_spread(tmp_path):
+    proxies = [Proxy("10.0.0.1", 8000), Proxy("10.0.0.2", 8000)]
+    pool = _pool(tmp_path, proxies)
+    first, second = pool.proxy_for("alice"), pool.proxy_for("bob")
+    assert first != second
+    assert pool.proxy_for("alice") == first
+
+    # The assignment survives a restart.
+    reopened = _pool(tmp_path, reversed(proxies))
+    assert reopened.proxy_for("alice") == first
+    assert reopened.proxy_for("bob") == second
+
+
+def test_load_cap_makes_a_profile_wait_for_its_own_proxy(tmp_path):
+    proxies = [Proxy("10.0.0.1", 8000), Proxy("10.0.0.2", 8000)]
+    pool = _pool(tmp_path, proxies, max_sessions=1)
+    mine = pool.proxy_for("alice")
+    pool._assignments["carol"] = mine.key
+
+    assert pool.acquire("alice") == mine
+    # carol shares alice's proxy; the other one is free, but she doesn't borrow it.
+    assert pool.acquire("carol") is None
+    assert pool.metrics()[mine.key].sessions == 1
+
+    pool.release("alice")
+    assert pool.acquire("carol") == mine
+    pool.release("carol")
+    pool.release("carol")             # releasing twice is harmless
+    assert pool.metrics()[mine.key].sessions == 0
+
+
+def test_dead_proxy_is_evicted_and_its_profiles_move(tmp_path, stub, closed_port):
+    alive = stub().proxy
+    dead = Proxy("127.0.0.1", closed_port)
+    pool = _pool(tmp_path, [alive, dead], max_failures=2)
+    pool._assignments["alice"] = dead.key
+
+    assert pool.check_now(timeout=5) == 2           # one failure isn't enough to evict
+    assert pool.proxy_for("alice") == dead
+    assert pool.check_now(timeout=5) == 1
+    assert pool.alive() == [alive.key]
+    assert pool.proxy_for("alice") == alive
+
+    health = pool.metrics()
+    assert health[alive.key].success_rate == 1.0 and health[alive.key].p50 is not None
+    assert health[dead.key].consecutive_failures == 2 and not health[dead.key].alive
+
+
+def test_no_proxy_alive_means_no_assignment(tmp_path, closed_port):
+    pool = _pool(tmp_path, [Proxy("127.0.0.1", closed_port)], max_failures=1)
+    assert pool.check_now(timeout=5) == 0
+    assert pool.proxy_for("alice") is None
+    assert pool.acquire("alice") is None
+
+
+def test_pooled_egress_binds_and_releases_a_session_slot(tmp_path):
+    pool = _pool(tmp_path, [Proxy("10.0.0.1", 8000)], max_sessions=1)
+    chooser = PooledProxyEgress(pool)
+    alice = Profile(profile="alice", code="de", password="", recovery="", authenticator="")
+
+    session = chooser.bind(alice)
+    assert session.proxy_for(alice) == {"server": "http://10.0.0.1:8000"}
+    assert chooser.bind(alice) is None              # at the load cap
+    chooser.release(alice)
+    assert chooser.bind(alice) is not None
+
+
+def test_pool_spec_builds_a_health_checked_pool(tmp_path, stub, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / "proxies.txt"
+    path.write_text(f"127.0.0.1:{stub().server_address[1]}\n", encoding="utf-8")
+    chooser = egress_from_spec(f"pool:{path}")
+    try:
+        assert isinstance(chooser, PooledProxyEgress)
+        assert not chooser.uses_vpn
+    finally:
+        chooser.pool.stop_health_checks()
@@ -0,0 +1,100 @@
+# test_resource_policy.py – what PolicyRouter routes, and the traffic it counts
+import asyncio
+from types import SimpleNamespace
+
+import resource_policy
+from resource_policy import FULL, LEAN, PASSIVE, async_using, install, using, with_policy
+
+IMAGE = "https://scontent-ams2-1.cdninstagram.com/v/t51/abc.jpg?stp=1"
+SCRIPT = "https://static.cdninstagram.com/rsrc.php/v3/AbCdEf123456.js"
+BEACON = "https://www.instagram.com/api/v1/web/log/"
+
+
+class _Context:
+    def __init__(self):
+        self.routes = []
+        self.listeners = {}
+
+    def route(self, url, handler):
+        self.routes.append((url, handler))
+
+    def unroute(self, url, handler):
+        self.routes.remove((url, handler))
+
+    def on(self, event, handler):
+        self.listeners[event] = handler
+
+
+class _AsyncContext(_Context):
+    async def route(self, url, handler):
+        super().route(url, handler)
+
+    async def unroute(self, url, handler):
+        super().unroute(url, handler)
+
+
+class _Request:
+    # Playwright request objects are hashable and weakly referenceable; SimpleNamespace isn't.
+    def __init__(self, url: str, resource_type: str):
+        self.url = url
+        self.resource_type = resource_type
+
+
+def _routed(ctx, url: str) -> bool:
+    return any(pattern.search(url) for pattern, _ in ctx.routes)
+
+
+def test_policies_route_only_what_they_act_on():
+    assert FULL.url_pattern is None
+    assert PASSIVE.url_pattern.search(IMAGE) and PASSIVE.url_pattern.search(BEACON)
+    assert not PASSIVE.url_pattern.search(SCRIPT)
+    assert not PASSIVE.url_pattern.search("https://www.instagram.com/api/graphql")
+    assert LEAN.url_pattern.search("https://static.cdninstagram.com/fonts/Inter.woff2")
+
+
+def test_using_routes_for_the_block_only():
+    ctx = _Context()
+    page = SimpleNamespace(context=ctx)
+    router = install(ctx, FULL)
+    assert ctx.routes == [] and "response" in ctx.listeners
+    with using(page, PASSIVE) as active:
+        assert active is router and router.policy is PASSIVE
+        assert _routed(ctx, IMAGE) and not _routed(ctx, SCRIPT)
+    assert ctx.routes == [] and router.policy is FULL
+
+
+def test_with_policy_attaches_a_router_when_the_session_has_none():
+    ctx = _Context()
+    seen = []
+
+    @with_policy(PASSIVE)
+    def scroll(page):
+        seen.append(_routed(ctx, IMAGE))
+
+    scroll(SimpleNamespace(context=ctx))
+    assert seen == [True] and ctx.routes == []
+    assert resource_policy._routers[ctx].policy is FULL
+
+
+def test_async_using():
+    ctx = _AsyncContext()
+
+    async def main():
+        async with async_using(SimpleNamespace(context=ctx), LEAN) as router:
+            assert router.policy is LEAN and _routed(ctx, IMAGE)
+        assert ctx.routes == []
+
+    asyncio.run(main())
+
+
+def test_stubbed_responses_are_not_counted_as_traffic():
+    ctx = _Context()
+    router = install(ctx, PASSIVE)
+    request = _Request(IMAGE, "image")
+    fulfilled = []
+    route = SimpleNamespace(request=request, fulfill=lambda **kw: fulfilled.append(kw))
+    router.handle(route)
+    assert fulfilled and fulfilled[0]["content_type"] == "image/gif"
+    router.on_response(SimpleNamespace(request=request, status=200, headers={"content-length": "43"}))
+    assert router.traffic.by_type["image"].stubbed == 1
+    assert router.traffic.bytes == 0
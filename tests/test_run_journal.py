@@ -0,0 +1,21 @@
+# test_run_journal.py – resuming a run and reporting what is left
+from run_journal import RunJournal
+
+
+def test_resumed_run_skips_done_profiles_and_reports_counts(tmp_path):
+    path = tmp_path / "journal.sqlite3"
+    journal = RunJournal("run", path=path, max_attempts=1)
+    assert journal.describe() == "no profiles"
+    for name in ("alice", "bob"):
+        journal.start(name)
+    journal.finish("alice", ok=True)
+    journal.finish("bob", ok=False, error="boom")
+    journal.close()                          # killed before the run finished
+
+    resumed = RunJournal("run", path=path, max_attempts=1)
+    try:
+        assert resumed.resumed
+        assert resumed.admit("alice") is None and resumed.admit("bob") is None
+        assert resumed.describe() == "1 done, 1 failed"
+    finally:
+        resumed.close(finished=True)
@@ -0,0 +1,73 @@
+# test_scrape_sink.py – the dedup index and when a record's key is committed to it
+import threading
+import time
+
+from scrape_sink import _INDEX_HEADER, _INDEX_MAGIC_V1, _SET_BITS, _SET_BITS_OFFSET, ScrapeSink, SeenIndex, iter_records
+
+
+def _post(i: int) -> dict:
+    return {"kind": "post", "id": str(i), "code": f"c{i}"}
+
+
+def _wait_written(sink: ScrapeSink, count: int) -> None:
+    deadline = time.monotonic() + 5
+    while sink.stats.written + sink.stats.duplicates < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_keys_reach_the_index_only_after_fsync(tmp_path):
+    sink = ScrapeSink(tmp_path, fsync_interval=60)
+    for i in range(3):
+        sink.put(_post(i))
+    sink.put(_post(1))
+    _wait_written(sink, 4)
+    assert (sink.stats.written, sink.stats.duplicates) == (3, 1)
+    # Not on disk yet: a crash now must not leave these marked as scraped.
+    index = SeenIndex(tmp_path / "seen.bloom")
+    assert "post:0" not in index
+    sink.close()
+    assert all(f"post:{i}" in index for i in range(3))
+    index.close()
+    assert sorted(r["id"] for r in iter_records(tmp_path)) == ["0", "1", "2"]
+
+    with ScrapeSink(tmp_path) as again:
+        again.put(_post(2))
+        again.put(_post(3))
+    assert (again.stats.written, again.stats.duplicates) == (1, 1)
+
+
+def test_concurrent_adds_see_each_key_as_new_once(tmp_path):
+    index = SeenIndex(tmp_path / "seen.bloom", capacity=10000)
+    keys = [f"post:{i}" for i in range(500)]
+    new = []
+
+    def add_all():
+        new.append(sum(index.add(key) for key in keys))
+
+    threads = [threading.Thread(target=add_all) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sum(new) == len(keys)
+    index.close()
+
+
+def test_fill_ratio_is_counted_incrementally_and_upgraded(tmp_path):
+    path = tmp_path / "seen.bloom"
+    index = SeenIndex(path, capacity=1000)
+    index.add_many(f"profile:{i}" for i in range(100))
+
+    def popcount() -> int:
+        return int.from_bytes(index._mm[_INDEX_HEADER.size:], "little").bit_count()
+
+    assert index.fill_ratio() == popcount() / index.bits > 0
+    expected = index.fill_ratio()
+    # An index from before the count existed gets it on open.
+    index._mm[:8] = _INDEX_MAGIC_V1
+    _SET_BITS.pack_into(index._mm, _SET_BITS_OFFSET, 0)
+    index.close()
+    reopened = SeenIndex(path)
+    assert reopened.fill_ratio() == expected
+    assert "profile:5" in reopened
+    reopened.close()
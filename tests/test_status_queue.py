@@ -0,0 +1,35 @@
+# test_status_queue.py – StatusUpdateQueue journaling, coalescing and backoff
+import time
+
+import status_queue
+from status_queue import StatusUpdateQueue
+from web import AccountStatus
+
+
+def test_failing_sends_back_off_and_survive_a_restart(tmp_path, monkeypatch):
+    calls = []
+    failing = True
+
+    def call(endpoint, body):
+        calls.append(body)
+        if failing:
+            raise RuntimeError("backend down")
+        return {}
+
+    monkeypatch.setattr(status_queue, "json_web_call", call)
+    monkeypatch.setattr(status_queue, "print_filtered_traceback", lambda: None)
+    journal = tmp_path / "status.jsonl"
+
+    queue = StatusUpdateQueue(journal, flush_interval=0.1, batch_size=1)
+    queue.put("alice", AccountStatus.WARMING)
+    queue.put("alice", AccountStatus.READY)          # coalesced: only the last one is sent
+    time.sleep(1.0)
+    # Rounds 0.1, 0.2 and 0.4 s apart, not a tight loop on the full batch.
+    assert 1 <= len(calls) <= 5
+    queue.close()
+
+    failing = False
+    with StatusUpdateQueue(journal, flush_interval=0.1) as replayed:
+        replayed.flush()
+    assert calls[-1] == {"profile": "alice", "status": "ready"}
+    assert journal.read_text(encoding="utf-8") == ""
@@ -0,0 +1,46 @@
+# test_target_pool.py – TargetProfilePool refills and per-account repeat history
+import itertools
+import time
+
+import pytest
+
+import profile_store
+import target_pool
+from target_pool import TargetProfilePool
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    """
+    Serves fresh target names (t0, t1, ...) and counts the direct fallback calls.
+    """
+    monkeypatch.setattr(profile_store, "_BASE", tmp_path)
+    names = (f"t{i}" for i in itertools.count())
+    direct = []
+    monkeypatch.setattr(target_pool, "get_random_profiles", lambda count: [next(names) for _ in range(count)])
+    monkeypatch.setattr(target_pool, "get_random_profile", lambda: direct.append(1) or "direct")
+    return direct
+
+
+def test_take_does_not_repeat_and_refills_past_seen_targets(backend):
+    pool = TargetProfilePool(batch_size=2)
+    try:
+        # A previous session already saw everything the pool is about to buffer.
+        pool._save_history("acct", [(time.time(), f"t{i}") for i in range(4)])
+        started = time.monotonic()
+        first = pool.take("acct", timeout=3)
+        second = pool.take("acct", timeout=3)
+        assert time.monotonic() - started < 1
+        assert not backend
+        assert first != second and not {first, second} & {"t0", "t1", "t2", "t3"}
+        # Targets every active account has seen are dropped from the buffer.
+        assert not {"t0", "t1", "t2", "t3"} & set(pool._targets)
+    finally:
+        pool.close()
+
+
+def test_history_carries_over_to_a_new_pool(backend):
+    pool = TargetProfilePool(batch_size=1)
+    given = pool.take("acct", timeout=3)
+    pool.close()
+    assert given in {target for _, target in pool._load_history("acct")}
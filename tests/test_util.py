@@ -0,0 +1,38 @@
+# test_util.py – the typing schedule and how it is grouped into bursts
+import random
+
+import pytest
+
+from util import _LEFT_HAND, _bursts, typing_schedule
+
+
+@pytest.mark.parametrize("text", ["correcthorsebatterystaple", "Passw0rd!2024", "sweaters are great"])
+def test_bursts_replay_the_schedule(text):
+    random.seed(7)
+    plan = typing_schedule(text)
+    bursts = _bursts(plan)
+    assert "".join(keys for keys, _, _ in bursts) == text
+    assert len(bursts) < len(text)
+    # Averaging inside a burst keeps the planned typing time.
+    planned = sum(delay for _, delay in plan)
+    played = sum(pause + per_key * (len(keys) - 1) for keys, pause, per_key in bursts)
+    assert played == pytest.approx(planned)
+    for keys, _, _ in bursts:
+        assert len({k in _LEFT_HAND for k in keys.lower()}) == 1
+        assert " " not in keys[:-1]
+
+
+def test_typos_are_opt_in():
+    random.seed(7)
+    assert [key for key, _ in typing_schedule("secret123")] == list("secret123")
+    plan = typing_schedule("secret123", error_rate=1.0)
+    typed = []
+    for key, _ in plan:
+        if key == "Backspace":
+            typed.pop()
+        else:
+            typed.append(key)
+    assert "".join(typed) == "secret123"
+    assert [key for key, _ in plan].count("Backspace") == len("secret123")
+    bursts = _bursts(plan)
+    assert all(keys == "Backspace" or "Backspace" not in keys for keys, _, _ in bursts)
@@ -0,0 +1,129 @@
+# test_vpn.py – VpnStateWatcher and connect_and_verify against benchmark/fake_piactl.py
+import asyncio
+import functools
+import json
+import socket
+import sys
+from pathlib import Path
+
+import pytest
+
+import vpn
+from profile import Profile
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="the piactl stand-in is a shell script")
+
+FAKE_PIACTL = Path(vpn.__file__).parent / "benchmark" / "fake_piactl.py"
+
+
+@pytest.fixture
+def piactl(tmp_path, monkeypatch):
+    """
+    Points vpn.py at the fake piactl; returns the path of its JSON state file.
+    """
+    state = tmp_path / "piactl_state.json"
+    script = tmp_path / "piactl"
+    script.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{FAKE_PIACTL}" "$@"\n')
+    script.chmod(0o755)
+    monkeypatch.setattr(vpn, "VPN_PATH", str(script))
+    monkeypatch.setenv("FAKE_PIACTL_STATE", str(state))
+    monkeypatch.setenv("FAKE_PIACTL_DELAY", "0.2")
+    return state
+
+
+@pytest.fixture
+def egress(monkeypatch):
+    """
+    A local listener standing in for the egress probe host.
+    """
+    with socket.socket() as listener:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(16)
+        monkeypatch.setattr(vpn, "EGRESS_PROBE_HOST", "127.0.0.1")
+        monkeypatch.setattr(vpn, "EGRESS_PROBE_PORT", listener.getsockname()[1])
+        monkeypatch.setattr(vpn, "EGRESS_PROBE_TLS", False)
+        yield
+
+
+def _write_state(path, **state) -> None:
+    current = json.loads(path.read_text()) if path.exists() else {
+        "connectionstate": "Disconnected", "region": "auto", "connects": 0}
+    current.update(state)
+    path.write_text(json.dumps(current))
+
+
+def _profile(code: str) -> Profile:
+    return Profile(profile="acct", code=code, password="", recovery="", authenticator="")
+
+
+def test_watcher_follows_state_changes(piactl):
+    async def main():
+        watcher = vpn.VpnStateWatcher()
+        await watcher.start()
+        try:
+            assert await watcher.wait_for("Disconnected", 5)
+            assert not await watcher.wait_for("Connected", 0.3)
+            _write_state(piactl, connectionstate="Connected")
+            assert await watcher.wait_for("Connected", 5)
+            assert watcher.state == "Connected"
+        finally:
+            await watcher.stop()
+        assert not watcher.alive
+
+    asyncio.run(main())
+
+
+def test_watcher_wakes_waiters_when_the_monitor_dies(piactl):
+    async def main():
+        watcher = vpn.VpnStateWatcher()
+        await watcher.start()
+        assert await watcher.wait_for("Disconnected", 5)
+        waiter = asyncio.create_task(watcher.wait_for("Connected", 30))
+        await asyncio.sleep(0.1)
+        watcher._process.kill()
+        assert await asyncio.wait_for(waiter, 5) is False
+        assert not watcher.alive
+        await watcher.stop()
+
+    asyncio.run(main())
+
+
+def test_connect_and_verify_connects_and_reuses_the_tunnel(piactl, egress):
+    before = vpn.get_vpn_stats()
+    vpn.run_sync(vpn.connect_and_verify(_profile("de-berlin")))
+    state = json.loads(piactl.read_text())
+    assert state["connectionstate"] == "Connected"
+    assert state["region"] == "de-berlin"
+    assert state["connects"] == 1
+
+    # Same region again: the tunnel is left up.
+    vpn.run_sync(vpn.connect_and_verify(_profile("de-berlin")))
+    assert json.loads(piactl.read_text())["connects"] == 1
+
+    # Another region: disconnect, switch and connect again.
+    vpn.run_sync(vpn.connect_and_verify(_profile("us-texas")))
+    state = json.loads(piactl.read_text())
+    assert (state["region"], state["connects"]) == ("us-texas", 2)
+
+    after = vpn.get_vpn_stats()
+    assert after.connects - before.connects == 2
+    assert after.reconnects_skipped - before.reconnects_skipped == 1
+
+
+def test_connect_and_verify_fails_when_egress_is_unreachable(piactl, monkeypatch, closed_port):
+    monkeypatch.setattr(vpn, "EGRESS_PROBE_HOST", "127.0.0.1")
+    monkeypatch.setattr(vpn, "EGRESS_PROBE_PORT", closed_port)
+    monkeypatch.setattr(vpn, "EGRESS_PROBE_TLS", False)
+    monkeypatch.setattr(vpn, "_wait_for_egress", functools.partial(vpn._wait_for_egress, timeout_seconds=1))
+    with pytest.raises(Exception, match="not reachable"):
+        vpn.run_sync(vpn.connect_and_verify(_profile("de-berlin")))
+    assert json.loads(piactl.read_text())["connectionstate"] == "Connected"
+
+
+def test_wait_falls_back_to_polling_without_a_monitor(piactl, monkeypatch):
+    async def no_watcher():
+        return None
+
+    monkeypatch.setattr(vpn, "_get_watcher", no_watcher)
+    _write_state(piactl, connectionstate="Connected")
+    assert asyncio.run(vpn._wait_for_connection_state("Connected", 5))
@@ -0,0 +1,151 @@
+# test_web.py – json_web_call retry and idempotency rules against a local HTTP server
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+import pytest
+import requests
+
+import web
+
+DROP = "drop"                     # close the connection without answering
+
+
+class _Backend(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, script: List):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.script = list(script)    # one status (or DROP) per request; the last one repeats
+        self.hits: List[str] = []
+        self.lock = threading.Lock()
+
+    def next_answer(self, path: str):
+        with self.lock:
+            self.hits.append(path)
+            return self.script.pop(0) if len(self.script) > 1 else self.script[0]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        answer = self.server.next_answer(self.path)
+        if answer == DROP:
+            self.close_connection = True
+            self.connection.shutdown(2)
+            return
+        body = json.dumps({"status": answer}).encode()
+        self.send_response(answer)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    servers = []
+
+    def start(*script) -> _Backend:
+        server = _Backend(script)
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        servers.append(server)
+        monkeypatch.setattr(web, "BASE_URL", f"http://127.0.0.1:{server.server_port}/")
+        return server
+
+    monkeypatch.setattr(web, "BACKOFF_BASE", 0.0)
+    web.reset_call_stats()
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_success_is_not_retried(backend):
+    server = backend(200)
+    assert web.json_web_call("change_status.php", {"a": 1}) == {"status": 200}
+    assert server.hits == ["/change_status.php"]
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_not_processed_statuses_are_retried_for_any_endpoint(backend, status):
+    server = backend(status, status, 200)
+    assert web.json_web_call("change_status.php", {}) == {"status": 200}
+    assert len(server.hits) == 3
+    assert web.get_call_stats()["change_status.php"].retries == 2
+
+
+@pytest.mark.parametrize("status", [502, 504])
+def test_gateway_errors_are_retried_only_when_idempotent(backend, status):
+    server = backend(status, 200)
+    assert web.json_web_call("accounts.php", {}) == {"status": 200}
+    assert len(server.hits) == 2
+
+    server = backend(status, 200)
+    with pytest.raises(RuntimeError, match=str(status)):
+        web.json_web_call("change_status.php", {})
+    assert len(server.hits) == 1
+
+
+def test_idempotent_override(backend):
+    server = backend(502, 200)
+    assert web.json_web_call("change_status.php", {}, idempotent=True) == {"status": 200}
+    assert len(server.hits) == 2
+
+    server = backend(502, 200)
+    with pytest.raises(RuntimeError):
+        web.json_web_call("accounts.php", {}, idempotent=False)
+    assert len(server.hits) == 1
+
+
+def test_client_errors_are_not_retried(backend):
+    server = backend(400, 200)
+    with pytest.raises(RuntimeError, match="400"):
+        web.json_web_call("accounts.php", {})
+    assert len(server.hits) == 1
+    assert web.get_call_stats()["accounts.php"].errors == 1
+
+
+def test_gives_up_after_tries(backend):
+    server = backend(503)
+    with pytest.raises(RuntimeError, match="503"):
+        web.json_web_call("accounts.php", {}, tries=3)
+    assert len(server.hits) == 3
+
+
+def test_dropped_connection_is_retried_only_when_idempotent(backend):
+    server = backend(DROP, 200)
+    assert web.json_web_call("accounts.php", {}) == {"status": 200}
+    assert len(server.hits) == 2
+
+    # The request reached the server, so repeating a non-idempotent call could apply it twice.
+    server = backend(DROP, 200)
+    with pytest.raises(requests.ConnectionError):
+        web.json_web_call("change_status.php", {})
+    assert len(server.hits) == 1
+
+
+def test_refused_connection_is_retried_for_any_endpoint(monkeypatch, closed_port):
+    monkeypatch.setattr(web, "BASE_URL", f"http://127.0.0.1:{closed_port}/")
+    monkeypatch.setattr(web, "BACKOFF_BASE", 0.0)
+    web.reset_call_stats()
+    with pytest.raises(requests.ConnectionError) as excinfo:
+        web.json_web_call("change_status.php", {}, tries=3)
+    assert web._never_sent(excinfo.value)
+    assert web.get_call_stats()["change_status.php"].retries == 2
+
+
+def test_async_variant_follows_the_same_rules(backend):
+    server = backend(503, 200)
+    assert asyncio.run(web.async_json_web_call("change_status.php", {})) == {"status": 200}
+    assert len(server.hits) == 2
+
+    server = backend(502, 200)
+    with pytest.raises(RuntimeError):
+        asyncio.run(web.async_json_web_call("change_status.php", {}))
+    assert len(server.hits) == 1
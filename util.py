@@ -1,10 +1,12 @@
 import sys
 import traceback
 import os
-import time
 import random
 
 from playwright.sync_api import Page
+from playwright.async_api import Page as AsyncPage
+
+import pacing
 
 # Define paths that are considered "library" paths
 # Using sys.base_prefix and sys.exec_prefix for better robustness with virtual environments
@@ -82,23 +84,167 @@ def wait(min_seconds: float, max_seconds: float) -> None:
         max_seconds: The maximum number of seconds to wait.
     """
     delay = random.uniform(min_seconds, max_seconds)
-    time.sleep(delay)
+    pacing.sleep(delay)
+
+async def async_wait(min_seconds: float, max_seconds: float) -> None:
+    """
+    Async counterpart of `wait`: yields to the event loop for a random number of
+    seconds between min_seconds and max_seconds, so other sessions keep running.
+
+    Args:
+        min_seconds: The minimum number of seconds to wait.
+        max_seconds: The maximum number of seconds to wait.
+    """
+    delay = random.uniform(min_seconds, max_seconds)
+    await pacing.async_sleep(delay)
+
+# Keyboard layout used to pick realistic typos and hand alternation for the typing schedule.
+_QWERTY_ROWS = ("1234567890", "qwertyuiop", "asdfghjkl", "zxcvbnm")
+_LEFT_HAND = set("12345qwertasdfgzxcvb")
+_SHIFTED = set('~!@#$%^&*()_+{}|:"<>?')
+
+# Keys after which the next key gets a hesitation of its own (see _key_delay).
+_WORD_BREAKS = set(" .,@_-")
+
+
+def _neighbour_key(char: str) -> str | None:
+    lower = char.lower()
+    for row in _QWERTY_ROWS:
+        i = row.find(lower)
+        if i != -1:
+            options = row[max(0, i - 1):i] + row[i + 1:i + 2]
+            typo = random.choice(options) if options else None
+            return typo.upper() if typo and char.isupper() else typo
+    return None
+
+
+def _key_delay(prev: str | None, char: str, min_delay: float, max_delay: float) -> float:
+    """
+    Delay before typing `char` after `prev`, shaped by the digraph: alternating hands
+    is quick, repeating a key or reaching for Shift is slower, and a new word starts
+    after a short hesitation.
+    """
+    delay = random.uniform(min_delay, max_delay)
+    if prev is None:
+        return delay
+    if prev == char:
+        delay *= 1.15
+    elif (prev.lower() in _LEFT_HAND) != (char.lower() in _LEFT_HAND):
+        delay *= 0.8
+    if char.isupper() or char in _SHIFTED:
+        delay *= 1.3
+    if prev in _WORD_BREAKS:
+        delay *= 1.25
+    return delay
+
+
+def typing_schedule(text: str, min_delay: float = 0.05, max_delay: float = 0.2,
+                    error_rate: float = 0.0) -> list[tuple[str, float]]:
+    """
+    Precomputes a human-looking keystroke plan for `text`.
+
+    Returns:
+        A list of (key, delay) pairs, where delay is the pause in seconds before the key.
+        Occasional typos (a neighbouring key) are followed by "Backspace" and the right key.
+    """
+    plan: list[tuple[str, float]] = []
+    prev = None
+    for char in text:
+        if error_rate and char.isalnum() and random.random() < error_rate:
+            typo = _neighbour_key(char)
+            if typo:
+                plan.append((typo, _key_delay(prev, typo, min_delay, max_delay)))
+                # Noticing the mistake takes a moment longer than a normal keystroke.
+                plan.append(("Backspace", random.uniform(2 * min_delay, 2 * max_delay)))
+                prev = None
+        plan.append((char, _key_delay(prev, char, min_delay, max_delay)))
+        prev = char
+    return plan
+
+
+def _joins_burst(prev: str, char: str) -> bool:
+    """
+    True if `char` can follow `prev` in the same burst: a same-hand run inside a word
+    without Shift, where _key_delay shapes every delay alike.
+    """
+    if char == "Backspace" or prev == "Backspace" or prev in _WORD_BREAKS:
+        return False
+    if char.isupper() or char in _SHIFTED or prev == char:
+        return False
+    return (prev.lower() in _LEFT_HAND) == (char.lower() in _LEFT_HAND)
+
+
+def _bursts(plan: list[tuple[str, float]]) -> list[tuple[str, float, float]]:
+    """
+    Groups a typing schedule into (keys, pause_before, per_key_delay) bursts, each sent
+    in one round trip. A burst is a same-hand run of keys inside a word (see
+    `_joins_burst`); its keys after the first share the mean of their delays, so the
+    run takes as long as planned. Hand changes, word starts, Shift, repeated keys and
+    corrections keep their own delay.
+    """
+    bursts: list[tuple[str, float, float]] = []
+    i = 0
+    while i < len(plan):
+        key, pause = plan[i]
+        keys, delays = [key], []
+        i += 1
+        while i < len(plan) and _joins_burst(keys[-1], plan[i][0]):
+            keys.append(plan[i][0])
+            delays.append(plan[i][1])
+            i += 1
+        if key == "Backspace":
+            bursts.append((key, pause, 0.0))
+        else:
+            bursts.append(("".join(keys), pause, sum(delays) / len(delays) if delays else 0.0))
+    return bursts
+
 
 # Helper function for human-like typing
-def human_type(page: Page, selector: str, text: str, min_delay: float = 0.05, max_delay: float = 0.2) -> None:
+def human_type(page: Page, selector: str, text: str, min_delay: float = 0.05, max_delay: float = 0.2,
+               error_rate: float = 0.0) -> None:
     """
     Types text into a selector with a human-like delay between characters.
 
+    The element is focused once, then the precomputed schedule (see `typing_schedule`)
+    is played back in bursts: same-hand runs inside a word go out in one
+    `keyboard.type` call, everything else as a single key press.
+
     Args:
         page: The Playwright page object.
         selector: The CSS selector of the input field.
         text: The text to type.
         min_delay: Minimum delay between key presses in seconds.
         max_delay: Maximum delay between key presses in seconds.
+        error_rate: Chance per character of a corrected typo. Off by default; only use
+                    it where a typo can't matter (e.g. a search box, never a password).
     """
-    #print(f"Human-typing into '{selector}'...")
-    for char in text:
-        # Ensure you are using page.press() here, not page.type()
-        page.press(selector, char)
-        wait(min_delay, max_delay)
-    #print(f"Finished typing into '{selector}'.")
+    page.focus(selector)
+    for keys, pause, per_key_delay in _bursts(typing_schedule(text, min_delay, max_delay, error_rate)):
+        pacing.sleep(pause)
+        if keys == "Backspace" or len(keys) == 1:
+            page.keyboard.press(keys)
+        else:
+            # keyboard.type sends real keydown/keypress/keyup per character, like page.press().
+            page.keyboard.type(keys, delay=pacing.browser_delay_ms(per_key_delay, len(keys)))
+
+
+async def async_human_type(page: AsyncPage, selector: str, text: str, min_delay: float = 0.05,
+                           max_delay: float = 0.2, error_rate: float = 0.0) -> None:
+    """
+    Async counterpart of `human_type` for pages from `playwright.async_api`.
+
+    Args:
+        page: The async Playwright page object.
+        selector: The CSS selector of the input field.
+        text: The text to type.
+        min_delay: Minimum delay between key presses in seconds.
+        max_delay: Maximum delay between key presses in seconds.
+        error_rate: Chance per character of a corrected typo (off by default).
+    """
+    await page.focus(selector)
+    for keys, pause, per_key_delay in _bursts(typing_schedule(text, min_delay, max_delay, error_rate)):
+        await pacing.async_sleep(pause)
+        if keys == "Backspace" or len(keys) == 1:
+            await page.keyboard.press(keys)
+        else:
+            await page.keyboard.type(keys, delay=pacing.browser_delay_ms(per_key_delay, len(keys)))
@@ -1,14 +1,49 @@
 import asyncio
+import os
 import subprocess
 import sys
 import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Any, Awaitable, Iterable, Iterator, List, Optional
 
+import metrics
 # Assuming Profile dataclass is available from a file named 'profile.py'
 from profile import Profile
 
 # Define the path to the Private Internet Access command-line tool.
-# Please ensure this path is correct for your installation.
-VPN_PATH = 'C:\\Program Files\\Private Internet Access\\piactl.exe'
+# Please ensure this path is correct for your installation (PIACTL_PATH overrides it,
+# e.g. to point at a stand-in script for testing).
+VPN_PATH = os.environ.get('PIACTL_PATH', 'C:\\Program Files\\Private Internet Access\\piactl.exe')
+
+# Host reached through the tunnel to confirm traffic actually flows after connecting.
+EGRESS_PROBE_HOST = os.environ.get('VPN_EGRESS_PROBE_HOST', 'www.instagram.com')
+EGRESS_PROBE_PORT = int(os.environ.get('VPN_EGRESS_PROBE_PORT', '443'))
+# Plain TCP is enough for a local stand-in (see benchmark/); the real probe uses TLS.
+EGRESS_PROBE_TLS = os.environ.get('VPN_EGRESS_PROBE_TLS', '1') != '0'
+
+
+@dataclass
+class VpnStats:
+    """
+    How often connect_and_verify really reconnected, and how often it found the
+    tunnel already up in the right region.
+    """
+    connects: int = 0
+    reconnects_skipped: int = 0
+
+_stats = VpnStats()
+
+def get_vpn_stats() -> VpnStats:
+    return replace(_stats)
+
+def _creation_flags() -> int:
+    if sys.platform == "win32":
+        # Use subprocess.CREATE_NO_WINDOW to prevent a console window from appearing
+        # when piactl.exe is executed on Windows.
+        return subprocess.CREATE_NO_WINDOW
+    return 0
 
 async def _run_piactl_command(args: list[str]) -> tuple[str, str]:
     """
@@ -28,11 +63,7 @@ async def _run_piactl_command(args: list[str]) -> tuple[str, str]:
         Exception: If the piactl command exits with a non-zero status code or
                    an unexpected error occurs during execution.
     """
-    creation_flags = 0
-    if sys.platform == "win32":
-        # Use subprocess.CREATE_NO_WINDOW to prevent a console window from appearing
-        # when piactl.exe is executed on Windows.
-        creation_flags = subprocess.CREATE_NO_WINDOW
+    creation_flags = _creation_flags()
 
     try:
         # Create a subprocess to run the piactl command.
@@ -87,10 +118,138 @@ async def _get_connection_state() -> str:
         print(f"Warning: Could not retrieve VPN connection state: {e}")
         return "Unknown"
 
+class VpnStateWatcher:
+    """
+    Follows the VPN connection state through one long-lived
+    'piactl monitor connectionstate' process, which prints the current state and then
+    every change as it happens. Waiters are woken the moment the state changes,
+    instead of polling 'piactl get connectionstate' every few seconds.
+    """
+
+    def __init__(self):
+        self.state: Optional[str] = None
+        self._changed = asyncio.Condition()
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._reader: Optional[asyncio.Task] = None
+        self._eof = False
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and not self._eof and self._process.returncode is None
+
+    async def start(self) -> None:
+        self._process = await asyncio.create_subprocess_exec(
+            VPN_PATH,
+            "monitor",
+            "connectionstate",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            creationflags=_creation_flags(),
+        )
+        self._reader = asyncio.create_task(self._read_states())
+
+    async def _read_states(self) -> None:
+        async for line in self._process.stdout:
+            state = line.decode(errors='ignore').strip()
+            if state:
+                async with self._changed:
+                    self.state = state
+                    self._changed.notify_all()
+        # The monitor exited; wake everyone so they can fall back to polling.
+        async with self._changed:
+            self._eof = True
+            self._changed.notify_all()
+
+    async def wait_for(self, target_state: str, timeout_seconds: float) -> bool:
+        """
+        Returns True as soon as the state is `target_state`, False on timeout or if
+        the monitor process dies.
+        """
+        async def reached() -> bool:
+            async with self._changed:
+                await self._changed.wait_for(lambda: self.state == target_state or not self.alive)
+                return self.state == target_state
+
+        try:
+            return await asyncio.wait_for(reached(), timeout_seconds)
+        except asyncio.TimeoutError:
+            return False
+
+    async def stop(self) -> None:
+        if self.alive:
+            self._process.kill()
+            await self._process.wait()
+        if self._reader is not None:
+            self._reader.cancel()
+
+
+# One watcher per event loop: subprocess transports belong to the loop that created them.
+_watchers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, VpnStateWatcher]" = weakref.WeakKeyDictionary()
+
+async def _get_watcher() -> Optional[VpnStateWatcher]:
+    """
+    The running loop's state watcher, started on first use. None if 'piactl monitor'
+    isn't available, in which case callers fall back to polling.
+    """
+    loop = asyncio.get_running_loop()
+    watcher = _watchers.get(loop)
+    if watcher is None or not watcher.alive:
+        watcher = VpnStateWatcher()
+        try:
+            await watcher.start()
+        except (OSError, ValueError) as e:
+            print(f"Warning: could not start piactl monitor, polling instead: {e}")
+            return None
+        _watchers[loop] = watcher
+    return watcher
+
+async def stop_watcher() -> None:
+    """
+    Stops the current event loop's state watcher, if one is running.
+    """
+    watcher = _watchers.pop(asyncio.get_running_loop(), None)
+    if watcher is not None:
+        await watcher.stop()
+
+def run_sync(coro: Awaitable[Any]) -> Any:
+    """
+    Runs a VPN coroutine (e.g. `connect_and_verify(profile)`) from synchronous code on a
+    fresh event loop, and stops that loop's state watcher before the loop closes.
+    """
+    async def main():
+        try:
+            return await coro
+        finally:
+            await stop_watcher()
+    return asyncio.run(main())
+
+async def _poll_for_connection_state(target_state: str, timeout_seconds: float) -> bool:
+    start_time = time.monotonic() # Use monotonic time for reliable duration calculation.
+    while time.monotonic() - start_time < timeout_seconds:
+        current_state = await _get_connection_state()
+        if current_state == target_state:
+            return True
+        # Wait for a short period before checking the state again to avoid busy-waiting.
+        await asyncio.sleep(2)
+    return False
+
+async def _get_region() -> str:
+    """
+    Retrieves the currently selected VPN region using 'piactl.exe get region'.
+    Returns "Unknown" if there's an error in retrieving it.
+    """
+    try:
+        stdout, _ = await _run_piactl_command(["get", "region"])
+        return stdout
+    except Exception as e:
+        print(f"Warning: Could not retrieve VPN region: {e}")
+        return "Unknown"
+
 async def _wait_for_connection_state(target_state: str, timeout_seconds: int = 60) -> bool:
     """
     Waits for the VPN connection state to reach the specified `target_state`
-    within a given timeout period.
+    within a given timeout period. Uses the event-driven VpnStateWatcher, and only
+    polls 'piactl get connectionstate' if the monitor can't be used.
 
     Args:
         target_state: The desired VPN connection state (e.g., "Connected", "Disconnected").
@@ -99,18 +258,46 @@ async def _wait_for_connection_state(target_state: str, timeout_seconds: int = 6
     Returns:
         True if the `target_state` is reached within the timeout, False otherwise.
     """
-    start_time = time.monotonic() # Use monotonic time for reliable duration calculation.
-    # print(f"Waiting for VPN connection state to become '{target_state}'...")
-    while time.monotonic() - start_time < timeout_seconds:
-        current_state = await _get_connection_state()
-        if current_state == target_state:
-            # print(f"VPN state is now '{target_state}'.")
+    start_time = time.monotonic()
+    watcher = await _get_watcher()
+    if watcher is not None and await watcher.wait_for(target_state, timeout_seconds):
+        return True
+    # Either no watcher, a timeout, or the monitor died; a direct poll settles it.
+    remaining = timeout_seconds - (time.monotonic() - start_time)
+    if (watcher is None or not watcher.alive) and remaining > 0:
+        if await _poll_for_connection_state(target_state, remaining):
             return True
-        # Wait for a short period before checking the state again to avoid busy-waiting.
-        await asyncio.sleep(2)
+    elif await _get_connection_state() == target_state:
+        return True
     print(f"Timeout: VPN state did not become '{target_state}' within {timeout_seconds} seconds.")
     return False
 
+async def _wait_for_egress(timeout_seconds: float = 30) -> bool:
+    """
+    Waits until a connection to EGRESS_PROBE_HOST succeeds, i.e. DNS and routing
+    through the freshly connected tunnel actually work.
+
+    Returns:
+        True once the probe succeeds, False if it keeps failing for `timeout_seconds`.
+    """
+    deadline = time.monotonic() + timeout_seconds
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(EGRESS_PROBE_HOST, EGRESS_PROBE_PORT, ssl=EGRESS_PROBE_TLS),
+                timeout=max(0.1, min(5.0, deadline - time.monotonic())),
+            )
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+            return True
+        except (OSError, asyncio.TimeoutError):
+            await asyncio.sleep(0.5)
+    return False
+
+@metrics.timed("vpn.disconnect")
 async def disconnect_vpn() -> None:
     """
     Disconnects the VPN connection using 'piactl.exe disconnect' and waits
@@ -135,12 +322,15 @@ async def disconnect_vpn() -> None:
         print(f"Error during VPN disconnection: {e}")
         raise # Re-raise the exception to propagate the failure.
 
+@metrics.timed("vpn.connect")
 async def connect_and_verify(profile: Profile) -> None:
     """
     Connects to the VPN using 'piactl.exe' for the given profile and verifies the connection.
-    This function first ensures the VPN is disconnected, then sets the region based on
-    the profile's `code`, initiates the connection, and waits for the "Connected" state.
-    It includes an additional safety sleep as in your original Node.js code.
+    If the tunnel is already connected in the profile's region (e.g. the previous account
+    used the same `code`) it is left up. Otherwise this function first ensures the VPN is
+    disconnected, then sets the region based on the profile's `code`, initiates the
+    connection, waits for the "Connected" state and then probes that traffic actually
+    leaves through the tunnel.
 
     Args:
         profile: An instance of the Profile dataclass containing VPN details.
@@ -151,6 +341,14 @@ async def connect_and_verify(profile: Profile) -> None:
     """
     # print(f"Initiating VPN connection for profile: {profile.profile} (City: {profile.city}, Code: {profile.code})...")
     try:
+        # 0. Keep the tunnel if it is already up in the right region.
+        if await _get_connection_state() == "Connected" and await _get_region() == profile.code:
+            _stats.reconnects_skipped += 1
+            metrics.annotate(region=profile.code, reused=True)
+            return
+        metrics.annotate(region=profile.code, reused=False)
+        _stats.connects += 1
+
         # 1. Ensure the VPN is disconnected to have a clean state before connecting.
         await disconnect_vpn()
 
@@ -172,15 +370,45 @@ async def connect_and_verify(profile: Profile) -> None:
         if not await _wait_for_connection_state("Connected"):
             raise Exception("VPN did not connect successfully within the timeout.")
 
-        # print("VPN connection established. Waiting for 6 seconds for safety...")
-        # 5. A small additional delay for safety, mirroring your Node.js implementation.
-        await asyncio.sleep(6)
-        # print("VPN connected and verified successfully.")
+        # 5. Instead of a fixed safety sleep, wait until traffic really flows through the tunnel.
+        if not await _wait_for_egress():
+            raise Exception(f"VPN connected but {EGRESS_PROBE_HOST} is not reachable through it.")
 
     except Exception as e:
         print(f"Failed to connect and verify VPN: {e}")
         raise # Re-raise the exception to propagate the failure.
 
+def order_by_region(accounts: Iterable[Profile]) -> List[Profile]:
+    """
+    Orders accounts so that profiles sharing a VPN region (`code`) run back to back and
+    the tunnel only changes once per region. Accounts without a code come first;
+    regions keep the order in which they first appear, as do accounts within a region.
+    """
+    groups: "OrderedDict[Optional[str], List[Profile]]" = OrderedDict([(None, [])])
+    for profile in accounts:
+        groups.setdefault(profile.code, []).append(profile)
+    return [profile for group in groups.values() for profile in group]
+
+def iter_by_region(accounts: Iterable[Profile]) -> Iterator[Profile]:
+    """
+    Streaming counterpart of `order_by_region`: accounts without a code and accounts of
+    the first region seen are yielded as soon as they arrive, so the first session can
+    start while later pages of a paged account listing are still loading. Accounts of
+    other regions are held back and yielded region by region once the input is exhausted.
+    """
+    first_region: Optional[str] = None
+    held: "OrderedDict[str, List[Profile]]" = OrderedDict()
+    for profile in accounts:
+        if profile.code is None:
+            yield profile
+        elif first_region is None or profile.code == first_region:
+            first_region = profile.code
+            yield profile
+        else:
+            held.setdefault(profile.code, []).append(profile)
+    for group in held.values():
+        yield from group
+
 # Example Usage (uncomment the following section to test this code):
 # You would typically call these functions from an asyncio event loop.
 #
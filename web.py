@@ -1,15 +1,110 @@
 # utils/web.py
+import asyncio
 import json
 import os
+import random
+import threading
 import time
+from dataclasses import dataclass, replace
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from pathlib import PurePosixPath
 from profile import Profile
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Dict, Iterator, List
+
+import metrics
 
 import requests                       # pip install requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+# SM_BASE_URL points the client somewhere else, e.g. the benchmark's fake backend.
+BASE_URL = os.environ.get("SM_BASE_URL", "https://smg.c2r.one/")
+
+# Keep-alive pool shared by every thread in the process.
+POOL_SIZE = 32
+
+# Endpoints that are safe to repeat even if the first attempt may have reached the server:
+# reads, and status changes that set an absolute value.
+IDEMPOTENT_ENDPOINTS = {
+    "accounts.php",
+    "change_account_status.php",
+    "random_non_private_profile.php",
+}
+
+# Statuses meaning "the server did not process this request", retried for any endpoint.
+_RETRY_ALWAYS_STATUSES = {429, 503}
+# Gateway errors where the request may or may not have been processed upstream.
+_RETRY_IDEMPOTENT_STATUSES = {502, 504}
+
+BACKOFF_BASE = 0.5                    # seconds; doubled on every retry
+BACKOFF_CAP = 20.0                    # seconds; upper bound for a single retry delay
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+
+
+@dataclass
+class EndpointStats:
+    """
+    Latency and retry counters for one backend endpoint.
+    """
+    calls: int = 0
+    errors: int = 0
+    retries: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    @property
+    def mean_seconds(self) -> float:
+        return self.total_seconds / self.calls if self.calls else 0.0
+
+
+_stats: Dict[str, EndpointStats] = {}
+_stats_lock = threading.Lock()
+
+
+def get_call_stats() -> Dict[str, EndpointStats]:
+    """
+    Returns a snapshot of the per-endpoint counters for `json_web_call`.
+    """
+    with _stats_lock:
+        return {endpoint: replace(stats) for endpoint, stats in _stats.items()}
+
+
+def reset_call_stats() -> None:
+    with _stats_lock:
+        _stats.clear()
+
+
+def _record_call(endpoint: str, seconds: float, retries: int, ok: bool) -> None:
+    with _stats_lock:
+        stats = _stats.setdefault(endpoint, EndpointStats())
+        stats.calls += 1
+        stats.retries += retries
+        stats.total_seconds += seconds
+        stats.max_seconds = max(stats.max_seconds, seconds)
+        if not ok:
+            stats.errors += 1
+
+
+def get_session() -> requests.Session:
+    """
+    Returns the process-wide pooled `requests.Session` used for backend calls,
+    creating it on first use. Connections are kept alive and reused across threads.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            # Retries are handled in json_web_call, where we know whether they are safe.
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["Content-Type"] = "application/json"
+            _session = session
+        return _session
 
-BASE_URL = "https://smg.c2r.one/"
 
 def set_current_task() -> None:
     """
@@ -17,57 +112,148 @@ def set_current_task() -> None:
     """
     pass
 
+
+def _backoff_delay(attempt: int) -> float:
+    """
+    Exponential backoff with full jitter for the given (0-based) retry attempt.
+    """
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def _never_sent(exc: requests.RequestException) -> bool:
+    """
+    True if the request failed before it could reach the server (so it is safe to repeat).
+    """
+    if isinstance(exc, requests.ConnectTimeout):
+        return True
+    cause = exc.args[0] if exc.args else None
+    reason = getattr(cause, "reason", cause)
+    return isinstance(reason, NewConnectionError)
+
+
+def _should_retry(
+    resp: requests.Response | None,
+    exc: requests.RequestException | None,
+    idempotent: bool,
+) -> bool:
+    if exc is not None:
+        return idempotent or _never_sent(exc)
+    if resp.status_code in _RETRY_ALWAYS_STATUSES:
+        return True
+    return idempotent and resp.status_code in _RETRY_IDEMPOTENT_STATUSES
+
+
+def _post(full_url: str, body: Dict[str, Any], timeout: int):
+    """
+    One attempt: returns (response, None) or (None, exception).
+    """
+    try:
+        return get_session().post(full_url, json=body, timeout=timeout), None
+    except requests.RequestException as exc:
+        return None, exc
+
+
+def _parse_response(url_fragment: str, resp: requests.Response) -> Dict[str, Any]:
+    # HTTP status‑code handling
+    if not resp.ok:
+        raise RuntimeError(
+            f"HTTP error for json call {url_fragment}: "
+            f"{resp.status_code}, payload: {resp.text}"
+        )
+
+    # Parse JSON explicitly so we can give a better error message
+    try:
+        return resp.json()
+    except json.JSONDecodeError as exc:
+        print(f"Error parsing JSON from {url_fragment!r}: {resp.text}", flush=True)
+        raise
+
+
 def json_web_call(
     url_fragment: str,
     body: Dict[str, Any],
     *,
     tries: int = 10,
     timeout: int = 15,                # seconds for the HTTP request itself
+    idempotent: bool | None = None,
 ) -> Dict[str, Any]:
     """
     POST a JSON body to `https://smg.c2r.one/<url_fragment>` and
     return the parsed JSON response.
 
-    • Retries network faults up to `tries` times (2‑second delay).
+    • Reuses keep‑alive connections from the shared pooled session.
+    • Retries up to `tries` times with exponential backoff and jitter, but only
+      when repeating is safe: connection failures before the request was sent,
+      429/503 responses, and – for idempotent endpoints – timeouts, dropped
+      connections and 502/504 responses.
     • Raises RuntimeError on non‑2xx HTTP status codes.
     • Raises the underlying exception on final network failure.
+
+    `idempotent` defaults to whether `url_fragment` is in IDEMPOTENT_ENDPOINTS.
     """
     set_current_task()
 
     # normalise slashes (so “foo/bar” -> “…/foo/bar”)
-    full_url = BASE_URL + str(PurePosixPath(url_fragment))
-
-    resp = None
-
-    last_exc: Exception | None = None
-    for attempt in range(tries):
-        try:
-            resp = requests.post(
-                full_url,
-                json=body,                        # requests dumps to JSON + sets header
-                headers={"Content-Type": "application/json"},
-                timeout=timeout,
-            )
-            break                                # success → exit retry‑loop
-        except requests.RequestException as exc:
-            last_exc = exc
-            if attempt == tries - 1:
-                raise                           # out of retries → propagate
-            time.sleep(2)
+    endpoint = str(PurePosixPath(url_fragment))
+    full_url = BASE_URL + endpoint
+    if idempotent is None:
+        idempotent = endpoint in IDEMPOTENT_ENDPOINTS
 
-    # HTTP status‑code handling
-    if not resp.ok:
-        raise RuntimeError(
-            f"HTTP error for json call {url_fragment}: "
-            f"{resp.status_code}, payload: {resp.text}"
-        )
+    started = time.monotonic()
+    attempt = 0
+    with metrics.span("web.call", endpoint=endpoint):
+        while True:
+            resp, exc = _post(full_url, body, timeout)
+            if attempt == tries - 1 or not _should_retry(resp, exc, idempotent):
+                break
+            delay = _backoff_delay(attempt)
+            time.sleep(delay)
+            metrics.note_wait(delay)
+            attempt += 1
+        metrics.annotate(retries=attempt)
 
-    # Parse JSON explicitly so we can give a better error message
-    try:
-        return resp.json()
-    except json.JSONDecodeError as exc:
-        print(f"Error parsing JSON from {url_fragment!r}: {resp.text}", flush=True)
-        raise
+    _record_call(endpoint, time.monotonic() - started, attempt, exc is None and resp.ok)
+    if exc is not None:
+        raise exc                       # out of retries (or unsafe to retry) → propagate
+    return _parse_response(url_fragment, resp)
+
+
+async def async_json_web_call(
+    url_fragment: str,
+    body: Dict[str, Any],
+    *,
+    tries: int = 10,
+    timeout: int = 15,
+    idempotent: bool | None = None,
+) -> Dict[str, Any]:
+    """
+    Asyncio variant of `json_web_call` with the same pooling and retry rules.
+    Each attempt runs on a worker thread and backoff delays yield to the event loop.
+    """
+    set_current_task()
+
+    endpoint = str(PurePosixPath(url_fragment))
+    full_url = BASE_URL + endpoint
+    if idempotent is None:
+        idempotent = endpoint in IDEMPOTENT_ENDPOINTS
+
+    started = time.monotonic()
+    attempt = 0
+    with metrics.span("web.call", endpoint=endpoint):
+        while True:
+            resp, exc = await asyncio.to_thread(_post, full_url, body, timeout)
+            if attempt == tries - 1 or not _should_retry(resp, exc, idempotent):
+                break
+            delay = _backoff_delay(attempt)
+            await asyncio.sleep(delay)
+            metrics.note_wait(delay)
+            attempt += 1
+        metrics.annotate(retries=attempt)
+
+    _record_call(endpoint, time.monotonic() - started, attempt, exc is None and resp.ok)
+    if exc is not None:
+        raise exc
+    return _parse_response(url_fragment, resp)
 
 # Define the Enum for account status slugs
 class AccountStatus(Enum):
@@ -99,6 +285,89 @@ def get_accounts(status: AccountStatus) -> List[Profile]: # Changed return type
 
     return profile_objects
 
+# Number of accounts requested per page by iter_accounts/aiter_accounts.
+ACCOUNTS_PAGE_SIZE = 50
+
+
+def _accounts_page_body(status: AccountStatus, page_size: int, cursor: Any) -> Dict[str, Any]:
+    body = {
+        "computer": os.environ['COMPUTERNAME'],
+        "platform_id": 1,
+        "status": status.value,
+        "limit": page_size,
+    }
+    if cursor is not None:
+        body["cursor"] = cursor
+    return body
+
+
+def _next_cursor(page: Dict[str, Any], page_size: int) -> Any:
+    """
+    The cursor for the page after `page`, or None when there are no more pages.
+    A backend that ignores `limit` returns everything at once without a cursor.
+    """
+    if len(page["data"]) < page_size:
+        return None
+    return page.get("next_cursor")
+
+
+def iter_accounts(status: AccountStatus, page_size: int = ACCOUNTS_PAGE_SIZE) -> Iterator[Profile]:
+    """
+    Streaming variant of `get_accounts`: pages through accounts.php and yields each
+    Profile as soon as its page arrives. The next page is fetched in the background
+    while the current one is being consumed.
+
+    Args:
+        status: The account status to list.
+        page_size: How many accounts to request per page.
+    """
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="accounts-page") as fetcher:
+        page_future = fetcher.submit(json_web_call, "accounts.php", _accounts_page_body(status, page_size, None))
+        while page_future is not None:
+            page = page_future.result()
+            cursor = _next_cursor(page, page_size)
+            page_future = None
+            if cursor is not None:
+                page_future = fetcher.submit(
+                    json_web_call, "accounts.php", _accounts_page_body(status, page_size, cursor)
+                )
+            for item in page["data"]:
+                yield Profile.from_dict(item)
+
+
+async def aiter_accounts(status: AccountStatus, page_size: int = ACCOUNTS_PAGE_SIZE) -> AsyncIterator[Profile]:
+    """
+    Async-iterator variant of `iter_accounts`, using `async_json_web_call`.
+    """
+    page_task = asyncio.create_task(
+        async_json_web_call("accounts.php", _accounts_page_body(status, page_size, None))
+    )
+    try:
+        while page_task is not None:
+            page = await page_task
+            cursor = _next_cursor(page, page_size)
+            page_task = None
+            if cursor is not None:
+                page_task = asyncio.create_task(
+                    async_json_web_call("accounts.php", _accounts_page_body(status, page_size, cursor))
+                )
+            for item in page["data"]:
+                yield Profile.from_dict(item)
+    finally:
+        if page_task is not None:
+            page_task.cancel()
+
+
 def get_random_profile() -> str:
     profile_data = json_web_call("random_non_private_profile.php", { "platform_id": 1})
-    return profile_data["profile"]
\ No newline at end of file
+    return profile_data["profile"]
+
+def get_random_profiles(count: int) -> List[str]:
+    """
+    Asks random_non_private_profile.php for up to `count` target profiles in one call.
+    Falls back to the single `profile` field when the backend returns just one.
+    """
+    profile_data = json_web_call("random_non_private_profile.php", {"platform_id": 1, "count": count})
+    if "profiles" in profile_data:
+        return list(profile_data["profiles"])
+    return [profile_data["profile"]]
\ No newline at end of file